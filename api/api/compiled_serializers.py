@@ -0,0 +1,309 @@
+"""
+Read-only fast path for DRF serializers on list endpoints.
+
+`compile_serializer(serializer)` turns a bound serializer into one flat Python
+function `row(obj) -> dict` whose output renders to the same JSON as
+`serializer.to_representation(obj)`. Source is generated once per serializer
+class and field set, then bound to the serializer's fields per request.
+
+Fields with a simple, known representation read the attribute and convert it
+inline: char/int/bool/UUID/choice/JSON model fields, ISO-8601 date and time
+fields, primary-key relations (read from `<field>_id` without touching the
+related object), and nested serializers on forward relations, which are
+compiled the same way, with prefetched rows read from the prefetch cache.
+A forward relation's row is built once per related pk when it involves no
+DRF code, so a page of one doctor's appointments renders the doctor once.
+Decimals call the field's `to_representation`, memoized per value.
+Model fields wrapped in a ModelField (the encrypted ones) are read inline
+when their class keeps Field's value_from_object/value_to_string.
+Everything else – method fields, files and images, dotted sources, custom
+field types – goes through the DRF field exactly as
+`Serializer.to_representation` would. Serializers that override
+`to_representation` themselves are never compiled; they run as written.
+"""
+import keyword
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.utils.encoding import is_protected_type
+from rest_framework import fields as drf_fields
+from rest_framework import relations, serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from rest_framework.settings import api_settings
+
+_factories = {}
+
+INLINE = {
+    drf_fields.CharField: 'str(v)',
+    drf_fields.EmailField: 'str(v)',
+    drf_fields.SlugField: 'str(v)',
+    drf_fields.URLField: 'str(v)',
+    drf_fields.IntegerField: 'int(v)',
+    drf_fields.FloatField: 'float(v)',
+    drf_fields.BooleanField: 'bool(v)',
+    drf_fields.JSONField: 'v',
+    drf_fields.ReadOnlyField: 'v',
+}
+
+
+def _fallback(field, obj, ret):
+    """One field the way Serializer.to_representation handles it."""
+    try:
+        attribute = field.get_attribute(obj)
+    except SkipField:
+        return
+    check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+    ret[field.field_name] = None if check_for_none is None else field.to_representation(attribute)
+
+
+def _iso_datetime(to_timezone, value):
+    value = to_timezone(value).isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def _to_timezone(field):
+    """field.enforce_timezone with the timezone looked up once, not per value."""
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if field_timezone is None:
+        return field.enforce_timezone
+
+    def convert(value):
+        if value.utcoffset() is not None:
+            return value.astimezone(field_timezone)
+        return field.enforce_timezone(value)
+    return convert
+
+
+def _memoized(to_representation, size=1024):
+    """Decimal formatting is slow and fees/ratings repeat a lot across rows."""
+    cache = {}
+
+    def convert(value):
+        try:
+            return cache[value]
+        except KeyError:
+            result = to_representation(value)
+            if len(cache) < size:
+                cache[value] = result
+            return result
+    return convert
+
+
+def _by_pk(row, size=1024):
+    """
+    A related object's row built once per pk: the same doctor comes back on
+    every one of their appointments in a page. Only used for rows that read
+    nothing but the object's own loaded values (see `_deterministic`).
+    """
+    cache = {}
+
+    def convert(obj):
+        pk = obj.pk
+        try:
+            return cache[pk]
+        except KeyError:
+            result = row(obj)
+            if pk is not None and len(cache) < size:
+                cache[pk] = result
+            return result
+    return convert
+
+
+def _related_rows(obj, name):
+    """Prefetched rows straight from the cache; building the manager costs more than the rows."""
+    prefetched = obj.__dict__.get('_prefetched_objects_cache')
+    if prefetched is not None and name in prefetched:
+        return prefetched[name]
+    return getattr(obj, name).all()
+
+
+def _model_field(serializer, field):
+    """The forward model field `field` reads, or None if it's anything else."""
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    if model is None or len(field.source_attrs) != 1:
+        return None
+    name = field.source_attrs[0]
+    if not name.isidentifier() or keyword.iskeyword(name):
+        return None
+    try:
+        model_field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    if model_field.auto_created and not model_field.concrete:
+        return None  # reverse relation
+    return model_field
+
+
+def _plain_model_field(model_field):
+    """Whether the model field reads and stringifies its value like Field does (encrypted fields do)."""
+    field_class = type(model_field)
+    return (
+        field_class.value_from_object is models.Field.value_from_object
+        and field_class.value_to_string is models.Field.value_to_string
+    )
+
+
+def _overrides_to_representation(serializer):
+    base = serializers.ListSerializer if isinstance(serializer, serializers.ListSerializer) else serializers.Serializer
+    return type(serializer).to_representation is not base.to_representation
+
+
+def _iso(field, setting):
+    return (getattr(field, 'format', setting) or '').lower() == drf_fields.ISO_8601
+
+
+def _plan(serializer):
+    """Generated source lines and the binding each `B<n>` name needs."""
+    lines, bindings = [], []
+
+    def bind(kind, name):
+        bindings.append((kind, name))
+        return f'B{len(bindings) - 1}'
+
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        key = repr(name)
+        model_field = _model_field(serializer, field)
+        kind = type(field)
+
+        if isinstance(field, serializers.SerializerMethodField):
+            lines.append(f'ret[{key}] = {bind("method", name)}(obj)')
+            continue
+        if kind is drf_fields.ModelField:
+            if _plain_model_field(field.model_field):
+                # What ModelField.to_representation does, minus two method calls per row.
+                lines.append(f'v = obj.{field.model_field.attname}')
+                lines.append(f'ret[{key}] = v if is_protected_type(v) else str(v)')
+            else:
+                # ModelField.get_attribute() hands over the instance itself.
+                lines.append(f'ret[{key}] = {bind("to_representation", name)}(obj)')
+            continue
+        if model_field is None:
+            lines.append(f'_fallback({bind("field", name)}, obj, ret)')
+            continue
+
+        attr = model_field.name
+        if isinstance(field, serializers.BaseSerializer) and _overrides_to_representation(field):
+            lines.append(f'_fallback({bind("field", name)}, obj, ret)')
+            continue
+        if isinstance(field, serializers.ListSerializer) and model_field.many_to_many:
+            lines.append(f'ret[{key}] = [{bind("nested", name)}(x) for x in _related_rows(obj, {attr!r})]')
+            continue
+        if isinstance(field, serializers.BaseSerializer) and not model_field.many_to_many and model_field.is_relation:
+            lines.append(f'v = obj.{attr}')
+            lines.append(f'ret[{key}] = None if v is None else {bind("related", name)}(v)')
+            continue
+        if kind is relations.PrimaryKeyRelatedField and field.pk_field is None and not model_field.many_to_many:
+            lines.append(f'ret[{key}] = obj.{model_field.attname}')
+            continue
+        if model_field.is_relation:
+            lines.append(f'_fallback({bind("field", name)}, obj, ret)')
+            continue
+
+        if kind is drf_fields.JSONField and field.binary:
+            expression = f'{bind("to_representation", name)}(v)'
+        elif kind in INLINE:
+            expression = INLINE[kind]
+        elif kind is drf_fields.UUIDField and field.uuid_format == 'hex_verbose':
+            expression = 'str(v)'
+        elif kind is drf_fields.ChoiceField:
+            expression = f'v if v == "" else {bind("choices", name)}.get(str(v), v)'
+        elif kind is drf_fields.DateTimeField and _iso(field, api_settings.DATETIME_FORMAT):
+            expression = f'_iso_datetime({bind("timezone", name)}, v)'
+        elif kind is drf_fields.DateField and _iso(field, api_settings.DATE_FORMAT):
+            expression = 'v.isoformat()'
+        elif kind is drf_fields.TimeField and _iso(field, api_settings.TIME_FORMAT):
+            expression = 'v.isoformat()'
+        elif kind is drf_fields.DecimalField:
+            expression = f'{bind("decimal", name)}(v)'
+        else:
+            # Unknown field types may override get_attribute (ModelField does).
+            lines.append(f'_fallback({bind("field", name)}, obj, ret)')
+            continue
+
+        # Matches DRF: None skips to_representation, and date/time fields
+        # turn empty values into None themselves.
+        empty = 'v is None'
+        if kind in (drf_fields.DateTimeField, drf_fields.DateField):
+            empty = 'not v'
+        elif kind is drf_fields.TimeField:
+            empty = 'v in (None, "")'
+        lines.append(f'v = obj.{attr}')
+        lines.append(f'ret[{key}] = None if {empty} else {expression}')
+
+    return lines, bindings
+
+
+def _factory(serializer):
+    key = (type(serializer), tuple(serializer.fields))
+    if key not in _factories:
+        lines, bindings = _plan(serializer)
+        params = ', '.join(f'B{i}' for i in range(len(bindings)))
+        body = '\n'.join(f'        {line}' for line in lines) or '        pass'
+        source = (
+            f'def factory({params}):\n'
+            f'    def row(obj):\n'
+            f'        ret = {{}}\n'
+            f'{body}\n'
+            f'        return ret\n'
+            f'    return row\n'
+        )
+        namespace = {
+            '_fallback': _fallback, '_iso_datetime': _iso_datetime, '_related_rows': _related_rows,
+            'is_protected_type': is_protected_type,
+        }
+        exec(compile(source, f'<compiled {type(serializer).__name__}>', 'exec'), namespace)
+        _factories[key] = (namespace['factory'], bindings)
+    return _factories[key]
+
+
+def _deterministic(serializer):
+    """Whether the compiled row only reads the instance's columns and prefetched rows, no DRF code."""
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    if _overrides_to_representation(serializer):
+        return False
+    _, bindings = _factory(serializer)
+    return all(
+        _deterministic(serializer.fields[name]) if kind in ('nested', 'related')
+        else kind in ('choices', 'timezone', 'decimal')
+        for kind, name in bindings
+    )
+
+
+def compile_serializer(serializer):
+    """
+    `row(obj)` equivalent to `serializer.to_representation(obj)` for reads.
+    `serializer` is a bound instance (or the child of a many=True list); its
+    context (request, etc.) is used by the fields that fall back to DRF.
+    A serializer that overrides `to_representation` is not compiled: its
+    own method is returned.
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    if _overrides_to_representation(serializer):
+        return serializer.to_representation
+    factory, bindings = _factory(serializer)
+    arguments = []
+    for kind, name in bindings:
+        field = serializer.fields[name]
+        if kind == 'method':
+            arguments.append(getattr(serializer, field.method_name))
+        elif kind == 'nested':
+            arguments.append(compile_serializer(field))
+        elif kind == 'related':
+            row = compile_serializer(field)
+            arguments.append(_by_pk(row) if _deterministic(field) else row)
+        elif kind == 'choices':
+            arguments.append(field.choice_strings_to_values)
+        elif kind == 'timezone':
+            arguments.append(_to_timezone(field))
+        elif kind == 'decimal':
+            arguments.append(_memoized(field.to_representation))
+        elif kind == 'to_representation':
+            arguments.append(field.to_representation)
+        else:
+            arguments.append(field)
+    return factory(*arguments)
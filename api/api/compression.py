@@ -0,0 +1,198 @@
+"""
+Response compression negotiated from `Accept-Encoding`.
+
+gzip is always available; Brotli (`br`) and zstd are used when the `brotli`
+and `zstandard` packages are installed. Among the codings the client accepts
+with the highest q-value, zstd is preferred, then br, then gzip.
+
+Skipped: responses below COMPRESSION_MIN_SIZE, ones that already carry a
+Content-Encoding or `Cache-Control: no-transform`, downloads
+(`Content-Disposition: attachment`) and already-compressed media types
+(images, PDFs, archives...).
+
+BREACH: a compressed body that mixes a secret with reflected input leaks the
+secret through its length. Responses under COMPRESSION_EXEMPT_PATHS (login,
+token refresh, the admin's CSRF forms) and responses that set cookies are
+sent uncompressed. gzip bodies also carry a random-length file name in their
+header (up to COMPRESSION_MAX_RANDOM_BYTES), as Django's GZipMiddleware does.
+br and zstd have no such field, so the exemptions are what protect them. Streaming responses are compressed chunk by
+chunk and flushed as they go, so clients still see data progressively.
+
+Listed after WhiteNoiseMiddleware: static files are answered (and
+pre-compressed) by WhiteNoise before reaching this middleware.
+"""
+import secrets
+import struct
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+INCOMPRESSIBLE_TYPES = (
+    'image/', 'video/', 'audio/', 'font/woff',
+    'application/pdf', 'application/zip', 'application/gzip', 'application/x-gzip',
+    'application/zstd', 'application/x-7z-compressed', 'application/x-rar-compressed',
+    'application/octet-stream', 'application/vnd.openxmlformats-officedocument',
+)
+
+
+class GzipCodec:
+    """gzip with a random-length FNAME header field (BREACH padding)."""
+
+    def __init__(self, level, max_random_bytes=0):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self._crc = self._size = 0
+        padding = secrets.randbelow(max_random_bytes) if max_random_bytes else 0
+        # Magic, deflate, FNAME flag, no mtime, no extra flags, unknown OS.
+        self._header = b'\x1f\x8b\x08\x08\x00\x00\x00\x00\x00\xff' + b'a' * padding + b'\x00'
+
+    def _deflate(self, data):
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        header, self._header = self._header, b''
+        return header + self._compressor.compress(data)
+
+    def chunk(self, data):
+        return self._deflate(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data=b''):
+        body = self._deflate(data) + self._compressor.flush()
+        return body + struct.pack('<II', self._crc, self._size & 0xffffffff)
+
+
+class BrotliCodec:
+    def __init__(self, level, max_random_bytes=0):  # no header field to pad
+        self._compressor = brotli.Compressor(quality=level)
+
+    def chunk(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data=b''):
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class ZstdCodec:
+    def __init__(self, level, max_random_bytes=0):  # no header field to pad
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def chunk(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data=b''):
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+def available_codecs():
+    """{coding: (codec class, settings name of its level)} in preference order."""
+    codecs = {}
+    if zstandard is not None:
+        codecs['zstd'] = (ZstdCodec, 'COMPRESSION_ZSTD_LEVEL')
+    if brotli is not None:
+        codecs['br'] = (BrotliCodec, 'COMPRESSION_BROTLI_LEVEL')
+    codecs['gzip'] = (GzipCodec, 'COMPRESSION_GZIP_LEVEL')
+    return codecs
+
+
+def negotiate(accept_encoding, codings):
+    """The coding from `codings` (in preference order) the client accepts most, or None."""
+    weights = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for coding in codings:
+        q = weights.get(coding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.codecs = available_codecs()
+        self.min_size = settings.COMPRESSION_MIN_SIZE
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.path.startswith(settings.COMPRESSION_EXEMPT_PATHS) or response.cookies:
+            return response
+        if not self.should_compress(response):
+            return response
+
+        # The response varies on Accept-Encoding whichever coding is chosen.
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''), self.codecs)
+        if coding is None:
+            return response
+        codec_class, level_setting = self.codecs[coding]
+        codec = codec_class(getattr(settings, level_setting), settings.COMPRESSION_MAX_RANDOM_BYTES)
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self._compress_async(codec, response.streaming_content)
+            else:
+                response.streaming_content = self._compress_stream(codec, response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            compressed = codec.finish(response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # The bytes differ from the uncompressed representation, so a strong
+        # ETag no longer applies to them.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = coding
+        return response
+
+    def should_compress(self, response):
+        if response.has_header('Content-Encoding'):
+            return False
+        if 'no-transform' in response.get('Cache-Control', ''):
+            return False
+        if response.get('Content-Disposition', '').lower().startswith('attachment'):
+            return False
+        if response.get('Content-Type', '').lower().startswith(INCOMPRESSIBLE_TYPES):
+            return False
+        return response.streaming or len(response.content) >= self.min_size
+
+    @staticmethod
+    def _compress_stream(codec, chunks):
+        for chunk in chunks:
+            data = codec.chunk(chunk)
+            if data:
+                yield data
+        yield codec.finish()
+
+    @staticmethod
+    async def _compress_async(codec, chunks):
+        async for chunk in chunks:
+            data = codec.chunk(chunk)
+            if data:
+                yield data
+        yield codec.finish()
@@ -0,0 +1,108 @@
+"""
+Primary/replica routing with read-your-writes stickiness.
+
+Requests with a safe method (GET, HEAD, OPTIONS) read from the `replica`
+alias; everything else, and any read inside a transaction, goes to `default`.
+After a successful write the client is pinned to the primary for
+`DATABASE_REPLICA_STICKY_SECONDS`, so a patient who just booked an appointment
+sees it on the next page load even if the replica lags:
+
+* a `db_pin` cookie covers the client that wrote (including anonymous
+  sign-ups, whose follow-up requests authenticate against the user table);
+* a per-user cache marker covers the same user on other devices.
+
+Locally, two SQLite files stand in for the pair:
+
+    DATABASE_URL=sqlite:///primary.db DATABASE_REPLICA_URL=sqlite:///replica.db
+"""
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.functional import SimpleLazyObject, empty
+
+PRIMARY = 'default'
+REPLICA = 'replica'
+PIN_COOKIE = 'db_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_routing = ContextVar('db_routing', default=None)
+
+
+def pin_key(user_id):
+    return f'db-pin:{user_id}'
+
+
+def _known_user(request):
+    """The authenticated user if one has been resolved, without forcing a lookup."""
+    user = request.__dict__.get('user')
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return None
+    if user is None or not user.is_authenticated:
+        return None
+    return user
+
+
+class RoutingState:
+    """Routing decision for one request; the user pin is checked once per user."""
+
+    def __init__(self, request):
+        self.request = request
+        self.safe = request.method in SAFE_METHODS
+        self.cookie_pinned = PIN_COOKIE in request.COOKIES
+        self._checked_user = None
+        self._user_pinned = False
+
+    def read_alias(self):
+        if not self.safe or self.cookie_pinned or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        user = _known_user(self.request)
+        if user is not None and user.pk != self._checked_user:
+            self._checked_user = user.pk
+            self._user_pinned = bool(cache.get(pin_key(user.pk)))
+        return PRIMARY if self._user_pinned else REPLICA
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        return state.read_alias() if state is not None else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaRoutingMiddleware:
+    """Scopes routing decisions to the request and pins writers to the primary."""
+
+    def __init__(self, get_response):
+        if REPLICA not in settings.DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sticky_seconds = settings.DATABASE_REPLICA_STICKY_SECONDS
+
+    def __call__(self, request):
+        state = RoutingState(request)
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+
+        if not state.safe and response.status_code < 400:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=self.sticky_seconds,
+                httponly=True, samesite='None', secure=True,
+            )
+            user = _known_user(request)
+            if user is not None:
+                cache.set(pin_key(user.pk), 1, self.sticky_seconds)
+        return response
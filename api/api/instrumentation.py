@@ -0,0 +1,223 @@
+"""
+Per-request performance instrumentation.
+
+The middleware samples a fraction of requests and, for those, records where the
+time went: SQL (count and duration), serializer `.data`, JWT decoding, cache
+lookups and outbound HTTP. The totals are returned as a `Server-Timing` header
+and written as one structured log line on the `api.performance` logger.
+
+Requests that are not sampled only pay for a context variable lookup in each
+patched hot spot.
+"""
+import contextvars
+import functools
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('api.performance')
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+_MISSING = object()
+_installed = False
+_cache_listeners = []
+
+
+class RequestMetrics:
+    """Timings collected for a single sampled request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = {}  # name -> [count, seconds]
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._depth = {}
+
+    def add(self, name, elapsed, count=1):
+        entry = self.timings.setdefault(name, [0, 0.0])
+        entry[0] += count
+        entry[1] += elapsed
+
+    @contextmanager
+    def timer(self, name):
+        """Time a block, ignoring re-entrant calls (nested serializers, etc.)."""
+        depth = self._depth.get(name, 0)
+        self._depth[name] = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth[name] = depth
+            if depth == 0:
+                self.add(name, time.perf_counter() - start)
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add('db', time.perf_counter() - start)
+
+    @contextmanager
+    def track_queries(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self.sql_wrapper))
+            yield
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        parts = []
+        for name, (count, seconds) in self.timings.items():
+            desc = f'count={count}'
+            if name == 'cache':
+                # One entry per name: the lookups' time and their outcome.
+                desc += f' hits={self.cache_hits} misses={self.cache_misses}'
+            parts.append(f'{name};dur={seconds * 1000:.1f};desc="{desc}"')
+        parts.append(f'total;dur={self.total * 1000:.1f}')
+        return ', '.join(parts)
+
+    def as_dict(self):
+        return {
+            'total_ms': round(self.total * 1000, 2),
+            'timings': {
+                name: {'count': count, 'ms': round(seconds * 1000, 2)}
+                for name, (count, seconds) in self.timings.items()
+            },
+            'cache': {'hits': self.cache_hits, 'misses': self.cache_misses},
+        }
+
+
+def current():
+    return _current.get()
+
+
+def _timed(name, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        metrics = _current.get()
+        if metrics is None:
+            return func(*args, **kwargs)
+        with metrics.timer(name):
+            return func(*args, **kwargs)
+    wrapper._perf_timed = True
+    return wrapper
+
+
+def _patch(owner, attr, name):
+    func = getattr(owner, attr)
+    if not getattr(func, '_perf_timed', False):
+        setattr(owner, attr, _timed(name, func))
+
+
+def _patch_property(owner, attr, name):
+    prop = owner.__dict__[attr]
+    if not getattr(prop.fget, '_perf_timed', False):
+        setattr(owner, attr, property(_timed(name, prop.fget)))
+
+
+def subscribe_cache(callback):
+    """Call `callback(hit)` on every cache lookup, sampled or not."""
+    _cache_listeners.append(callback)
+
+
+def _cache_get(func):
+    @functools.wraps(func)
+    def wrapper(self, key, default=None, version=None):
+        metrics = _current.get()
+        if metrics is None and not _cache_listeners:
+            return func(self, key, default, version)
+        if metrics is None:
+            value = func(self, key, _MISSING, version)
+        else:
+            with metrics.timer('cache'):
+                value = func(self, key, _MISSING, version)
+        hit = value is not _MISSING
+        for callback in _cache_listeners:
+            callback(hit)
+        if metrics is not None:
+            if hit:
+                metrics.cache_hits += 1
+            else:
+                metrics.cache_misses += 1
+        return value if hit else default
+    wrapper._perf_timed = True
+    return wrapper
+
+
+def install():
+    """Patch the instrumented hot spots once per process."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    from rest_framework.serializers import BaseSerializer
+    from rest_framework_simplejwt.backends import TokenBackend
+    from django.core.cache import caches
+
+    _patch_property(BaseSerializer, 'data', 'serializer')
+    _patch(TokenBackend, 'decode', 'jwt')
+
+    for alias in settings.CACHES:
+        backend = type(caches[alias])
+        if not getattr(backend.get, '_perf_timed', False):
+            backend.get = _cache_get(backend.get)
+
+    try:
+        import requests
+    except ImportError:
+        pass
+    else:
+        _patch(requests.Session, 'send', 'http')
+
+    try:
+        import httpx
+    except ImportError:
+        pass
+    else:
+        _patch(httpx.Client, 'send', 'http')
+
+
+class ServerTimingMiddleware:
+    """
+    Samples `PERF_SAMPLE_RATE` of requests and reports their timings through a
+    `Server-Timing` header and a JSON log line.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PERF_SAMPLE_RATE', 0.01)
+        install()
+
+    def __call__(self, request):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with metrics.track_queries():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        response['Server-Timing'] = metrics.server_timing()
+        match = getattr(request, 'resolver_match', None)
+        logger.info(json.dumps({
+            'event': 'request_timing',
+            'method': request.method,
+            'path': request.path,
+            'route': match.view_name if match else None,
+            'status': response.status_code,
+            **metrics.as_dict(),
+        }))
+        return response
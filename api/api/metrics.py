@@ -0,0 +1,123 @@
+"""
+Prometheus metrics for the API.
+
+Under gunicorn `PROMETHEUS_MULTIPROC_DIR` is set (see `gunicorn.conf.py`), so
+every worker writes its samples to memory-mapped files in that directory and
+`/metrics` aggregates all of them with a `MultiProcessCollector`. Whichever
+worker answers the scrape reports the whole server. Without the variable
+(runserver, tests) the default in-process registry is used.
+"""
+import os
+import time
+from contextlib import ExitStack
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+    generate_latest, multiprocess,
+)
+
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+REQUESTS = Counter(
+    'http_requests_total', 'HTTP requests by route name, method and status.',
+    ['route', 'method', 'status'],
+)
+LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route name.',
+    ['route', 'method'],
+)
+IN_PROGRESS = Gauge(
+    'http_requests_in_progress', 'Requests currently being handled.',
+    multiprocess_mode='livesum',
+)
+DB_QUERIES = Histogram(
+    'db_queries_per_request', 'SQL statements executed per request.',
+    ['route'], buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+DB_QUERY_DURATION = Histogram(
+    'db_query_duration_seconds', 'Duration of individual SQL statements.',
+    ['alias'], buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1),
+)
+CACHE_LOOKUPS = Counter(
+    'cache_lookups_total', 'Cache lookups by result (hit or miss).', ['result'],
+)
+EMAIL_QUEUE_DEPTH = Gauge(
+    'email_queue_depth', 'Emails waiting to be sent.',
+    multiprocess_mode='livemostrecent',
+)
+WORKERS = Gauge(
+    'gunicorn_workers', 'Live gunicorn worker processes.',
+    multiprocess_mode='livesum',
+)
+WORKER_EXITS = Counter(
+    'gunicorn_worker_exits_total', 'Gunicorn worker processes that have exited.',
+)
+
+
+def _record_cache_lookup(hit):
+    CACHE_LOOKUPS.labels('hit' if hit else 'miss').inc()
+
+
+def email_queue_depth():
+    # Reminders waiting for `manage.py send_reminders`; the other emails are
+    # still sent inline from the request. Imported here, the models aren't
+    # ready when this module loads.
+    from management.services.reminders import queue_depth
+    return queue_depth()
+
+
+def refresh_gauges():
+    """Update gauges that are sampled at scrape time rather than on events."""
+    EMAIL_QUEUE_DEPTH.set(email_queue_depth())
+
+
+def render():
+    """Return the exposition payload and its content type."""
+    refresh_gauges()
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class PrometheusMiddleware:
+    """Counts requests, their latency and SQL usage per route name."""
+
+    def __init__(self, get_response):
+        from django.db import connections
+        from api import instrumentation
+
+        self.get_response = get_response
+        self.connections = connections
+        instrumentation.install()
+        instrumentation.subscribe_cache(_record_cache_lookup)
+
+    def __call__(self, request):
+        queries = [0]
+
+        def count_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries[0] += 1
+                DB_QUERY_DURATION.labels(context['connection'].alias).observe(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        IN_PROGRESS.inc()
+        try:
+            with ExitStack() as stack:
+                for connection in self.connections.all():
+                    stack.enter_context(connection.execute_wrapper(count_query))
+                response = self.get_response(request)
+        finally:
+            IN_PROGRESS.dec()
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match else 'unmatched'
+        LATENCY.labels(route, request.method).observe(time.perf_counter() - start)
+        REQUESTS.labels(route, request.method, response.status_code).inc()
+        DB_QUERIES.labels(route).observe(queries[0])
+        return response
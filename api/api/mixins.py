@@ -0,0 +1,244 @@
+"""
+Shared viewset and serializer mixins.
+
+Conditional GET
+---------------
+
+ConditionalGetMixin answers conditional GETs, built on `TimeStampedModel.updated_at`.
+
+Before serializing anything, `retrieve` fetches just the timestamps of the
+object (`values('updated_at', ...)`) and `list` runs one aggregate over the
+filtered queryset (`Max(updated_at)` plus a row count, so deletions change the
+tag too). If the client's `If-None-Match` / `If-Modified-Since` still match,
+the response is an empty 304.
+
+A list request without either header can't be answered with a 304, so it
+skips the aggregate: its ETag is a hash of the rendered body (and it has no
+Last-Modified). The first revalidation with that tag runs the aggregate and
+gets a full response carrying the aggregate's tag, and later ones get 304s.
+Every tag includes the requesting user and role, whose visibility decides
+the rows.
+
+Nested data is covered by listing the related timestamps in
+`etag_related_fields`, e.g. `('doctor__updated_at', 'doctor__user__updated_at')`;
+embedded users count too, hence `HealthcareUser.updated_at`.
+Changes that bypass `save()` (`QuerySet.update()`) must set `updated_at`
+themselves to be seen. The short-circuit skips `get_object()`, so a viewset
+with object-level permissions must not use this mixin.
+
+Sparse fieldsets
+----------------
+
+`?fields=id,status` limits a response to the named fields and
+`?expand=doctor_detail` embeds only the named nested objects (`?expand=` alone
+embeds none). Without either parameter every field is returned as before.
+SparseFieldsSerializerMixin drops the fields from the top-level serializer;
+SparseQuerysetMixin makes `get_queryset()` select/prefetch only the relations
+behind the kept nested fields (from `expand_relations`) and, with `?fields=`,
+load only the columns they need. Both apply to GET and HEAD only, so writes
+always see the full serializer.
+
+Compiled lists
+--------------
+
+CompiledListMixin serves `list` through `api.compiled_serializers`, which
+renders the same JSON as the viewset's serializer at a fraction of the cost.
+"""
+import hashlib
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Count, Max
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from api.compiled_serializers import compile_serializer
+
+
+class ConditionalGetMixin:
+    etag_related_fields = ()
+
+    def _fields(self):
+        return ('updated_at',) + tuple(self.etag_related_fields)
+
+    def _etag(self, request, state):
+        # The query string, negotiated media type and user are part of the tag:
+        # ?page=2, ?fields=..., ?format=api or another role render the same rows differently.
+        raw = '|'.join([
+            request.get_full_path(),
+            request.accepted_media_type or '',
+            str(request.user.pk),
+            getattr(request.user, 'role', ''),
+            repr(state),
+        ])
+        return '"%s"' % hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+
+    def _validators(self, request, state, last_modified):
+        return self._etag(request, state), last_modified
+
+    def _conditional(self, request, state, last_modified, render):
+        etag, last_modified = self._validators(request, state, last_modified)
+        timestamp = last_modified.timestamp() if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = render()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        try:
+            rows = list(
+                queryset.filter(**{self.lookup_field: kwargs[lookup_url_kwarg]}).values_list(*self._fields())
+            )
+        except (TypeError, ValueError, ValidationError):  # a malformed lookup, as get_object_or_404 treats it
+            raise Http404
+        if not rows:
+            return super().retrieve(request, *args, **kwargs)
+
+        timestamps = [value for row in rows for value in row if value is not None]
+        return self._conditional(
+            request, rows, max(timestamps, default=None),
+            lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs),
+        )
+
+    def list(self, request, *args, **kwargs):
+        if 'HTTP_IF_NONE_MATCH' not in request.META and 'HTTP_IF_MODIFIED_SINCE' not in request.META:
+            self._tag_body = True
+            return super().list(request, *args, **kwargs)
+
+        aggregates = {'count': Count('pk', distinct=True)}
+        for index, field in enumerate(self._fields()):
+            aggregates[f'latest_{index}'] = Max(field)
+            if index:
+                # Catches links added or removed without a timestamp change.
+                aggregates[f'links_{index}'] = Count(field)
+        state = self.filter_queryset(self.get_queryset()).order_by().aggregate(**aggregates)
+
+        timestamps = [value for key, value in state.items() if key.startswith('latest_') and value is not None]
+        return self._conditional(
+            request, sorted(state.items()), max(timestamps, default=None),
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+        )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, '_tag_body', False) and response.status_code == 200:
+            response.render()
+            response['ETag'] = self._etag(request, hashlib.md5(response.content, usedforsecurity=False).hexdigest())
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+def sparse_params(request):
+    """`?fields=` and `?expand=` as sets of names, None when not given."""
+    def names(param):
+        value = request.query_params.get(param)
+        if value is None:
+            return None
+        return {name.strip() for name in value.split(',') if name.strip()}
+    return names('fields'), names('expand')
+
+
+def _keep_field(name, field, fields, expand, expandable):
+    if fields is not None and name not in fields:
+        return False
+    if expand is not None and name not in expand:
+        return not (isinstance(field, serializers.BaseSerializer) or name in expandable)
+    return True
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Honors `?fields=` / `?expand=` on the top-level serializer of a GET.
+    Nested serializers count as expandable; list method fields that load
+    related data in `expandable_fields` as well.
+    """
+    expandable_fields = ()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        # Only the serializer the view built (field_name None, or '' as the
+        # child of a many=True list) reads the params, not nested ones.
+        if request is None or request.method not in SAFE_METHODS or self.field_name:
+            return fields
+        requested, expand = sparse_params(request)
+        if requested is None and expand is None:
+            return fields
+        return {
+            name: field for name, field in fields.items()
+            if _keep_field(name, field, requested, expand, self.expandable_fields)
+        }
+
+
+class SparseQuerysetMixin:
+    """
+    Loads what the requested fields need. `expand_relations` maps a nested
+    field to the `(select_related, prefetch_related)` lookups it uses.
+    """
+    expand_relations = {}
+
+    def get_queryset(self):
+        return self.sparse_queryset(super().get_queryset())
+
+    def sparse_queryset(self, queryset):
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        requested, expand = sparse_params(self.request)
+        serializer_class = self.get_serializer_class()
+        serializer_fields = serializer_class().fields
+        expandable = getattr(serializer_class, 'expandable_fields', ())
+        kept = [
+            name for name, field in serializer_fields.items()
+            if _keep_field(name, field, requested, expand, expandable)
+        ]
+
+        selected = []
+        for name in kept:
+            select, prefetch = self.expand_relations.get(name, ((), ()))
+            selected.extend(select)
+            if select:
+                queryset = queryset.select_related(*select)
+            if prefetch:
+                queryset = queryset.prefetch_related(*prefetch)
+
+        if requested is None:
+            return queryset
+        columns = self._columns(queryset.model, [serializer_fields[name] for name in kept], selected)
+        return queryset.only(*columns) if columns is not None else queryset
+
+    @staticmethod
+    def _columns(model, fields, selected):
+        """Concrete columns behind `fields`, or None if that can't be told."""
+        columns = set()
+        for source in [field.source for field in fields if not field.write_only] + list(selected):
+            attribute = source.replace('.', '__').split('__')[0]
+            if attribute == '*':
+                return None
+            try:
+                model_field = model._meta.get_field(attribute)
+            except FieldDoesNotExist:
+                return None
+            if model_field.concrete and not model_field.many_to_many:
+                columns.add(model_field.name)
+        return columns
+
+
+class CompiledListMixin:
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        row = compile_serializer(self.get_serializer())
+        data = [row(obj) for obj in (queryset if page is None else page)]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
@@ -0,0 +1,91 @@
+"""
+Prebuilt OpenAPI schema.
+
+Introspecting every ViewSet and `swagger_auto_schema` takes hundreds of
+milliseconds, so the schema is generated once and served as a static
+document. `manage.py build_openapi_schema` writes it to OPENAPI_SCHEMA_FILE at
+build/deploy time; a process that finds no file generates it on first request
+(once, under a lock) and keeps it in memory. Only the command writes the file,
+so a stale artifact never outlives a deploy that runs it.
+
+The swagger/redoc pages are pointed at `schema_json` through SPEC_URL and no
+longer build the schema themselves.
+"""
+import hashlib
+import os
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_safe
+from drf_yasg import openapi
+
+API_INFO = openapi.Info(
+    title="tibERbu API",
+    default_version='v1',
+    description="API documentation for tibERbu hospital management System",
+    terms_of_service="https://stevenene.vercel.app",
+    contact=openapi.Contact(email="stevekid705@gmail.com"),
+    license=openapi.License(name="MIT License"),
+)
+
+_lock = threading.Lock()
+_document = None
+
+
+def build_schema():
+    """The public schema as JSON bytes, generated from the URLconf."""
+    # Imported here: serving a prebuilt file needs none of this.
+    from drf_yasg.app_settings import swagger_settings
+    from drf_yasg.codecs import OpenAPICodecJson
+    from rest_framework.test import APIRequestFactory
+    from rest_framework.views import APIView
+
+    # Views read self.request in get_queryset(), so introspection gets an
+    # anonymous GET. An empty url leaves host/schemes out: the UIs then call
+    # whichever host served them.
+    request = APIView().initialize_request(APIRequestFactory().get('/swagger.json/'))
+    generator = swagger_settings.DEFAULT_GENERATOR_CLASS(info=API_INFO, url='')
+    schema = generator.get_schema(request=request, public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def write_schema(path=None):
+    """Generate the schema into `path` (OPENAPI_SCHEMA_FILE); returns its size."""
+    path = path or settings.OPENAPI_SCHEMA_FILE
+    content = build_schema()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(content)
+    # Workers reading mid-deploy see the old file or the new one, never half.
+    os.replace(temporary, path)
+    return len(content)
+
+
+def schema_document():
+    """`(content, etag)`, read or generated at most once per process."""
+    global _document
+    if _document is None:
+        with _lock:
+            if _document is None:
+                try:
+                    with open(settings.OPENAPI_SCHEMA_FILE, 'rb') as f:
+                        content = f.read()
+                except FileNotFoundError:
+                    content = build_schema()
+                etag = '"%s"' % hashlib.md5(content, usedforsecurity=False).hexdigest()
+                _document = (content, etag)
+    return _document
+
+
+@require_safe
+def schema_json(request):
+    content, etag = schema_document()
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=settings.OPENAPI_SCHEMA_MAX_AGE)
+    return response
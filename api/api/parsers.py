@@ -0,0 +1,32 @@
+import codecs
+import io
+import re
+
+import orjson
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+# orjson reads integers this long as floats; the stdlib keeps them exact.
+_LONG_INTEGER = re.compile(rb'\d{19}')
+
+
+class ORJSONParser(JSONParser):
+    """
+    JSONParser that decodes UTF-8 request bodies with orjson. Bodies with
+    long integers, and anything orjson rejects (invalid JSON, but also
+    lone surrogates and out of range floats the stdlib accepts), go through
+    JSONParser, so the result and the error messages are the same.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        if not _LONG_INTEGER.search(body):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass
+        return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -0,0 +1,55 @@
+"""
+orjson-backed JSON renderer, the default for every API view.
+
+orjson serializes str/int/float/dict/list, UUIDs and date/time values itself
+(UTC datetimes end in `Z`, as with DRF's encoder). Anything else – Decimals,
+lazy translation strings, querysets, timedeltas – goes through DRF's
+`JSONEncoder.default`, so the output matches `JSONRenderer` byte for byte on
+compact responses. Indented output (`Accept: application/json; indent=4`) is
+left to `JSONRenderer`, and so are integers past 64 bits, which orjson
+refuses.
+
+Floats are formatted by orjson, which differs from `repr` only in exponent
+form, below 1e-4 and from 1e16 up (`1e16` for `1e+16`). A Decimal in that
+range, or not finite, sends the response through `JSONRenderer`. Plain
+floats are not checked: scanning every response for them costs as much as
+rendering it, and the API's float fields (rounded rates) never get there.
+"""
+from decimal import Decimal
+
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+_encoder = JSONEncoder()
+
+
+def default(obj):
+    if isinstance(obj, Decimal):
+        value = float(obj)
+        if value and not 1e-4 <= abs(value) < 1e16:
+            raise TypeError('Exponent form or not finite')  # render() falls back to JSONRenderer
+        return value
+    return _encoder.default(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=default, option=OPTIONS)
+        except orjson.JSONEncodeError:
+            # Big integers and the Decimals above; what JSONRenderer can't encode fails there too.
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same as JSONRenderer: U+2028/U+2029 are valid JSON but end a
+        # JavaScript string literal, so escape them for JSONP-style embedding.
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
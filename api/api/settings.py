@@ -14,8 +14,10 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 from decouple import config
 from datetime import timedelta
-from urllib.parse import urlparse
 import os
+import sys
+
+from api.db import database_from_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -24,7 +26,6 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 is_production = config('ENVIRONMENT', default="development") == 'production'
 
 FRONTEND_URL = config("FRONTEND_URL")
-print(is_production)
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
@@ -87,8 +88,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.instrumentation.ServerTimingMiddleware',
+    'api.metrics.PrometheusMiddleware',
+    'api.slow_queries.SlowQueryMiddleware',
+    'api.db_routers.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'api.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -98,11 +104,51 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Fraction of requests that get a Server-Timing header and a timing log line
+PERF_SAMPLE_RATE = config('PERF_SAMPLE_RATE', default=1.0 if DEBUG else 0.01, cast=float)
+
+# Bearer token required by /metrics; while empty the endpoint answers 404
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Slow query log (opt-in): statements over the threshold go to a rotating file
+SLOW_QUERY_LOG_ENABLED = config('SLOW_QUERY_LOG_ENABLED', default=False, cast=bool)
+SLOW_QUERY_THRESHOLD_MS = config('SLOW_QUERY_THRESHOLD_MS', default=200, cast=float)
+SLOW_QUERY_LOG_FILE = config('SLOW_QUERY_LOG_FILE', default=os.path.join(BASE_DIR, 'logs', 'slow_queries.log'))
+SLOW_QUERY_LOG_MAX_BYTES = 5 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+SLOW_QUERY_ORIGINS = ('management/views.py', 'profiles/views.py')
+
+# Response compression (api/compression.py). Brotli and zstd need the
+# `brotli` / `zstandard` packages; gzip is always available.
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
+COMPRESSION_GZIP_LEVEL = config('COMPRESSION_GZIP_LEVEL', default=6, cast=int)
+COMPRESSION_BROTLI_LEVEL = config('COMPRESSION_BROTLI_LEVEL', default=4, cast=int)
+COMPRESSION_ZSTD_LEVEL = config('COMPRESSION_ZSTD_LEVEL', default=3, cast=int)
+# BREACH: gzip bodies get up to this many random header bytes, and responses
+# under these paths (tokens, CSRF forms) or setting cookies are never compressed
+COMPRESSION_MAX_RANDOM_BYTES = 100
+COMPRESSION_EXEMPT_PATHS = ('/api/v1.0/profiles/auth/', '/admin/')
+
+# Prebuilt OpenAPI schema (api/openapi.py), written by `manage.py build_openapi_schema`
+OPENAPI_SCHEMA_FILE = config('OPENAPI_SCHEMA_FILE', default=os.path.join(BASE_DIR, 'openapi', 'swagger.json'))
+OPENAPI_SCHEMA_MAX_AGE = config('OPENAPI_SCHEMA_MAX_AGE', default=300, cast=int)
+SWAGGER_SETTINGS = {'SPEC_URL': 'schema-json'}
+REDOC_SETTINGS = {'SPEC_URL': 'schema-json'}
+
 REST_FRAMEWORK = {
        'DEFAULT_AUTHENTICATION_CLASSES': (
         #    'profiles.permissions.CookieJWTAuthentication',
            'rest_framework_simplejwt.authentication.JWTAuthentication',
        ),
+       'DEFAULT_RENDERER_CLASSES': (
+           'api.renderers.ORJSONRenderer',
+           'rest_framework.renderers.BrowsableAPIRenderer',
+       ),
+       'DEFAULT_PARSER_CLASSES': (
+           'api.parsers.ORJSONParser',
+           'rest_framework.parsers.FormParser',
+           'rest_framework.parsers.MultiPartParser',
+       ),
    }
 # REST_FRAMEWORK = {
 #     'DEFAULT_AUTHENTICATION_CLASSES': (
@@ -166,42 +212,52 @@ WSGI_APPLICATION = 'api.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
-tmpPostgres = urlparse(config("DATABASE_URL"))
-# print("Database", tmpPostgres)
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.postgresql' if is_production else 'django.db.backends.sqlite3',
-#         'NAME': tmpPostgres.path.replace('/', '') if is_production else BASE_DIR / 'tibERbu.db',
-#         'USER': tmpPostgres.username if is_production else '',
-#         'PASSWORD': tmpPostgres.password if is_production else '',
-#         'HOST': tmpPostgres.hostname if is_production else '',
-#         'PORT': config('DB_PORT') if is_production else '',
-#         'OPTIONS': {
-#             'sslmode': 'require',
-#         } if is_production else {},
-#     }
-# }
+# DATABASE_URL selects the backend (see api/db.py); SQLite when unset.
+# The test runner uses TEST_DATABASE_URL (in-memory SQLite by default).
+RUNNING_TESTS = len(sys.argv) > 1 and sys.argv[1] == 'test'
 
-DATABASES2 = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql' if is_production else 'django.db.backends.sqlite3',
-        'NAME': config('DB_NAME') if is_production else BASE_DIR / 'tibERbu.db',
-        'USER': config('DB_USER') if is_production else '',
-        'PASSWORD': config('DB_PASSWORD') if is_production else '',
-        'HOST': config('DB_HOST') if is_production else '',
-        'PORT': config('DB_PORT') if is_production else '',
-        'OPTIONS': {
-            'sslmode': 'require',
-        } if is_production else {},
-    }
-} 
+DATABASES = {
+    'default': database_from_url(
+        config('TEST_DATABASE_URL', default='sqlite://') if RUNNING_TESTS
+        else config('DATABASE_URL', default='sqlite:///tibERbu.db'),
+        base_dir=BASE_DIR,
+        conn_max_age=config('DB_CONN_MAX_AGE', default=60, cast=int),
+        pool=config('DB_POOL', default=False, cast=bool),
+        pool_min_size=config('DB_POOL_MIN_SIZE', default=2, cast=int),
+        pool_max_size=config('DB_POOL_MAX_SIZE', default=10, cast=int),
+        pool_timeout=config('DB_POOL_TIMEOUT', default=10, cast=float),
+        statement_timeout_ms=config('DB_STATEMENT_TIMEOUT_MS', default=30000, cast=int),
+        sslmode=config('DB_SSLMODE', default='require' if is_production else 'prefer'),
+    )
+}
 
-# connections for local db
+# SQLite profile for single-node deployments (WAL, busy timeout, mmap; see api/db.py)
+SQLITE_TUNING = config('SQLITE_TUNING', default=True, cast=bool)
+
+# Optional read replica: safe-method requests read from it (see api/db_routers.py)
+DATABASE_REPLICA_URL = config('TEST_DATABASE_REPLICA_URL' if RUNNING_TESTS else 'DATABASE_REPLICA_URL', default='')
+DATABASE_REPLICA_STICKY_SECONDS = config('DATABASE_REPLICA_STICKY_SECONDS', default=15, cast=int)
+DATABASE_ROUTERS = []
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = {
+        **database_from_url(
+            DATABASE_REPLICA_URL,
+            base_dir=BASE_DIR,
+            conn_max_age=DATABASES['default']['CONN_MAX_AGE'],
+            sslmode=config('DB_SSLMODE', default='require' if is_production else 'prefer'),
+        ),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['api.db_routers.PrimaryReplicaRouter']
 
-DATABASES = {
+# Cache: Redis when REDIS_URL is set (shared by all workers), else per-process memory
+REDIS_URL = config('REDIS_URL', default='')
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'tibERbu.db',
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
@@ -260,11 +316,59 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "uploads")
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Scheduling
+# Length of a bookable slot when searching doctors' free time.
+APPOINTMENT_SLOT_MINUTES = config('APPOINTMENT_SLOT_MINUTES', default=30, cast=int)
+# Appointments still open this long after their start are closed by
+# `manage.py close_past_appointments` (scheduled → no show, in progress → completed)
+APPOINTMENT_CLOSE_AFTER_HOURS = config('APPOINTMENT_CLOSE_AFTER_HOURS', default=12, cast=int)
+# Closed appointments older than this move to the archive table (`manage.py archive_appointments`)
+APPOINTMENT_RETENTION_DAYS = config('APPOINTMENT_RETENTION_DAYS', default=730, cast=int)
+# How far ahead recurring series are turned into appointments (`manage.py materialize_series`)
+APPOINTMENT_SERIES_HORIZON_DAYS = config('APPOINTMENT_SERIES_HORIZON_DAYS', default=90, cast=int)
+
+# Utilization report (management/services/utilization.py): doctor-days are
+# kept this far ahead of today by `manage.py refresh_utilization`
+UTILIZATION_AHEAD_DAYS = config('UTILIZATION_AHEAD_DAYS', default=28, cast=int)
+
+# Admin dashboard (management/services/dashboard.py): how long a computed
+# payload is served from the cache
+DASHBOARD_CACHE_SECONDS = config('DASHBOARD_CACHE_SECONDS', default=30, cast=int)
+
+# Triage (management/services/triage.py): chief complaints are scored in
+# batches by `manage.py triage_appointments`, never on the booking request.
+TRIAGE_MODEL = config('TRIAGE_MODEL', default='gpt-4o-mini')
+TRIAGE_BATCH_SIZE = config('TRIAGE_BATCH_SIZE', default=20, cast=int)
+TRIAGE_CONCURRENCY = config('TRIAGE_CONCURRENCY', default=4, cast=int)
+TRIAGE_CACHE_SECONDS = config('TRIAGE_CACHE_SECONDS', default=7 * 24 * 3600, cast=int)
+# How long a complaint the model failed to score waits before it is tried again
+TRIAGE_RETRY_SECONDS = config('TRIAGE_RETRY_SECONDS', default=15 * 60, cast=int)
+
+# Appointment reminders (management/services/reminders.py, `manage.py send_reminders`)
+REMINDER_DAY_BEFORE_HOURS = config('REMINDER_DAY_BEFORE_HOURS', default=24, cast=int)
+REMINDER_HOURS_BEFORE = config('REMINDER_HOURS_BEFORE', default=2, cast=int)
+REMINDER_BATCH_SIZE = config('REMINDER_BATCH_SIZE', default=100, cast=int)
+REMINDER_MAX_ATTEMPTS = config('REMINDER_MAX_ATTEMPTS', default=3, cast=int)
+# A claim older than this belongs to a sender that died mid-batch
+REMINDER_CLAIM_TIMEOUT_SECONDS = config('REMINDER_CLAIM_TIMEOUT_SECONDS', default=600, cast=int)
+
 # Emails 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_USE_TLS = True
-EMAIL_HOST = config('MAIL_SERVER')
-EMAIL_HOST_USER = config('MAIL_USERNAME')
-EMAIL_HOST_PASSWORD = config('MAIL_PASSWORD')
-EMAIL_PORT = config('MAIL_PORT')
-DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
\ No newline at end of file
+EMAIL_HOST = config('MAIL_SERVER', default='localhost')
+EMAIL_HOST_USER = config('MAIL_USERNAME', default='')
+EMAIL_HOST_PASSWORD = config('MAIL_PASSWORD', default='')
+EMAIL_PORT = config('MAIL_PORT', default=587, cast=int)
+DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+
+# Logging
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.performance': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
@@ -0,0 +1,160 @@
+"""
+Opt-in slow query log.
+
+With `SLOW_QUERY_LOG_ENABLED` on, every SQL statement slower than
+`SLOW_QUERY_THRESHOLD_MS` is written as a JSON line to a rotating file with its
+duration, redacted parameters (and string literals in the SQL itself), the
+database's query plan and the application
+frames (views and serializers) that issued it. `recent_entries()` reads the
+file back for the admin listing endpoint.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('api.slow_queries')
+logger.propagate = False
+
+_state = threading.local()
+_handler_lock = threading.Lock()
+# A quoted string in the statement text ('' escapes a quote), as raw SQL may carry.
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+
+def _ensure_handler():
+    if logger.handlers:
+        return
+    with _handler_lock:
+        if logger.handlers:
+            return
+        path = settings.SLOW_QUERY_LOG_FILE
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handler = RotatingFileHandler(
+            path,
+            maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+            backupCount=settings.SLOW_QUERY_LOG_BACKUPS,
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.WARNING)
+
+
+def redact(value):
+    """Keep the shape of a parameter but never its content (it may be PHI)."""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return f'<{type(value).__name__}>'
+
+
+def redact_sql(sql):
+    return _STRING_LITERAL.sub("'<str>'", sql)
+
+
+def _redact_params(params, many):
+    if params is None:
+        return None
+    if many:
+        return f'<{len(params)} parameter sets>'
+    if isinstance(params, dict):
+        return {key: redact(value) for key, value in params.items()}
+    return [redact(value) for value in params]
+
+
+def _origin_frames():
+    base = str(settings.BASE_DIR)
+    frames = []
+    for frame in traceback.extract_stack():
+        if frame.filename == __file__ or 'site-packages' in frame.filename:
+            continue
+        if frame.filename.startswith(base):
+            frames.append({
+                'file': os.path.relpath(frame.filename, base),
+                'line': frame.lineno,
+                'function': frame.name,
+                'code': frame.line,
+            })
+    return frames
+
+
+def _explain(connection, sql, params):
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+    _state.explaining = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            return [redact_sql(' '.join(str(col) for col in row)) for row in cursor.fetchall()]
+    except Exception as exc:
+        return [redact_sql(f'EXPLAIN failed: {exc}')]
+    finally:
+        _state.explaining = False
+
+
+def record(execute, sql, params, many, context):
+    if getattr(_state, 'explaining', False):
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        if duration_ms >= settings.SLOW_QUERY_THRESHOLD_MS:
+            connection = context['connection']
+            frames = _origin_frames()
+            views = [f for f in frames if f['file'].endswith(settings.SLOW_QUERY_ORIGINS)]
+            _ensure_handler()
+            logger.warning(json.dumps({
+                'at': datetime.now(timezone.utc).isoformat(),
+                'alias': connection.alias,
+                'duration_ms': round(duration_ms, 2),
+                'sql': redact_sql(sql),
+                'params': _redact_params(params, many),
+                'explain': None if many else _explain(connection, sql, params),
+                'origin': views[-1] if views else None,
+                'stack': frames,
+            }))
+
+
+def recent_entries(limit=100):
+    """Newest-first entries from the current log file."""
+    try:
+        with open(settings.SLOW_QUERY_LOG_FILE) as log_file:
+            lines = deque(log_file, maxlen=limit)
+    except FileNotFoundError:
+        return []
+    entries = []
+    for line in reversed(lines):
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries
+
+
+class SlowQueryMiddleware:
+    """Times every statement of the request; removed entirely when disabled."""
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_LOG_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record))
+            return self.get_response(request)
@@ -20,22 +20,18 @@ from django.urls import path,include
 from django.conf.urls.static import static
 from profiles.views import FunnyAPIView
 from django.views.generic import RedirectView
+from api import views as api_views
+
+from api import openapi
 
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 
 from django.conf import settings
 
+# The UIs load the prebuilt document from SPEC_URL (see api/openapi.py).
 schema_view = get_schema_view(
-   openapi.Info(
-      title="tibERbu API",
-      default_version='v1',
-      description="API documentation for tibERbu hospital management System",
-      terms_of_service="https://stevenene.vercel.app",
-      contact=openapi.Contact(email="stevekid705@gmail.com"),
-      license=openapi.License(name="MIT License"),
-   ),
+   openapi.API_INFO,
    public=True,
    permission_classes=[permissions.AllowAny],
 )
@@ -45,7 +41,11 @@ urlpatterns = [
     path('', FunnyAPIView.as_view(), name='default_view'),  # Root URL
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
-    path('swagger.json/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
+    path('swagger.json/', openapi.schema_json, name='schema-json'),
+
+    path('metrics', api_views.metrics, name='metrics'),
+    path('health/', api_views.health, name='health'),
+    path('api/v1.0/diagnostics/slow-queries/', api_views.SlowQueryListView.as_view(), name='slow-queries'),
 
     path('admin/doc/', include('django.contrib.admindocs.urls')),
     path('admin/', admin.site.urls),
@@ -0,0 +1,71 @@
+import logging
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from drf_yasg.utils import swagger_auto_schema
+
+from api import metrics as prometheus
+from api import slow_queries
+from profiles.permissions import IsAdmin
+
+logger = logging.getLogger(__name__)
+
+
+@require_GET
+def metrics(request):
+    """Prometheus scrape endpoint, protected by `METRICS_TOKEN`; off while it is unset."""
+    token = settings.METRICS_TOKEN
+    if not token:
+        raise Http404
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not constant_time_compare(supplied, token):
+        return HttpResponseForbidden()
+    payload, content_type = prometheus.render()
+    return HttpResponse(payload, content_type=content_type)
+
+
+@require_GET
+def health(request):
+    """Readiness probe: every configured database answers a trivial query."""
+    databases = {}
+    for alias in connections:
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+            databases[alias] = 'ok'
+        except DatabaseError:
+            # The error text can name hosts and users; it goes to the log only.
+            logger.exception(f"Health check failed for database '{alias}'")
+            databases[alias] = 'unavailable'
+    healthy = all(state == 'ok' for state in databases.values())
+    return JsonResponse(
+        {'status': 'ok' if healthy else 'unavailable', 'databases': databases},
+        status=200 if healthy else 503,
+    )
+
+
+class SlowQueryListView(APIView):
+    """Most recent entries of the slow query log, newest first."""
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    @swagger_auto_schema(
+        operation_summary="List slow SQL statements",
+        operation_description="Returns the latest slow query log entries (`?limit=`, default 100).",
+        tags=["Diagnostics"]
+    )
+    def get(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 100)), 1000))
+        except ValueError:
+            limit = 100
+        return Response({
+            'enabled': settings.SLOW_QUERY_LOG_ENABLED,
+            'threshold_ms': settings.SLOW_QUERY_THRESHOLD_MS,
+            'entries': slow_queries.recent_entries(limit),
+        })
@@ -1,7 +1,14 @@
 from django.contrib import admin
+from django.utils import timezone
 from django.utils.html import format_html
+
+from api.db import immediate_atomic
+from management.services import dashboard
+from management.services.archive import restore
+from management.services.waitlist import fill_cancelled_slots
 from .models import (
-    Specialization, Availability, Appointment, ClinicalAttachment
+    Specialization, Availability, Appointment, AppointmentReminder, AppointmentSeries, AppointmentStatus,
+    ArchivedAppointment, ClinicalAttachment, WaitlistEntry,
 )
 
 
@@ -38,17 +45,60 @@ class AppointmentAdmin(admin.ModelAdmin):
 
     actions = ['mark_completed', 'mark_cancelled']
 
+    def save_model(self, request, obj, form, change):
+        # A priority set here is final: mark it triaged so the scorer leaves it alone.
+        if 'priority' in form.changed_data:
+            obj.triaged_at = timezone.now()
+        super().save_model(request, obj, form, change)
+
     def mark_completed(self, request, queryset):
-        updated = queryset.update(status='completed')
+        updated = dashboard.update_status(queryset, AppointmentStatus.COMPLETED, updated_at=timezone.now())
         self.message_user(request, f"{updated} appointments marked as completed.")
     mark_completed.short_description = "Mark selected appointments as completed"
 
     def mark_cancelled(self, request, queryset):
-        updated = queryset.update(status='cancelled')
-        self.message_user(request, f"{updated} appointments cancelled.")
+        # One UPDATE for the batch, then one waitlist pass over the freed slots.
+        with immediate_atomic():
+            freed = list(queryset.filter(status=AppointmentStatus.SCHEDULED).only(
+                'id', 'patient', 'doctor', 'scheduled_date', 'start_time', 'end_time',
+            ))
+            updated = dashboard.update_status(queryset, AppointmentStatus.CANCELLED, updated_at=timezone.now())
+            refilled = fill_cancelled_slots(freed)
+        self.message_user(request, f"{updated} appointments cancelled, {len(refilled)} refilled from the waitlist.")
     mark_cancelled.short_description = "Cancel selected appointments"
 
 
+@admin.register(ArchivedAppointment)
+class ArchivedAppointmentAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'doctor', 'scheduled_date', 'status', 'archived_at')
+    list_filter = ('status',)
+    search_fields = ('patient__user__username', 'doctor__user__username')
+    list_select_related = ('patient__user', 'doctor__user')
+    date_hierarchy = 'scheduled_date'
+
+    actions = ['restore_selected']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def restore_selected(self, request, queryset):
+        restored = restore(list(queryset.values_list('pk', flat=True)))
+        self.message_user(request, f"{restored} appointments restored.")
+    restore_selected.short_description = "Restore selected appointments"
+
+
+@admin.register(AppointmentSeries)
+class AppointmentSeriesAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'doctor', 'frequency', 'interval', 'first_date', 'start_time', 'is_active')
+    list_filter = ('frequency', 'is_active')
+    search_fields = ('patient__user__username', 'doctor__user__username', 'chief_complaint')
+    list_select_related = ('patient__user', 'doctor__user')
+    readonly_fields = ('materialized_until', 'created_at', 'updated_at')
+
+
 @admin.register(ClinicalAttachment)
 class ClinicalAttachmentAdmin(admin.ModelAdmin):
     list_display = ('document_type', 'caption', 'content_object', 'is_sensitive', 'preview_file')
@@ -61,3 +111,22 @@ class ClinicalAttachmentAdmin(admin.ModelAdmin):
             return format_html('<a href="{}" target="_blank">View File</a>', obj.file.url)
         return "No file"
     preview_file.short_description = "Preview"
+
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'doctor', 'specialization', 'priority', 'status', 'created_at')
+    list_filter = ('status', 'priority', 'specialization')
+    search_fields = ('patient__user__username', 'doctor__user__username', 'chief_complaint')
+    ordering = ('-priority', 'created_at')
+    list_select_related = ('patient__user', 'doctor__user', 'specialization')
+    readonly_fields = ('appointment', 'promoted_at', 'created_at', 'updated_at')
+
+
+@admin.register(AppointmentReminder)
+class AppointmentReminderAdmin(admin.ModelAdmin):
+    list_display = ('appointment', 'kind', 'status', 'attempts', 'sent_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('appointment__patient__user__username', 'appointment__patient__user__email')
+    list_select_related = ('appointment__patient__user', 'appointment__doctor__user')
+    readonly_fields = ('appointment', 'kind', 'attempts', 'claimed_at', 'sent_at', 'last_error', 'created_at', 'updated_at')
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from management.services.archive import archive_batch, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Move closed appointments older than the retention window to the archive table, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=500, help='Appointments per transaction')
+        parser.add_argument('--pause', type=float, default=0, metavar='SECONDS',
+                            help='Sleep between batches to leave room for other writers')
+
+    def handle(self, *args, **options):
+        cutoff = retention_cutoff()
+        started = time.perf_counter()
+        total = batches = 0
+        while True:
+            moved = archive_batch(cutoff, size=options['batch'])
+            if not moved:
+                break
+            total, batches = total + moved, batches + 1
+            if options['pause']:
+                time.sleep(options['pause'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Archived {total} appointments scheduled before {cutoff:%Y-%m-%d} in {batches} batches | "
+            f"{elapsed:.2f}s, {total / elapsed if elapsed else 0:.0f} rows/s"
+        )
+        self.stdout.write(self.style.SUCCESS('Done.'))
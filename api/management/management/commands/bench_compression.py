@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.compression import available_codecs
+from api.renderers import ORJSONRenderer
+from management.management.commands.bench_renderers import serialized_rows
+
+LEVELS = {
+    'gzip': (1, 4, 6, 9),
+    'br': (1, 4, 6, 9, 11),
+    'zstd': (1, 3, 6, 12, 19),
+}
+
+
+class Command(BaseCommand):
+    help = 'Compressed size and CPU time per coding and level for an appointment list payload'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=3, help='Best of N runs')
+
+    def handle(self, *args, **options):
+        payload = ORJSONRenderer().render(serialized_rows(options['rows']), 'application/json', {})
+        self.stdout.write(f"Payload: {options['rows']} appointments, {len(payload) / 1024:,.0f} KiB uncompressed")
+
+        codecs = available_codecs()
+        for coding in LEVELS:
+            if coding not in codecs:
+                self.stdout.write(self.style.WARNING(f"{coding:<5} not installed, skipped"))
+                continue
+            codec_class, _ = codecs[coding]
+            for level in LEVELS[coding]:
+                best = None
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    compressed = codec_class(level).finish(payload)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                self.stdout.write(
+                    f"{coding:<5} level {level:>2} | {len(compressed) / 1024:8,.1f} KiB "
+                    f"({len(payload) / len(compressed):5.1f}x smaller) | {best * 1000:7.1f} ms "
+                    f"| {len(payload) / best / 1024 / 1024:6.0f} MiB/s"
+                )
+        self.stdout.write(self.style.SUCCESS('Done.'))
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request connection setup against a persistent (or pooled) connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        connection = connections[options['database']]
+        settings_dict = connection.settings_dict
+        pooled = bool(settings_dict.get('OPTIONS', {}).get('pool'))
+
+        self.stdout.write(
+            f"Backend: {connection.vendor} | CONN_MAX_AGE={settings_dict['CONN_MAX_AGE']} "
+            f"| pool={'on' if pooled else 'off'} | iterations={iterations}"
+        )
+
+        def query():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+
+        # What CONN_MAX_AGE=0 costs: a fresh connection (TLS handshake and
+        # authentication on Postgres) for every request. With a pool, close()
+        # returns the connection and the next query checks one out again.
+        connection.close()
+        start = time.perf_counter()
+        for _ in range(iterations):
+            query()
+            connection.close()
+        per_request = (time.perf_counter() - start) / iterations
+
+        # What persistent connections cost: the query alone.
+        query()
+        start = time.perf_counter()
+        for _ in range(iterations):
+            query()
+        persistent = (time.perf_counter() - start) / iterations
+        connection.close()
+
+        label = 'pool checkout + query' if pooled else 'connect + query + close'
+        self.stdout.write(f"{label:<28} {per_request * 1000:8.3f} ms/request")
+        self.stdout.write(f"{'persistent query':<28} {persistent * 1000:8.3f} ms/request")
+        saved = per_request - persistent
+        self.stdout.write(self.style.SUCCESS(
+            f"Connection overhead saved: {saved * 1000:.3f} ms/request "
+            f"({per_request / persistent if persistent else float('inf'):.1f}x)"
+        ))
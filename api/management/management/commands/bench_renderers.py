@@ -0,0 +1,90 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+from uuid import uuid4
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import ORJSONRenderer
+
+
+def serialized_rows(count):
+    """Shaped like AppointmentSerializer output: mostly strings, nested doctor/patient."""
+    now = timezone.now()
+    doctor = {
+        'user': {'id': str(uuid4()), 'username': 'dr.wanjiru', 'email': 'wanjiru@example.com'},
+        'license_number': 'KMPDC-1234', 'medical_license': 'ML-99812', 'license_jurisdiction': 'KE',
+        'specializations': [
+            {'name': 'Cardiology', 'description': 'Heart and blood vessels', 'department': 'Medicine',
+             'average_consultation_fee': '3500.00', 'is_active': True},
+        ],
+        'accepting_new_patients': True, 'experience': 12, 'rating': '4.6', 'is_available': True, 'fees': 3500,
+    }
+    return [
+        {
+            'id': str(uuid4()),
+            'doctor': doctor['user']['id'],
+            'patient': str(uuid4()),
+            'doctor_detail': doctor,
+            'patient_detail': {
+                'user': {'id': str(uuid4()), 'username': f'patient{i}', 'email': f'patient{i}@example.com'},
+                'medical_history': 'Hypertension, managed', 'known_allergies': ['penicillin'],
+            },
+            'is_admin_override': False,
+            'scheduled_date': (now + timedelta(minutes=30 * i)).isoformat().replace('+00:00', 'Z'),
+            'start_time': '09:00:00', 'end_time': '09:30:00',
+            'chief_complaint': 'Chest pain on exertion', 'status': 'scheduled', 'notes': None, 'priority': 3,
+        }
+        for i in range(count)
+    ]
+
+
+def native_rows(count):
+    """values()-style rows: UUIDs, aware datetimes, Decimals and lazy strings left for the renderer."""
+    now = timezone.now()
+    return [
+        {
+            'id': uuid4(),
+            'doctor_id': uuid4(),
+            'scheduled_date': now + timedelta(minutes=30 * i),
+            'created_at': now,
+            'average_consultation_fee': Decimal('3500.00'),
+            'rating': Decimal('4.6'),
+            'status': _('Scheduled'),
+            'priority': 3,
+        }
+        for i in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Render time of large payloads with DRF JSONRenderer vs the orjson renderer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5, help='Best of N runs')
+
+    def best_of(self, renderer, data, repeat):
+        best, output = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = renderer.render(data, 'application/json', {})
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, output
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        for label, data in (('serializer output', serialized_rows(rows)), ('native types', native_rows(rows))):
+            drf_time, drf_output = self.best_of(JSONRenderer(), data, repeat)
+            orjson_time, orjson_output = self.best_of(ORJSONRenderer(), data, repeat)
+            same = 'identical' if drf_output == orjson_output else 'DIFFERENT'
+            self.stdout.write(
+                f"{label:<18} {rows} rows, {len(drf_output) / 1024:,.0f} KiB | "
+                f"JSONRenderer {drf_time * 1000:8.1f} ms | ORJSONRenderer {orjson_time * 1000:7.1f} ms | "
+                f"{drf_time / orjson_time:5.1f}x | output {same}"
+            )
+        self.stdout.write(self.style.SUCCESS('Done.'))
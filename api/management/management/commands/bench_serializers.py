@@ -0,0 +1,120 @@
+import gc
+import time
+from datetime import time as clock, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from rest_framework.request import Request
+
+from api.compiled_serializers import compile_serializer
+from management.models import Appointment, Specialization
+from management.serializers import AppointmentSerializer
+from profiles.models import Doctor, HealthcareUser, Patient
+from profiles.serializers import UserSerializer
+
+
+class Command(BaseCommand):
+    help = 'Serialization throughput of DRF serializers vs the compiled read path (runs on a throwaway test database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5, help='Best of N runs')
+
+    def seed(self, rows):
+        specializations = [
+            Specialization.objects.create(name=name, department='Medicine', average_consultation_fee=Decimal('2500.00'))
+            for name in ('Cardiology', 'Neurology', 'Dermatology')
+        ]
+        # Unusable passwords: hashing one per user would dominate the setup.
+        doctor_count = max(rows // 20, 1)
+        users = HealthcareUser.objects.bulk_create([
+            HealthcareUser(username=f'doctor{i}', email=f'doctor{i}@example.com', password='!', role='clinician')
+            for i in range(doctor_count)
+        ] + [
+            HealthcareUser(username=f'patient{i}', email=f'patient{i}@example.com', password='!')
+            for i in range(rows - doctor_count)
+        ])
+        doctors = Doctor.objects.bulk_create([
+            Doctor(
+                user=user, license_number=f'KMPDC-{i}', medical_license=f'ML-{i}',
+                license_jurisdiction='KE', rating=Decimal('4.5'),
+            )
+            for i, user in enumerate(users[:doctor_count])
+        ])
+        for i, doctor in enumerate(doctors):
+            doctor.specializations.set(specializations[: 1 + i % 3])
+        patients = Patient.objects.bulk_create([
+            Patient(user=user, known_allergies=['penicillin']) for user in users[doctor_count:]
+        ])
+        start = timezone.now() + timedelta(days=1)
+        Appointment.objects.bulk_create([
+            Appointment(
+                patient=patients[i % len(patients)], doctor=doctors[i % len(doctors)],
+                scheduled_date=start + timedelta(minutes=30 * i), start_time=clock(9), end_time=clock(9, 30),
+                chief_complaint='Follow-up visit', priority=3,
+            )
+            for i in range(rows)
+        ])
+
+    def measure(self, label, serializer_class, queryset, repeat):
+        request = Request(RequestFactory().get('/', HTTP_HOST='localhost'))
+        context = {'request': request}
+        objects = list(queryset)
+
+        def drf():
+            return serializer_class(objects, many=True, context=context).data
+
+        def compiled():
+            row = compile_serializer(serializer_class(context=context))
+            return [row(obj) for obj in objects]
+
+        timings = {}
+        for name, run in (('drf', drf), ('compiled', compiled)):
+            best = None
+            for _ in range(repeat):
+                # As timeit does: a collection landing in one run but not the other is noise.
+                gc.collect()
+                gc.disable()
+                try:
+                    start = time.perf_counter()
+                    run()
+                    elapsed = time.perf_counter() - start
+                finally:
+                    gc.enable()
+                best = elapsed if best is None else min(best, elapsed)
+            timings[name] = best
+        self.stdout.write(
+            f"{label:<14} {len(objects)} rows | DRF {len(objects) / timings['drf']:9,.0f} rows/s "
+            f"| compiled {len(objects) / timings['compiled']:9,.0f} rows/s "
+            f"| {timings['drf'] / timings['compiled']:4.1f}x"
+        )
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.seed(rows)
+            self.measure(
+                'appointments', AppointmentSerializer,
+                Appointment.objects.select_related('doctor__user', 'patient__user')
+                .prefetch_related('doctor__specializations'),
+                repeat,
+            )
+            # UserSerializer.get_profile renders the profile through compiled
+            # rows on both sides, so only the user columns differ here.
+            self.measure(
+                'users', UserSerializer,
+                HealthcareUser.objects.select_related('patient_profile', 'clinician_profile', 'profile_image')
+                .prefetch_related('clinician_profile__specializations')[:rows],
+                repeat,
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        self.stdout.write(self.style.SUCCESS('Done.'))
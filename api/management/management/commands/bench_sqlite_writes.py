@@ -0,0 +1,79 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.db import SQLITE_PRAGMAS
+
+
+def _book(path, tuned, bookings, result_queue):
+    """One "gunicorn worker": check a slot, then book it, `bookings` times."""
+    # Django's SQLite connections run in autocommit and issue BEGIN themselves.
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    if tuned:
+        for pragma, value in SQLITE_PRAGMAS:
+            conn.execute(f'PRAGMA {pragma} = {value}')
+    begin = 'BEGIN IMMEDIATE' if tuned else 'BEGIN'
+    done = locked = 0
+    pid = os.getpid()
+    for i in range(bookings):
+        try:
+            conn.execute(begin)
+            conn.execute('SELECT COUNT(*) FROM booking WHERE slot = ?', (f'{pid}-{i}',)).fetchone()
+            conn.execute('INSERT INTO booking (slot, note) VALUES (?, ?)', (f'{pid}-{i}', 'x' * 200))
+            conn.execute('COMMIT')
+            done += 1
+        except sqlite3.OperationalError:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            locked += 1
+    conn.close()
+    result_queue.put((done, locked))
+
+
+class Command(BaseCommand):
+    help = 'Booking-style write throughput on SQLite with and without the tuned profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--bookings', type=int, default=250, help='Bookings per worker')
+
+    def run(self, tuned, workers, bookings):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.db')
+            conn = sqlite3.connect(path)
+            conn.execute('CREATE TABLE booking (id INTEGER PRIMARY KEY, slot TEXT, note TEXT)')
+            conn.execute('CREATE INDEX booking_slot ON booking (slot)')
+            conn.commit()
+            conn.close()
+
+            results = multiprocessing.Queue()
+            processes = [
+                multiprocessing.Process(target=_book, args=(path, tuned, bookings, results))
+                for _ in range(workers)
+            ]
+            start = time.perf_counter()
+            for process in processes:
+                process.start()
+            totals = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+            elapsed = time.perf_counter() - start
+
+        done = sum(t[0] for t in totals)
+        locked = sum(t[1] for t in totals)
+        return done, locked, elapsed
+
+    def handle(self, *args, **options):
+        workers, bookings = options['workers'], options['bookings']
+        self.stdout.write(f"{workers} worker processes x {bookings} bookings each")
+        for label, tuned in (('default (rollback journal, BEGIN)', False), ('tuned (WAL, BEGIN IMMEDIATE)', True)):
+            done, locked, elapsed = self.run(tuned, workers, bookings)
+            self.stdout.write(
+                f"{label:<36} {done / elapsed:9.1f} bookings/s | "
+                f"{done} booked | {locked} 'database is locked' | {elapsed:.2f}s"
+            )
+        self.stdout.write(self.style.SUCCESS('Done.'))
@@ -0,0 +1,73 @@
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# What a gunicorn worker does before serving its first request.
+BOOT = (
+    "from api.wsgi import application\n"
+    "from django.urls import get_resolver\n"
+    "get_resolver().url_patterns\n"
+)
+
+
+def parse_importtime(stderr):
+    """`-X importtime` output as (module, depth, self_us, cumulative_us) rows."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        stripped = name.lstrip()
+        depth = (len(name) - len(stripped) - 1) // 2
+        rows.append((stripped, depth, int(self_us), int(cumulative_us)))
+    return rows
+
+
+class Command(BaseCommand):
+    help = 'Worker boot time (settings, apps, middleware, URLconf) and the imports it spends it on'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Median of N cold starts')
+        parser.add_argument('--top', type=int, default=15, help='Packages and modules to list')
+
+    def run_boot(self, importtime=False):
+        command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', BOOT]
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='api.settings', PYTHONDONTWRITEBYTECODE='')
+        return subprocess.run(
+            command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+
+    def handle(self, *args, **options):
+        import time
+
+        walls = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            self.run_boot()
+            walls.append(time.perf_counter() - started)
+        self.stdout.write(
+            f"Boot wall time: median {statistics.median(walls) * 1000:.0f} ms, "
+            f"best {min(walls) * 1000:.0f} ms over {options['repeat']} runs"
+        )
+
+        rows = parse_importtime(self.run_boot(importtime=True).stderr)
+        total = sum(self_us for _, _, self_us, _ in rows)
+        self.stdout.write(f"Imports: {len(rows)} modules, {total / 1000:.0f} ms importing")
+
+        by_package = defaultdict(int)
+        for module, _, self_us, _ in rows:
+            by_package[module.split('.')[0]] += self_us
+        self.stdout.write('\nSelf time by top-level package:')
+        for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"  {self_us / 1000:7.1f} ms  {self_us / total:5.1%}  {package}")
+
+        self.stdout.write('\nSlowest first-party imports (cumulative):')
+        first_party = [row for row in rows if row[0].split('.')[0] in ('api', 'management', 'profiles')]
+        for module, _, _, cumulative_us in sorted(first_party, key=lambda row: -row[3])[:options['top']]:
+            self.stdout.write(f"  {cumulative_us / 1000:7.1f} ms  {module}")
+        self.stdout.write(self.style.SUCCESS('Done.'))
@@ -0,0 +1,21 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.openapi import write_schema
+
+
+class Command(BaseCommand):
+    help = 'Generate the OpenAPI schema served at /swagger.json/ (run at build/deploy time)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.OPENAPI_SCHEMA_FILE,
+                            help='Where to write the schema (default: OPENAPI_SCHEMA_FILE)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        size = write_schema(options['output'])
+        elapsed = (time.perf_counter() - started) * 1000
+        self.stdout.write(f"Wrote {options['output']} ({size} bytes) in {elapsed:.0f} ms")
+        self.stdout.write(self.style.SUCCESS('Done.'))
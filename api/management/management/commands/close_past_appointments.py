@@ -0,0 +1,49 @@
+import time
+from uuid import UUID
+
+from django.core.management.base import BaseCommand, CommandError
+
+from management.services.lifecycle import close_stale_chunk, stale_before
+
+
+class Command(BaseCommand):
+    help = 'Close appointments whose time has passed (scheduled → no show, in progress → completed), in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk', type=int, default=500, help='Appointments per transaction')
+        parser.add_argument('--start-after', default=None, metavar='PK',
+                            help='Resume after this appointment id (printed by an interrupted run)')
+        parser.add_argument('--pause', type=float, default=0, metavar='SECONDS',
+                            help='Sleep between chunks to leave room for other writers')
+
+    def handle(self, *args, **options):
+        try:
+            last = UUID(options['start_after']) if options['start_after'] else None
+        except ValueError:
+            raise CommandError('--start-after must be an appointment id.')
+        cutoff = stale_before()
+        totals, chunks = {}, 0
+        started = time.perf_counter()
+        try:
+            while True:
+                pk, closed = close_stale_chunk(cutoff, after=last, size=options['chunk'])
+                if pk is None:
+                    break
+                last, chunks = pk, chunks + 1
+                for status, count in closed.items():
+                    totals[status] = totals.get(status, 0) + count
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"Chunk {chunks}: {closed} (through {last})")
+                if options['pause']:
+                    time.sleep(options['pause'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING(f"Interrupted; resume with --start-after {last}"))
+
+        elapsed = time.perf_counter() - started
+        total = sum(totals.values())
+        self.stdout.write(
+            f"Closed {total} appointments started before {cutoff:%Y-%m-%d %H:%M} in {chunks} chunks "
+            f"({', '.join(f'{count} {status}' for status, count in totals.items()) or 'none'}) | "
+            f"{elapsed:.2f}s, {total / elapsed if elapsed else 0:.0f} rows/s"
+        )
+        self.stdout.write(self.style.SUCCESS('Done.'))
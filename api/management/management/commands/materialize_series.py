@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from api.db import immediate_atomic
+from management.models import AppointmentSeries
+from management.services.series import horizon, materialize
+
+
+class Command(BaseCommand):
+    help = 'Book the occurrences of recurring appointment series up to the scheduling horizon'
+
+    def handle(self, *args, **options):
+        through = horizon()
+        pending = AppointmentSeries.objects.filter(is_active=True).exclude(materialized_until__gte=through)
+        created = series_count = failed = 0
+        for pk in list(pending.values_list('pk', flat=True)):
+            # The conflict check and the insert share the write lock with API bookings.
+            try:
+                with immediate_atomic():
+                    series = AppointmentSeries.objects.get(pk=pk)
+                    occurrences, skipped = materialize(series, through)
+            except Exception as e:  # one series failing must not stop the rest
+                failed += 1
+                self.stderr.write(f"Series {pk} not materialized: {e}")
+                continue
+            created += len(occurrences)
+            series_count += 1
+            for day, reason in sorted(skipped.items()):
+                self.stdout.write(self.style.WARNING(f"{series}: {day} skipped ({reason})"))
+        self.stdout.write(f"Booked {created} appointments for {series_count} series through {through}")
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} series failed; they are retried on the next run"))
+        self.stdout.write(self.style.SUCCESS('Done.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from management.services.dashboard import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recount the admin dashboard counters from the source tables and fix any that drifted'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Corrected {reconcile()} counters")
+        self.stdout.write(self.style.SUCCESS('Done.'))
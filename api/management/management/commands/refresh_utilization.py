@@ -0,0 +1,24 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from management.services.utilization import refresh
+
+
+class Command(BaseCommand):
+    help = 'Recompute the doctor-days of the utilization report that changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', default=None, metavar='YYYY-MM-DD',
+                            help='Recompute every day from this date instead of only the changed ones')
+
+    def handle(self, *args, **options):
+        try:
+            since = date.fromisoformat(options['since']) if options['since'] else None
+        except ValueError:
+            raise CommandError('--since must be YYYY-MM-DD.')
+        run = refresh(since=since)
+        self.stdout.write(
+            f"Refreshed {run.days_refreshed} days through {run.covered_through} in {run.duration_ms} ms"
+        )
+        self.stdout.write(self.style.SUCCESS('Done.'))
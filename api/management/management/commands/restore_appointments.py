@@ -0,0 +1,31 @@
+from uuid import UUID
+
+from django.core.management.base import BaseCommand, CommandError
+
+from management.models import ArchivedAppointment
+from management.services.archive import restore
+
+
+class Command(BaseCommand):
+    help = 'Move archived appointments back to the appointment table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', help='Archived appointment ids')
+        parser.add_argument('--patient', default=None, help='Restore every archived appointment of this patient')
+        parser.add_argument('--batch', type=int, default=500, help='Appointments per transaction')
+
+    def handle(self, *args, **options):
+        try:
+            ids = [UUID(pk) for pk in options['ids']]
+            patient = UUID(options['patient']) if options['patient'] else None
+        except ValueError:
+            raise CommandError('Ids must be UUIDs.')
+        if not ids and patient is None:
+            raise CommandError('Give archived appointment ids or --patient.')
+
+        if patient is not None:
+            ids += ArchivedAppointment.objects.filter(patient_id=patient).values_list('pk', flat=True)
+        size = options['batch']
+        restored = sum(restore(ids[i:i + size]) for i in range(0, len(ids), size))
+        self.stdout.write(f"Restored {restored} of {len(ids)} appointments")
+        self.stdout.write(self.style.SUCCESS('Done.'))
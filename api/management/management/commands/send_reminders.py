@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from management.models import ReminderStatus
+from management.services.reminders import enqueue, release_stale_claims, send_due
+
+
+class Command(BaseCommand):
+    help = 'Enqueue and send appointment reminder emails (each reminder is sent at most once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=None, help='Reminders per mail connection')
+        parser.add_argument('--watch', type=float, default=None, metavar='SECONDS',
+                            help='Keep running, ticking every SECONDS')
+
+    def tick(self, batch):
+        stale = release_stale_claims()
+        enqueued = enqueue()
+        totals = {}
+        while True:
+            outcome = send_due(batch)
+            for status, count in outcome.items():
+                totals[status] = totals.get(status, 0) + count
+            # Empty, or delivery is failing: leave the retries for the next tick.
+            if not outcome or ReminderStatus.PENDING in outcome:
+                return stale, enqueued, totals
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            stale, enqueued, totals = self.tick(options['batch'])
+            if stale or enqueued or totals or options['watch'] is None:
+                self.stdout.write(
+                    f"Enqueued {enqueued}, sent {totals.get(ReminderStatus.SENT, 0)}, "
+                    f"skipped {totals.get(ReminderStatus.SKIPPED, 0)}, "
+                    f"to retry {totals.get(ReminderStatus.PENDING, 0)}, "
+                    f"failed {totals.get(ReminderStatus.FAILED, 0) + stale} "
+                    f"({time.perf_counter() - started:.1f} s)"
+                )
+            if options['watch'] is None:
+                break
+            time.sleep(options['watch'])
+        self.stdout.write(self.style.SUCCESS('Done.'))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from management.services.triage import triage_pending
+
+
+class Command(BaseCommand):
+    help = 'Score the chief complaints of untriaged appointments into their priority'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk', type=int, default=200, help='Appointments per pass')
+        parser.add_argument('--watch', type=float, default=None, metavar='SECONDS',
+                            help='Keep running, checking for new appointments every SECONDS')
+
+    def drain(self, chunk):
+        total, skipped = 0, 0
+        while True:
+            # Rows that failed are held back until their triage_retry_at, so
+            # the next pass doesn't fetch them again.
+            triaged, failed = triage_pending(limit=chunk)
+            total += triaged
+            skipped += len(failed)
+            if triaged + len(failed) < chunk:
+                return total, skipped
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            triaged, skipped = self.drain(options['chunk'])
+            if triaged or skipped or options['watch'] is None:
+                self.stdout.write(
+                    f"Triaged {triaged} appointments, {skipped} left for a later run "
+                    f"({time.perf_counter() - started:.1f} s)"
+                )
+            if options['watch'] is None:
+                break
+            time.sleep(options['watch'])
+        self.stdout.write(self.style.SUCCESS('Done.'))
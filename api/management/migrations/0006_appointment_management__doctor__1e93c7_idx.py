@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0005_prescription_created_at_prescription_issued_by_and_more'),
+        ('profiles', '0002_doctor_profiles_do_is_avai_3f8b5d_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'scheduled_date'], name='management__doctor__1e93c7_idx'),
+        ),
+    ]
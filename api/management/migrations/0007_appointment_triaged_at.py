@@ -0,0 +1,22 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0006_appointment_management__doctor__1e93c7_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='triaged_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('triaged_at__isnull', True)), fields=['created_at'], name='appointment_untriaged_idx'),
+        ),
+    ]
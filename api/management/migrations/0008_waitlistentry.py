@@ -0,0 +1,40 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:33
+
+import django.core.validators
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0007_appointment_triaged_at'),
+        ('profiles', '0002_doctor_profiles_do_is_avai_3f8b5d_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('priority', models.PositiveSmallIntegerField(default=3, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)])),
+                ('chief_complaint', models.TextField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('waiting', 'Waiting'), ('promoted', 'Promoted'), ('withdrawn', 'Withdrawn')], default='waiting', max_length=20)),
+                ('promoted_at', models.DateTimeField(blank=True, null=True)),
+                ('appointment', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waitlist_entry', to='management.appointment')),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='profiles.doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='profiles.patient')),
+                ('specialization', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='management.specialization')),
+            ],
+            options={
+                'verbose_name': 'Waitlist Entry',
+                'verbose_name_plural': 'Waitlist Entries',
+                'ordering': ['-priority', 'created_at'],
+                'indexes': [models.Index(condition=models.Q(('status', 'waiting')), fields=['doctor', '-priority', 'created_at'], name='waitlist_doctor_queue_idx'), models.Index(condition=models.Q(('doctor__isnull', True), ('status', 'waiting')), fields=['specialization', '-priority', 'created_at'], name='waitlist_specialty_queue_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(('doctor__isnull', False), ('specialization__isnull', False), _connector='OR'), name='waitlist_doctor_or_specialization')],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:36
+
+import django.core.validators
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0008_waitlistentry'),
+        ('profiles', '0002_doctor_profiles_do_is_avai_3f8b5d_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentSeries',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('frequency', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly')], default='weekly', max_length=10)),
+                ('interval', models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)])),
+                ('first_date', models.DateField()),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('count', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('until', models.DateField(blank=True, null=True)),
+                ('chief_complaint', models.TextField(blank=True, null=True)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('priority', models.PositiveSmallIntegerField(default=3, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)])),
+                ('is_active', models.BooleanField(default=True)),
+                ('materialized_until', models.DateField(blank=True, editable=False, null=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appointment_series', to='profiles.doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appointment_series', to='profiles.patient')),
+            ],
+            options={
+                'verbose_name': 'Appointment Series',
+                'verbose_name_plural': 'Appointment Series',
+            },
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='series',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='management.appointmentseries'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['series', 'scheduled_date'], name='appointment_series_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointmentseries',
+            index=models.Index(fields=['is_active', 'materialized_until'], name='management__is_acti_ca7f22_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointmentseries',
+            constraint=models.CheckConstraint(condition=models.Q(('end_time__gt', models.F('start_time'))), name='series_end_after_start'),
+        ),
+    ]
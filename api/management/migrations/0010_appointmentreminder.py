@@ -0,0 +1,36 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:39
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0009_appointmentseries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentReminder',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('kind', models.CharField(choices=[('day_before', 'Day before'), ('hour_before', 'Hours before')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('skipped', 'Skipped'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('appointment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='management.appointment')),
+            ],
+            options={
+                'verbose_name': 'Appointment Reminder',
+                'verbose_name_plural': 'Appointment Reminders',
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['created_at'], name='reminder_pending_idx'), models.Index(condition=models.Q(('status', 'sending')), fields=['claimed_at'], name='reminder_sending_idx')],
+                'constraints': [models.UniqueConstraint(fields=('appointment', 'kind'), name='unique_appointment_reminder')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0010_appointmentreminder'),
+        ('profiles', '0002_doctor_profiles_do_is_avai_3f8b5d_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appointment',
+            name='status',
+            field=models.CharField(choices=[('scheduled', 'Scheduled'), ('cancelled', 'Cancelled'), ('completed', 'Completed'), ('in_progress', 'In Progress'), ('no_show', 'No Show')], default='scheduled', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status__in', ['scheduled', 'in_progress'])), fields=['id'], name='appointment_open_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:44
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0011_appointment_no_show'),
+        ('profiles', '0002_doctor_profiles_do_is_avai_3f8b5d_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('scheduled_date', models.DateTimeField()),
+                ('is_admin_override', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('cancelled', 'Cancelled'), ('completed', 'Completed'), ('in_progress', 'In Progress'), ('no_show', 'No Show')], max_length=20)),
+                ('chief_complaint', models.TextField(blank=True, null=True)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('priority', models.PositiveSmallIntegerField(default=3)),
+                ('triaged_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_appointments', to='profiles.doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_appointments', to='profiles.patient')),
+                ('series', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_occurrences', to='management.appointmentseries')),
+            ],
+            options={
+                'verbose_name': 'Archived Appointment',
+                'verbose_name_plural': 'Archived Appointments',
+            },
+        ),
+        migrations.AddField(
+            model_name='clinicalattachment',
+            name='archived_appointment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='records', to='management.archivedappointment'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedappointment',
+            index=models.Index(fields=['scheduled_date'], name='management__schedul_dc42d0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedappointment',
+            index=models.Index(fields=['patient', 'scheduled_date'], name='management__patient_9170d1_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:47
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0012_archivedappointment'),
+        ('profiles', '0002_doctor_profiles_do_is_avai_3f8b5d_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorDailyUtilization',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('available_minutes', models.PositiveIntegerField(default=0)),
+                ('booked_minutes', models.PositiveIntegerField(default=0)),
+                ('appointments', models.PositiveIntegerField(default=0)),
+                ('completed', models.PositiveIntegerField(default=0)),
+                ('no_shows', models.PositiveIntegerField(default=0)),
+                ('cancellations', models.PositiveIntegerField(default=0)),
+                ('is_stale', models.BooleanField(default=False)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Doctor Daily Utilization',
+                'verbose_name_plural': 'Doctor Daily Utilization',
+            },
+        ),
+        migrations.CreateModel(
+            name='UtilizationRefresh',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('started_at', models.DateTimeField()),
+                ('watermark', models.DateTimeField()),
+                ('covered_through', models.DateField()),
+                ('days_refreshed', models.PositiveIntegerField(default=0)),
+                ('duration_ms', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'get_latest_by': 'started_at',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['updated_at'], name='appointment_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='doctordailyutilization',
+            name='doctor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_utilization', to='profiles.doctor'),
+        ),
+        migrations.AddIndex(
+            model_name='doctordailyutilization',
+            index=models.Index(fields=['day'], name='management__day_743ea3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctordailyutilization',
+            index=models.Index(condition=models.Q(('is_stale', True)), fields=['day'], name='utilization_stale_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='doctordailyutilization',
+            constraint=models.UniqueConstraint(fields=('doctor', 'day'), name='unique_doctor_utilization_day'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0013_doctordailyutilization'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=40)),
+                ('dimension', models.CharField(blank=True, default='', max_length=60)),
+                ('day', models.DateField()),
+                ('value', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Dashboard Counter',
+                'verbose_name_plural': 'Dashboard Counters',
+                'constraints': [models.UniqueConstraint(fields=('metric', 'dimension', 'day'), name='unique_dashboard_counter')],
+            },
+        ),
+    ]
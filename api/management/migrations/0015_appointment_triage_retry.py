@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-19 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0014_dashboardcounter'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='appointment_untriaged_idx',
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='triage_retry_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedappointment',
+            name='triage_retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('chief_complaint__gt', ''), ('status', 'scheduled'), ('triaged_at__isnull', True)), fields=['created_at'], name='appointment_untriaged_idx'),
+        ),
+    ]
@@ -24,6 +24,32 @@ class AppointmentStatus(models.TextChoices):
     CANCELLED = 'cancelled', 'Cancelled'
     COMPLETED = 'completed', 'Completed'
     IN_PROGRESS = 'in_progress', 'In Progress'
+    NO_SHOW = 'no_show', 'No Show'
+
+
+class SeriesFrequency(models.TextChoices):
+    DAILY = 'daily', 'Daily'
+    WEEKLY = 'weekly', 'Weekly'
+    MONTHLY = 'monthly', 'Monthly'
+
+
+class WaitlistStatus(models.TextChoices):
+    WAITING = 'waiting', 'Waiting'
+    PROMOTED = 'promoted', 'Promoted'
+    WITHDRAWN = 'withdrawn', 'Withdrawn'
+
+
+class ReminderKind(models.TextChoices):
+    DAY_BEFORE = 'day_before', 'Day before'
+    HOUR_BEFORE = 'hour_before', 'Hours before'
+
+
+class ReminderStatus(models.TextChoices):
+    PENDING = 'pending', 'Pending'
+    SENDING = 'sending', 'Sending'
+    SENT = 'sent', 'Sent'
+    SKIPPED = 'skipped', 'Skipped'
+    FAILED = 'failed', 'Failed'
 
 
 class WeekDay(models.IntegerChoices):
@@ -108,6 +134,11 @@ class Availability(BaseUUIDModel, TimeStampedModel):
         return f"{self.doctor} | {self.get_weekday_display()} {self.start_time}-{self.end_time}"
 
 
+# Scheduled appointments with a complaint and no priority decided yet; the
+# triage queue (management/services/triage.py) and the condition of its index.
+UNTRIAGED = models.Q(triaged_at__isnull=True, status=AppointmentStatus.SCHEDULED, chief_complaint__gt='')
+
+
 class Appointment(BaseUUIDModel, TimeStampedModel):
     patient = models.ForeignKey('profiles.Patient', on_delete=models.CASCADE)
     doctor = models.ForeignKey('profiles.Doctor', null=True, blank=True, on_delete=models.SET_NULL)
@@ -120,6 +151,13 @@ class Appointment(BaseUUIDModel, TimeStampedModel):
     chief_complaint = models.TextField(blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
     priority = models.PositiveSmallIntegerField(default=3, validators=[MinValueValidator(1), MaxValueValidator(5)])
+    # Set once the priority is decided: the chief complaint was scored
+    # (management/services/triage.py) or staff set the priority themselves.
+    triaged_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # A failed scoring isn't retried before this
+    triage_retry_at = models.DateTimeField(null=True, blank=True, editable=False)
+    series = models.ForeignKey('AppointmentSeries', null=True, blank=True, on_delete=models.SET_NULL,
+                               related_name='occurrences')
 
     class Meta:
         verbose_name = "Clinical Appointment"
@@ -128,10 +166,161 @@ class Appointment(BaseUUIDModel, TimeStampedModel):
             models.UniqueConstraint(fields=['doctor', 'scheduled_date'], name='unique_doctor_appointment_time',
                                     condition=models.Q(status=AppointmentStatus.SCHEDULED))
         ]
-        indexes = [models.Index(fields=['scheduled_date', '-priority'])]
+        indexes = [
+            models.Index(fields=['scheduled_date', '-priority']),
+            models.Index(fields=['doctor', 'scheduled_date']),
+            models.Index(fields=['created_at'], name='appointment_untriaged_idx', condition=UNTRIAGED),
+            models.Index(fields=['series', 'scheduled_date'], name='appointment_series_idx'),
+            # Changes since the last utilization refresh (management/services/utilization.py)
+            models.Index(fields=['updated_at'], name='appointment_updated_idx'),
+            # Open appointments in key order, for closing the past ones in chunks
+            models.Index(fields=['id'], name='appointment_open_idx', condition=models.Q(
+                status__in=[AppointmentStatus.SCHEDULED, AppointmentStatus.IN_PROGRESS])),
+        ]
         
     def __str__(self):
-        return f"{self.patient.user.username} - {self.doctor.user.username if self.doctor else 'Unassigned'} on {self.scheduled_time} ({self.get_status_display()})"
+        return f"{self.patient.user.username} - {self.doctor.user.username if self.doctor else 'Unassigned'} on {self.scheduled_date} ({self.get_status_display()})"
+
+
+class ArchivedAppointment(BaseUUIDModel):
+    """
+    Cold copy of an Appointment past APPOINTMENT_RETENTION_DAYS, with the same
+    columns (timestamps included) plus `archived_at`. Rows move here and back
+    through management/services/archive.py, keeping their id.
+    """
+    patient = models.ForeignKey('profiles.Patient', on_delete=models.CASCADE, related_name='archived_appointments')
+    doctor = models.ForeignKey('profiles.Doctor', null=True, blank=True, on_delete=models.SET_NULL,
+                               related_name='archived_appointments')
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    scheduled_date = models.DateTimeField()
+    is_admin_override = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=AppointmentStatus.choices)
+    chief_complaint = models.TextField(blank=True, null=True)
+    notes = models.TextField(blank=True, null=True)
+    priority = models.PositiveSmallIntegerField(default=3)
+    triaged_at = models.DateTimeField(null=True, blank=True)
+    triage_retry_at = models.DateTimeField(null=True, blank=True)
+    series = models.ForeignKey('AppointmentSeries', null=True, blank=True, on_delete=models.SET_NULL,
+                               related_name='archived_occurrences')
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Archived Appointment"
+        verbose_name_plural = "Archived Appointments"
+        indexes = [
+            models.Index(fields=['scheduled_date']),
+            models.Index(fields=['patient', 'scheduled_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.patient} on {self.scheduled_date} ({self.get_status_display()}, archived)"
+
+
+class AppointmentSeries(BaseUUIDModel, TimeStampedModel):
+    """
+    Recurring appointments, RRULE-style: every `interval` days/weeks/months
+    from `first_date`, ending after `count` occurrences, on `until`, or never.
+    Occurrences become Appointment rows over a rolling horizon
+    (management/services/series.py); `materialized_until` is how far that got.
+    """
+    patient = models.ForeignKey('profiles.Patient', on_delete=models.CASCADE, related_name='appointment_series')
+    doctor = models.ForeignKey('profiles.Doctor', on_delete=models.CASCADE, related_name='appointment_series')
+    frequency = models.CharField(max_length=10, choices=SeriesFrequency.choices, default=SeriesFrequency.WEEKLY)
+    interval = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)])
+    first_date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    count = models.PositiveSmallIntegerField(null=True, blank=True)
+    until = models.DateField(null=True, blank=True)
+    chief_complaint = models.TextField(blank=True, null=True)
+    notes = models.TextField(blank=True, null=True)
+    priority = models.PositiveSmallIntegerField(default=3, validators=[MinValueValidator(1), MaxValueValidator(5)])
+    is_active = models.BooleanField(default=True)
+    materialized_until = models.DateField(null=True, blank=True, editable=False)
+
+    class Meta:
+        verbose_name = "Appointment Series"
+        verbose_name_plural = "Appointment Series"
+        constraints = [
+            models.CheckConstraint(check=models.Q(end_time__gt=models.F('start_time')), name='series_end_after_start'),
+        ]
+        indexes = [models.Index(fields=['is_active', 'materialized_until'])]
+
+    def __str__(self):
+        return f"{self.patient} with {self.doctor}, {self.get_frequency_display().lower()} from {self.first_date}"
+
+
+class WaitlistEntry(BaseUUIDModel, TimeStampedModel):
+    """
+    A patient waiting for a slot with one doctor, or with any doctor of a
+    specialization. Queues are served by priority (higher first), then by
+    request time; see management/services/waitlist.py.
+    """
+    patient = models.ForeignKey('profiles.Patient', on_delete=models.CASCADE, related_name='waitlist_entries')
+    doctor = models.ForeignKey('profiles.Doctor', null=True, blank=True, on_delete=models.CASCADE)
+    specialization = models.ForeignKey(Specialization, null=True, blank=True, on_delete=models.CASCADE)
+    priority = models.PositiveSmallIntegerField(default=3, validators=[MinValueValidator(1), MaxValueValidator(5)])
+    chief_complaint = models.TextField(blank=True, null=True)
+    status = models.CharField(max_length=20, choices=WaitlistStatus.choices, default=WaitlistStatus.WAITING)
+    appointment = models.OneToOneField(Appointment, null=True, blank=True, on_delete=models.SET_NULL,
+                                       related_name='waitlist_entry')
+    promoted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Waitlist Entry"
+        verbose_name_plural = "Waitlist Entries"
+        ordering = ['-priority', 'created_at']
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(doctor__isnull=False) | models.Q(specialization__isnull=False),
+                name='waitlist_doctor_or_specialization',
+            ),
+        ]
+        # The head of a queue is the first row of one of these.
+        indexes = [
+            models.Index(fields=['doctor', '-priority', 'created_at'], name='waitlist_doctor_queue_idx',
+                         condition=models.Q(status=WaitlistStatus.WAITING)),
+            models.Index(fields=['specialization', '-priority', 'created_at'], name='waitlist_specialty_queue_idx',
+                         condition=models.Q(status=WaitlistStatus.WAITING, doctor__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.patient} waiting for {self.doctor or self.specialization} ({self.get_status_display()})"
+
+
+class AppointmentReminder(BaseUUIDModel, TimeStampedModel):
+    """
+    Delivery state of one reminder email. The (appointment, kind) constraint
+    makes enqueueing idempotent and the status makes sending happen once;
+    see management/services/reminders.py.
+    """
+    appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='reminders')
+    kind = models.CharField(max_length=20, choices=ReminderKind.choices)
+    status = models.CharField(max_length=20, choices=ReminderStatus.choices, default=ReminderStatus.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Appointment Reminder"
+        verbose_name_plural = "Appointment Reminders"
+        constraints = [
+            models.UniqueConstraint(fields=['appointment', 'kind'], name='unique_appointment_reminder'),
+        ]
+        # The send queue; also what the email_queue_depth gauge counts.
+        indexes = [
+            models.Index(fields=['created_at'], name='reminder_pending_idx',
+                         condition=models.Q(status=ReminderStatus.PENDING)),
+            models.Index(fields=['claimed_at'], name='reminder_sending_idx',
+                         condition=models.Q(status=ReminderStatus.SENDING)),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} reminder for {self.appointment_id} ({self.get_status_display()})"
 
 
 class TimeOff(BaseUUIDModel, TimeStampedModel):
@@ -152,6 +341,9 @@ class ClinicalAttachment(BaseUUIDModel, TimeStampedModel):
     object_id = models.UUIDField()
     content_object = GenericForeignKey()
     appointment = models.ForeignKey(Appointment, on_delete=models.SET_NULL, null=True, blank=True, related_name='records')
+    # Takes over from `appointment` while the appointment is archived
+    archived_appointment = models.ForeignKey(ArchivedAppointment, on_delete=models.SET_NULL, null=True, blank=True,
+                                             related_name='records')
     file = models.FileField(upload_to="clinical_attachments/",
                             validators=[FileExtensionValidator(allowed_extensions=['pdf', 'jpg', 'dcm'])])
     document_type = models.CharField(max_length=50, choices=ClinicalDocumentType.choices)
@@ -182,3 +374,78 @@ class Prescription(BaseUUIDModel, TimeStampedModel):
     
     def __str__(self):
         return f"{self.medication_name} for {self.medical_record.appointment.patient.user.get_full_name()}"
+
+
+class DoctorDailyUtilization(BaseUUIDModel):
+    """
+    One doctor-day of the utilization report, recomputed by
+    `manage.py refresh_utilization` when the day changes
+    (management/services/utilization.py). Minutes are booked and available
+    clinic time; the counts cover archived appointments too.
+    """
+    doctor = models.ForeignKey('profiles.Doctor', on_delete=models.CASCADE, related_name='daily_utilization')
+    day = models.DateField()
+    available_minutes = models.PositiveIntegerField(default=0)
+    booked_minutes = models.PositiveIntegerField(default=0)
+    appointments = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    no_shows = models.PositiveIntegerField(default=0)
+    cancellations = models.PositiveIntegerField(default=0)
+    # Set when something was deleted from the day; the next refresh redoes it
+    is_stale = models.BooleanField(default=False)
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Doctor Daily Utilization"
+        verbose_name_plural = "Doctor Daily Utilization"
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'day'], name='unique_doctor_utilization_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day']),
+            models.Index(fields=['day'], name='utilization_stale_idx', condition=models.Q(is_stale=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor} on {self.day}: {self.booked_minutes}/{self.available_minutes} min"
+
+
+class UtilizationRefresh(BaseUUIDModel):
+    """A run of the utilization refresh; the latest one is where the next starts."""
+    started_at = models.DateTimeField()
+    # Appointment, availability and time off changes up to here are included
+    watermark = models.DateTimeField()
+    # Every doctor-day up to here has been computed at least once
+    covered_through = models.DateField()
+    days_refreshed = models.PositiveIntegerField(default=0)
+    duration_ms = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        get_latest_by = 'started_at'
+
+    def __str__(self):
+        return f"Utilization refresh at {self.started_at} ({self.days_refreshed} days)"
+
+
+class DashboardCounter(models.Model):
+    """
+    A running count behind the admin dashboard: `metric` rows per
+    `dimension` (a status, "role/status", ...) per day. Signals keep it
+    current and `manage.py reconcile_dashboard` corrects any drift; see
+    management/services/dashboard.py.
+    """
+    metric = models.CharField(max_length=40)
+    dimension = models.CharField(max_length=60, blank=True, default='')
+    day = models.DateField()
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Dashboard Counter"
+        verbose_name_plural = "Dashboard Counters"
+        constraints = [
+            models.UniqueConstraint(fields=['metric', 'dimension', 'day'], name='unique_dashboard_counter'),
+        ]
+
+    def __str__(self):
+        return f"{self.metric}[{self.dimension}] {self.day}: {self.value}"
@@ -1,9 +1,14 @@
 from rest_framework import serializers
 from .models import Specialization,Availability, WeekDay,Appointment,ClinicalAttachment,Prescription,TimeOff
+from .models import AppointmentSeries, ArchivedAppointment, WaitlistEntry, WaitlistStatus
+from django.utils import timezone
 from profiles.models import Doctor,Patient,HealthcareUser
+from api.mixins import SparseFieldsSerializerMixin
+from management.services.series import occurrence_dates
+from itertools import islice
 # from profiles.serializers import DoctorSerializer
 # from profiles.serializers import DoctorSerializer
-class SpecializationSerializer(serializers.ModelSerializer):
+class SpecializationSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Specialization
         fields = [
@@ -65,7 +70,7 @@ class PatientSerializer(serializers.ModelSerializer):
             'permanent_medications', 'emergency_contacts', 'primary_insurance'
         ]
 
-class AvailabilitySerializer(serializers.ModelSerializer):
+class AvailabilitySerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     doctor = serializers.PrimaryKeyRelatedField(queryset=Doctor.objects.all())  # This will be a FK to Doctor model
     doctor_detail = DoctorSerializer(source='doctor', read_only=True)
     weekday = serializers.ChoiceField(choices=WeekDay.choices)  # If WeekDay is a tuple of choices
@@ -101,7 +106,7 @@ class AvailabilitySerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('End time must be after start time.')
         return data
     
-class AppointmentSerializer(serializers.ModelSerializer):
+class AppointmentSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     doctor = serializers.PrimaryKeyRelatedField(queryset=Doctor.objects.all())
     doctor_detail = DoctorSerializer(source='doctor', read_only=True)
     patient = serializers.PrimaryKeyRelatedField(queryset=Patient.objects.all())
@@ -124,6 +129,20 @@ class AppointmentSerializer(serializers.ModelSerializer):
             'priority'
         ]
         read_only_fields = ['created_at', 'updated_at']
+
+    def validate(self, attrs):
+        # A priority set here is final: mark it triaged so the scorer leaves it alone.
+        current = self.instance.priority if self.instance is not None else Appointment._meta.get_field('priority').default
+        if attrs.get('priority', current) != current:
+            attrs['triaged_at'] = timezone.now()
+        return attrs
+
+
+class ArchivedAppointmentSerializer(AppointmentSerializer):
+    """Read-only: an archived appointment, shaped like a live one plus `archived_at`."""
+    class Meta(AppointmentSerializer.Meta):
+        model = ArchivedAppointment
+        fields = AppointmentSerializer.Meta.fields + ['archived_at']
         
 
 # class ClinicalAttachmentSerializer(serializers.ModelSerializer):
@@ -138,7 +157,7 @@ class AppointmentSerializer(serializers.ModelSerializer):
 #             'updated_at'
 #         ]
 #         read_only_fields = ['created_at', 'updated_at']
-class ClinicalAttachmentSerializer(serializers.ModelSerializer):
+class ClinicalAttachmentSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = ClinicalAttachment
         fields = '__all__'  # Serialize all fields in the model
@@ -147,7 +166,7 @@ class ClinicalAttachmentSerializer(serializers.ModelSerializer):
         # You can add custom validation logic here if needed
         return attrs
     
-class PrescriptionSerializer(serializers.ModelSerializer):
+class PrescriptionSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """Serializer to display and receive Prescription data."""
     issued_by = DoctorSerializer(read_only=True)
     medical_record = ClinicalAttachmentSerializer(read_only=True)
@@ -162,7 +181,7 @@ class PrescriptionSerializer(serializers.ModelSerializer):
         # You can add custom validation logic here if needed
         return attrs
     
-class TimeOffSerializer(serializers.ModelSerializer):
+class TimeOffSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     doctor = serializers.PrimaryKeyRelatedField(queryset=Doctor.objects.all())
     doctor_detail = DoctorSerializer(source='doctor', read_only=True)
     class Meta:
@@ -184,4 +203,139 @@ class TimeOffSerializer(serializers.ModelSerializer):
         """Custom validation to ensure start_datetime is before end_datetime"""
         if attrs['start_datetime'] >= attrs['end_datetime']:
             raise serializers.ValidationError("start_datetime must be earlier than end_datetime.")
-        return attrs
\ No newline at end of file
+        return attrs
+
+class AppointmentSeriesSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    MAX_OCCURRENCES = 500
+
+    doctor = serializers.PrimaryKeyRelatedField(queryset=Doctor.objects.all())
+    patient = serializers.PrimaryKeyRelatedField(queryset=Patient.objects.all())
+
+    class Meta:
+        model = AppointmentSeries
+        fields = [
+            'id',
+            'patient',
+            'doctor',
+            'frequency',
+            'interval',
+            'first_date',
+            'start_time',
+            'end_time',
+            'count',
+            'until',
+            'chief_complaint',
+            'notes',
+            'priority',
+            'is_active',
+            'materialized_until',
+            'created_at',
+            'updated_at'
+        ]
+        read_only_fields = ['is_active', 'materialized_until', 'created_at', 'updated_at']
+
+    def validate_count(self, value):
+        if value is not None and not 1 <= value <= self.MAX_OCCURRENCES:
+            raise serializers.ValidationError(f"Choose between 1 and {self.MAX_OCCURRENCES} occurrences.")
+        return value
+
+    def validate(self, attrs):
+        if attrs['end_time'] <= attrs['start_time']:
+            raise serializers.ValidationError('End time must be after start time.')
+        if attrs['first_date'] < timezone.localdate():
+            raise serializers.ValidationError({'first_date': ['The series cannot start in the past.']})
+        if attrs.get('until') and attrs['until'] < attrs['first_date']:
+            raise serializers.ValidationError({'until': ['Must be on or after first_date.']})
+        if attrs.get('until') and attrs.get('count') is None:
+            # A new series is checked in full, so `until` gets the same cap as `count`.
+            rule = AppointmentSeries(
+                frequency=attrs['frequency'], interval=attrs.get('interval', 1),
+                first_date=attrs['first_date'], until=attrs['until'],
+            )
+            if next(islice(occurrence_dates(rule), self.MAX_OCCURRENCES, None), None) is not None:
+                raise serializers.ValidationError({'until': [
+                    f"The series would have more than {self.MAX_OCCURRENCES} occurrences; choose an earlier date."
+                ]})
+        return attrs
+
+
+class SeriesFollowingSerializer(serializers.Serializer):
+    """A "this and following" change: `from` plus the fields to change."""
+    doctor = serializers.PrimaryKeyRelatedField(queryset=Doctor.objects.all(), required=False)
+    start_time = serializers.TimeField(required=False)
+    end_time = serializers.TimeField(required=False)
+    priority = serializers.IntegerField(min_value=1, max_value=5, required=False)
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    chief_complaint = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['from'] = serializers.DateField()  # a keyword, so not a class attribute
+        return fields
+
+
+class WaitlistEntrySerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    doctor = serializers.PrimaryKeyRelatedField(queryset=Doctor.objects.all(), required=False, allow_null=True)
+    patient = serializers.PrimaryKeyRelatedField(queryset=Patient.objects.all())
+
+    class Meta:
+        model = WaitlistEntry
+        fields = [
+            'id',
+            'patient',
+            'doctor',
+            'specialization',
+            'priority',
+            'chief_complaint',
+            'status',
+            'appointment',
+            'promoted_at',
+            'created_at',
+            'updated_at'
+        ]
+        read_only_fields = ['appointment', 'promoted_at', 'created_at', 'updated_at']
+
+    def validate_status(self, value):
+        current = self.instance.status if self.instance else WaitlistStatus.WAITING
+        if value != current and value != WaitlistStatus.WITHDRAWN:
+            raise serializers.ValidationError("Entries can only be withdrawn; promotion happens on cancellations.")
+        return value
+
+    def validate(self, attrs):
+        doctor = attrs.get('doctor', getattr(self.instance, 'doctor', None))
+        specialization = attrs.get('specialization', getattr(self.instance, 'specialization', None))
+        if doctor is None and specialization is None:
+            raise serializers.ValidationError("Choose a doctor or a specialization to wait for.")
+        return attrs
+
+# Compact shapes for the doctor calendar: patients are listed once and
+# appointments refer to them by id.
+class CalendarPatientSerializer(serializers.ModelSerializer):
+    id = serializers.UUIDField(source='user_id')
+    username = serializers.CharField(source='user.username')
+    first_name = serializers.CharField(source='user.first_name')
+    last_name = serializers.CharField(source='user.last_name')
+
+    class Meta:
+        model = Patient
+        fields = ['id', 'username', 'first_name', 'last_name', 'known_allergies']
+
+
+class CalendarAppointmentSerializer(serializers.ModelSerializer):
+    patient = serializers.UUIDField(source='patient_id')
+
+    class Meta:
+        model = Appointment
+        fields = ['id', 'patient', 'scheduled_date', 'start_time', 'end_time', 'status', 'priority', 'chief_complaint']
+
+
+class CalendarAvailabilitySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Availability
+        fields = ['id', 'weekday', 'start_time', 'end_time', 'is_available']
+
+
+class CalendarTimeOffSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TimeOff
+        fields = ['id', 'start_datetime', 'end_datetime', 'reason', 'is_approved']
@@ -0,0 +1,103 @@
+"""
+Moving old appointments to the archive table and back.
+
+Closed appointments (completed, cancelled, no-show) older than
+APPOINTMENT_RETENTION_DAYS are moved to ArchivedAppointment in batches by
+`manage.py archive_appointments`. The hot table, and its indexes and cache
+footprint, then only hold the retention window.
+
+Each batch runs in one short transaction:
+
+1. The oldest `size` closed appointments are read off the
+   (scheduled_date, -priority) index.
+2. They are copied with one bulk_create, keeping their id and timestamps.
+3. Clinical attachments follow, with one UPDATE per link. The
+   `appointment` FK moves to `archived_appointment`, and generic
+   `content_object` links switch content type.
+4. The originals are deleted. Their reminders go with them, and their
+   dashboard counters drop and utilization days are flagged once for the
+   whole batch.
+
+`restore` does the reverse for any set of ids (`manage.py
+restore_appointments`). Reads that should see both tables pass
+`?include_archived=true` to the appointment endpoints.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from api.db import immediate_atomic
+from management.models import Appointment, AppointmentStatus, ArchivedAppointment, ClinicalAttachment
+from management.services import dashboard, utilization
+
+CLOSED_STATUSES = (AppointmentStatus.COMPLETED, AppointmentStatus.CANCELLED, AppointmentStatus.NO_SHOW)
+
+# Every Appointment column has a namesake on ArchivedAppointment.
+FIELDS = [field.attname for field in Appointment._meta.concrete_fields]
+
+
+def retention_cutoff(now=None):
+    return (now or timezone.now()) - timedelta(days=settings.APPOINTMENT_RETENTION_DAYS)
+
+
+def _move_attachments(pks, to_archive, now):
+    if to_archive:
+        ClinicalAttachment.objects.filter(appointment_id__in=pks).update(
+            archived_appointment=F('appointment'), appointment=None, updated_at=now,
+        )
+    else:
+        ClinicalAttachment.objects.filter(archived_appointment_id__in=pks).update(
+            appointment=F('archived_appointment'), archived_appointment=None, updated_at=now,
+        )
+    content_types = ContentType.objects.get_for_models(Appointment, ArchivedAppointment)
+    hot, cold = content_types[Appointment], content_types[ArchivedAppointment]
+    source, target = (hot, cold) if to_archive else (cold, hot)
+    ClinicalAttachment.objects.filter(content_type=source, object_id__in=pks).update(content_type=target, updated_at=now)
+
+
+def archive_batch(cutoff, size=500):
+    """Archive up to `size` closed appointments scheduled before `cutoff`. Returns how many."""
+    now = timezone.now()
+    with immediate_atomic():
+        queryset = Appointment.objects.filter(status__in=CLOSED_STATUSES, scheduled_date__lt=cutoff).order_by(
+            'scheduled_date',
+        )
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        batch = list(queryset.only(*FIELDS)[:size])
+        if not batch:
+            return 0
+        pks = [appointment.pk for appointment in batch]
+        ArchivedAppointment.objects.bulk_create([
+            ArchivedAppointment(archived_at=now, **{name: getattr(appointment, name) for name in FIELDS})
+            for appointment in batch
+        ])
+        _move_attachments(pks, to_archive=True, now=now)
+        with dashboard.batched(), utilization.batched():
+            Appointment.objects.filter(pk__in=pks).delete()
+    return len(batch)
+
+
+def restore(pks):
+    """Move the archived appointments in `pks` back to the hot table. Returns how many."""
+    now = timezone.now()
+    with immediate_atomic():
+        batch = list(ArchivedAppointment.objects.filter(pk__in=pks))
+        if not batch:
+            return 0
+        pks = [archived.pk for archived in batch]
+        restored = Appointment.objects.bulk_create([
+            Appointment(**{name: getattr(archived, name) for name in FIELDS}) for archived in batch
+        ])
+        dashboard.count(Appointment, added=[dashboard.snapshot(appointment) for appointment in restored])
+        # bulk_create stamps created_at with now; put the original back.
+        Appointment.objects.filter(pk__in=pks).update(created_at=Subquery(
+            ArchivedAppointment.objects.filter(pk=OuterRef('pk')).values('created_at')[:1]
+        ))
+        _move_attachments(pks, to_archive=False, now=now)
+        ArchivedAppointment.objects.filter(pk__in=pks).delete()
+    return len(batch)
@@ -0,0 +1,265 @@
+"""
+Admin dashboard aggregates.
+
+The dashboard shows appointments by status and day, new users by role and
+status, and active prescriptions. Each figure is a sum over DashboardCounter
+rows, one counter per (metric, dimension, day), not a COUNT over the source
+tables:
+
+- APPOINTMENTS: per status, per scheduled day. Archiving deletes from the
+  hot table, so the figures cover the retention window.
+- USERS: per "role/status", per day joined.
+- PRESCRIPTIONS_STARTED and PRESCRIPTIONS_ENDED: per start and end date.
+  The active count today is the number started by today minus the number
+  ended before today.
+
+Signals (management/signals.py) move the counters with F() increments
+inside the writing transaction. A create counts +1, a delete −1, and a
+change of a counted field moves one from the old counter to the new.
+
+Bulk writes send no signals, so the services that make them move the
+counters themselves, with one bump per batch:
+
+- `count` with the `snapshot`s of rows they bulk_create (series occurrences, waitlist
+  promotions, restored appointments).
+- `update_status` in place of `queryset.update(status=...)` (closing
+  past appointments, cancelling a series, the admin actions).
+- `batched` around a bulk delete, whose per-row signals then add up to
+  a single bump (archiving).
+
+`reconcile`, run periodically by `manage.py reconcile_dashboard`, catches
+what is left (raw SQL, a concurrent change between a batch's read and its
+UPDATE). It recounts the source tables with GROUP BY and rewrites the
+counters that differ.
+
+`dashboard()` serves the payload from the cache for DASHBOARD_CACHE_SECONDS.
+A miss takes a handful of aggregate queries over the counter table.
+"""
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from api.db import immediate_atomic
+from management.models import Appointment, DashboardCounter, Prescription
+from profiles.models import HealthcareUser
+
+APPOINTMENTS = 'appointments'
+USERS = 'users'
+PRESCRIPTIONS_STARTED = 'prescriptions_started'
+PRESCRIPTIONS_ENDED = 'prescriptions_ended'
+
+CACHE_KEY = 'dashboard:v1'
+# Appointment days shown around today, new users counted over the last NEW_USER_DAYS.
+PAST_DAYS, NEXT_DAYS, NEW_USER_DAYS = 6, 7, 30
+
+# The deltas collected by an open `batched()` block on this thread.
+_batch = threading.local()
+
+
+def _appointment_keys(status, scheduled_date):
+    return [(APPOINTMENTS, status, timezone.localdate(scheduled_date))]
+
+
+def _user_keys(role, status, date_joined):
+    return [(USERS, f'{role}/{status}', timezone.localdate(date_joined))]
+
+
+def _prescription_keys(start_date, end_date):
+    keys = [(PRESCRIPTIONS_STARTED, '', start_date)]
+    if end_date is not None:
+        keys.append((PRESCRIPTIONS_ENDED, '', end_date))
+    return keys
+
+
+# Model: (the fields its counters depend on, their counter keys from those values)
+TRACKED = {
+    Appointment: (('status', 'scheduled_date'), _appointment_keys),
+    HealthcareUser: (('role', 'status', 'date_joined'), _user_keys),
+    Prescription: (('start_date', 'end_date'), _prescription_keys),
+}
+
+
+def snapshot(instance):
+    """The counted field values as loaded, or None if any was deferred."""
+    fields, _ = TRACKED[type(instance)]
+    if any(name not in instance.__dict__ for name in fields):
+        return None
+    return tuple(instance.__dict__[name] for name in fields)
+
+
+def keys(model, values):
+    return TRACKED[model][1](*values)
+
+
+def bump(deltas):
+    """
+    Apply {(metric, dimension, day): delta} with F() increments: one INSERT
+    for missing counters and one UPDATE per distinct delta.
+    """
+    pending = getattr(_batch, 'deltas', None)
+    if pending is not None:
+        pending.update(deltas)
+        return
+    by_delta = defaultdict(list)
+    for key, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(key)
+    if not by_delta:
+        return
+    # Missing counters start at zero; ignore_conflicts leaves ones created meanwhile alone.
+    DashboardCounter.objects.bulk_create([
+        DashboardCounter(metric=metric, dimension=dimension, day=day)
+        for group in by_delta.values() for metric, dimension, day in group
+    ], ignore_conflicts=True)
+    now = timezone.now()
+    for delta, group in by_delta.items():
+        match = Q()
+        for metric, dimension, day in group:
+            match |= Q(metric=metric, dimension=dimension, day=day)
+        DashboardCounter.objects.filter(match).update(value=F('value') + delta, updated_at=now)
+
+
+@contextmanager
+def batched():
+    """Collect the bumps made inside the block and apply them once, at its end."""
+    if getattr(_batch, 'deltas', None) is not None:
+        yield
+        return
+    _batch.deltas = Counter()
+    try:
+        yield
+        deltas = _batch.deltas
+    finally:
+        _batch.deltas = None
+    bump(deltas)
+
+
+def count(model, added=(), removed=()):
+    """Move the counters for rows added and removed, each given as its TRACKED field values."""
+    deltas = Counter()
+    for values in removed:
+        for key in keys(model, values):
+            deltas[key] -= 1
+    for values in added:
+        for key in keys(model, values):
+            deltas[key] += 1
+    bump(deltas)
+
+
+def record_change(model, old, new):
+    """Move the counts from the `old` field values to the `new` (either may be None)."""
+    count(model, added=[new] if new is not None else (), removed=[old] if old is not None else ())
+
+
+def update_status(queryset, status, **fields):
+    """
+    `queryset.update(status=status, **fields)` for appointments, moving their
+    counters in the same transaction. Returns the number of rows updated.
+    """
+    with immediate_atomic():
+        rows = list(queryset.exclude(status=status).values_list('status', 'scheduled_date'))
+        updated = queryset.update(status=status, **fields)
+        count(Appointment, added=[(status, scheduled) for _, scheduled in rows], removed=rows)
+    return updated
+
+
+def true_counts():
+    counts = Counter()
+    for row in Appointment.objects.annotate(day=TruncDate('scheduled_date')).values('status', 'day').annotate(
+        total=Count('id'),
+    ).order_by():
+        counts[(APPOINTMENTS, row['status'], row['day'])] = row['total']
+    for row in HealthcareUser.objects.annotate(day=TruncDate('date_joined')).values('role', 'status', 'day').annotate(
+        total=Count('id'),
+    ).order_by():
+        counts[(USERS, f"{row['role']}/{row['status']}", row['day'])] = row['total']
+    for day, total in Prescription.objects.values_list('start_date').annotate(total=Count('id')).order_by():
+        counts[(PRESCRIPTIONS_STARTED, '', day)] = total
+    for day, total in Prescription.objects.exclude(end_date__isnull=True).values_list('end_date').annotate(
+        total=Count('id'),
+    ).order_by():
+        counts[(PRESCRIPTIONS_ENDED, '', day)] = total
+    return counts
+
+
+def reconcile():
+    """Rewrite the counters that differ from a fresh count. Returns how many were off."""
+    now = timezone.now()
+    with immediate_atomic():
+        truth = true_counts()
+        current = {
+            (counter.metric, counter.dimension, counter.day): counter
+            for counter in DashboardCounter.objects.all()
+        }
+        changed, created, emptied, off = [], [], [], 0
+        for key in truth.keys() | current.keys():
+            value, counter = truth.get(key, 0), current.get(key)
+            if counter is None:
+                created.append(DashboardCounter(metric=key[0], dimension=key[1], day=key[2], value=value))
+            elif not value:
+                emptied.append(counter.pk)
+                if not counter.value:  # brought to zero by deletes, not drift
+                    continue
+            elif counter.value != value:
+                counter.value, counter.updated_at = value, now
+                changed.append(counter)
+            else:
+                continue
+            off += 1
+        DashboardCounter.objects.bulk_create(created)
+        DashboardCounter.objects.bulk_update(changed, ['value', 'updated_at'], batch_size=500)
+        DashboardCounter.objects.filter(pk__in=emptied).delete()
+    cache.delete(CACHE_KEY)
+    return off
+
+
+def compute(today=None):
+    today = today or timezone.localdate()
+    counters = DashboardCounter.objects.filter
+
+    by_day = defaultdict(dict)
+    for day, status, value in counters(
+        metric=APPOINTMENTS, day__gte=today - timedelta(days=PAST_DAYS), day__lte=today + timedelta(days=NEXT_DAYS),
+    ).exclude(value=0).values_list('day', 'dimension', 'value').order_by('day'):
+        by_day[day.isoformat()][status] = value
+
+    new_users = defaultdict(dict)
+    for dimension, total in counters(metric=USERS, day__gt=today - timedelta(days=NEW_USER_DAYS)).values_list(
+        'dimension',
+    ).annotate(total=Sum('value')).order_by():
+        role, status = dimension.split('/', 1)
+        if total:
+            new_users[role][status] = total
+
+    def total(**filters):
+        return counters(**filters).aggregate(total=Sum('value'))['total'] or 0
+
+    return {
+        'generated_at': timezone.now(),
+        'appointments': {
+            'by_status': {
+                status: value for status, value in counters(metric=APPOINTMENTS).values_list('dimension').annotate(
+                    value=Sum('value'),
+                ).order_by() if value
+            },
+            'by_day': by_day,
+        },
+        'new_users': {'days': NEW_USER_DAYS, 'by_role': new_users},
+        'active_prescriptions': total(metric=PRESCRIPTIONS_STARTED, day__lte=today)
+                                - total(metric=PRESCRIPTIONS_ENDED, day__lt=today),
+    }
+
+
+def dashboard():
+    payload = cache.get(CACHE_KEY)
+    if payload is None:
+        payload = compute()
+        cache.set(CACHE_KEY, payload, settings.DASHBOARD_CACHE_SECONDS)
+    return payload
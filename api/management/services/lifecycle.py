@@ -0,0 +1,65 @@
+"""
+Closing appointments whose time has passed.
+
+An appointment still SCHEDULED APPOINTMENT_CLOSE_AFTER_HOURS after its
+start becomes NO_SHOW, and one still IN_PROGRESS becomes COMPLETED. Left
+open, they would stay in the partial unique constraint on (doctor,
+scheduled_date) and in every "upcoming" and busy-slot query forever.
+
+`close_stale_chunk` closes one chunk: the next `size` stale appointments
+after a primary key, in primary-key order, with one UPDATE per status in a
+short transaction, so locks are only held for one chunk. The chunk is read
+off `appointment_open_idx`, a partial index over open appointments in key
+order, so closed history is never scanned. (That is on PostgreSQL; SQLite
+won't match a partial index against bound parameters and walks the primary
+key instead.)
+
+The last key of a chunk is where a stopped run resumes (`--start-after`).
+Re-running from the start is safe too, since closed rows no longer match.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from api.db import immediate_atomic
+from management.models import Appointment, AppointmentStatus
+from management.services import dashboard
+
+TRANSITIONS = {
+    AppointmentStatus.SCHEDULED: AppointmentStatus.NO_SHOW,
+    AppointmentStatus.IN_PROGRESS: AppointmentStatus.COMPLETED,
+}
+
+
+def stale_before(now=None):
+    return (now or timezone.now()) - timedelta(hours=settings.APPOINTMENT_CLOSE_AFTER_HOURS)
+
+
+def close_stale_chunk(cutoff, after=None, size=500):
+    """
+    Close up to `size` appointments that started before `cutoff`, after the
+    primary key `after`. Returns (last pk of the chunk, {new status: rows});
+    the pk is None once nothing is left.
+    """
+    stale = Appointment.objects.filter(status__in=list(TRANSITIONS), scheduled_date__lt=cutoff)
+    if after is not None:
+        stale = stale.filter(pk__gt=after)
+    rows = list(stale.order_by('pk').values_list('pk', 'status')[:size])
+    if not rows:
+        return None, {}
+
+    by_status = defaultdict(list)
+    for pk, status in rows:
+        by_status[status].append(pk)
+    now = timezone.now()
+    closed = {}
+    with immediate_atomic():
+        for status, pks in by_status.items():
+            # Same conditions again: the row may have moved on since the read.
+            closed[TRANSITIONS[status]] = dashboard.update_status(
+                Appointment.objects.filter(pk__in=pks, status=status, scheduled_date__lt=cutoff),
+                TRANSITIONS[status], updated_at=now,
+            )
+    return rows[-1][0], closed
@@ -0,0 +1,181 @@
+"""
+Appointment reminder emails.
+
+Every scheduled appointment gets a reminder REMINDER_DAY_BEFORE_HOURS ahead
+and another REMINDER_HOURS_BEFORE ahead. `manage.py send_reminders` runs
+ticks of two steps:
+
+1. `enqueue` gives each kind its own time bucket of upcoming appointments:
+   (hours_before, day_before] for the day-before reminder and (now,
+   hours_before] for the short one. Each bucket is one range scan of the
+   (scheduled_date, -priority) index. Appointments that already have that
+   reminder are dropped by an anti-join on the (appointment, kind)
+   constraint. An appointment booked inside the short bucket only gets the
+   short reminder. The count returned is of the rows actually inserted, not
+   of those a concurrent scheduler got to first.
+
+   The day-before bucket is most of a day wide but only moves by the time
+   between ticks. After a tick, its end and start time are kept in the cache
+   (WATERMARK_KEY), and the next tick scans only appointments past that end
+   or updated since that start (through `appointment_updated_idx`), since
+   the rest were enqueued then. Without a watermark (first tick, cache
+   cleared, LocMemCache in a fresh process) the whole bucket is scanned.
+2. `send_due` claims a batch of pending reminders, sends them over one mail
+   connection and records the outcome with one UPDATE per outcome.
+
+A tick touches the appointments of the next REMINDER_DAY_BEFORE_HOURS and
+the reminders due, however large the tables grow.
+
+Reminders are sent at most once. A reminder is claimed (pending → sending)
+before it is sent and marked sent right after. If the sender dies between
+the two, the claim goes stale after REMINDER_CLAIM_TIMEOUT_SECONDS and
+`release_stale_claims` marks it failed instead of sending it again; failed
+reminders show up in the admin. Delivery errors are retried on later ticks
+up to REMINDER_MAX_ATTEMPTS.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from api.db import immediate_atomic
+from management.models import Appointment, AppointmentReminder, AppointmentStatus, ReminderKind, ReminderStatus
+
+logger = logging.getLogger(__name__)
+
+# (start of the last enqueue, end of its day-before bucket)
+WATERMARK_KEY = 'reminders:enqueued:v1'
+# Covers appointments saved just before a tick but committed after its scan.
+OVERLAP = timedelta(minutes=1)
+
+
+def _buckets(now):
+    short = now + timedelta(hours=settings.REMINDER_HOURS_BEFORE)
+    long = now + timedelta(hours=settings.REMINDER_DAY_BEFORE_HOURS)
+    return [(ReminderKind.HOUR_BEFORE, now, short), (ReminderKind.DAY_BEFORE, short, long)]
+
+
+def enqueue(now=None):
+    """Create the reminders that have come due. Returns how many."""
+    now = now or timezone.now()
+    watermark = cache.get(WATERMARK_KEY)
+    created = 0
+    for kind, start, end in _buckets(now):  # the day-before bucket comes last
+        due = Appointment.objects.filter(
+            status=AppointmentStatus.SCHEDULED, scheduled_date__gt=start, scheduled_date__lte=end,
+        )
+        if kind == ReminderKind.DAY_BEFORE and watermark is not None and watermark[0] <= now:
+            last_run, scanned_through = watermark
+            due = due.filter(Q(scheduled_date__gt=scanned_through) | Q(updated_at__gte=last_run - OVERLAP))
+        due = due.exclude(reminders__kind=kind).order_by('scheduled_date', '-priority').values_list('pk', flat=True)
+        reminders = [AppointmentReminder(appointment_id=pk, kind=kind) for pk in due]
+        if not reminders:
+            continue
+        # ignore_conflicts: another scheduler may have enqueued the same ones,
+        # and those keep their own ids, so only ours are found afterwards.
+        AppointmentReminder.objects.bulk_create(reminders, ignore_conflicts=True)
+        created += AppointmentReminder.objects.filter(pk__in=[reminder.pk for reminder in reminders]).count()
+    cache.set(WATERMARK_KEY, (now, end), None)
+    return created
+
+
+def release_stale_claims(now=None):
+    """Fail reminders whose sender died mid-batch; they may have gone out already."""
+    now = now or timezone.now()
+    return AppointmentReminder.objects.filter(
+        status=ReminderStatus.SENDING,
+        claimed_at__lt=now - timedelta(seconds=settings.REMINDER_CLAIM_TIMEOUT_SECONDS),
+    ).update(status=ReminderStatus.FAILED, last_error='Sender stopped before recording delivery.', updated_at=now)
+
+
+def _claim(batch_size, now):
+    with immediate_atomic():
+        queryset = AppointmentReminder.objects.filter(status=ReminderStatus.PENDING).order_by('created_at')
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        AppointmentReminder.objects.filter(pk__in=pks).update(
+            status=ReminderStatus.SENDING, claimed_at=now, attempts=F('attempts') + 1, updated_at=now,
+        )
+    return pks
+
+
+def reminder_message(reminder):
+    appointment = reminder.appointment
+    user = appointment.patient.user
+    when = timezone.localtime(appointment.scheduled_date)
+    with_doctor = ''
+    if appointment.doctor:
+        with_doctor = f" with Dr. {appointment.doctor.user.get_full_name() or appointment.doctor.user.username}"
+    body = (
+        f"Hi {user.first_name or user.username},\n\n"
+        f"This is a reminder of your appointment{with_doctor} on {when:%A %d %B} at {appointment.start_time:%H:%M}.\n\n"
+        "If you can no longer attend, please cancel it so the slot can go to another patient."
+    )
+    return EmailMessage(
+        subject="Appointment reminder", body=body, from_email=settings.EMAIL_HOST_USER, to=[user.email],
+    )
+
+
+def send_due(batch_size=None, now=None):
+    """
+    Claim and send up to `batch_size` pending reminders. Returns
+    {status: count} for the batch; an empty dict means the queue was empty.
+    """
+    now = now or timezone.now()
+    pks = _claim(batch_size or settings.REMINDER_BATCH_SIZE, now)
+    if not pks:
+        return {}
+
+    reminders = AppointmentReminder.objects.filter(pk__in=pks).select_related(
+        'appointment__patient__user', 'appointment__doctor__user',
+    )
+    outcome, errors, live = defaultdict(list), {}, []
+    for reminder in reminders:
+        appointment = reminder.appointment
+        # Cancelled, completed or missed since it was enqueued.
+        if appointment.status != AppointmentStatus.SCHEDULED or appointment.scheduled_date <= now \
+                or not appointment.patient.user.email:
+            outcome[ReminderStatus.SKIPPED].append(reminder.pk)
+        else:
+            live.append(reminder)
+
+    try:
+        with get_connection() as mail:
+            for reminder in live:
+                try:
+                    mail.send_messages([reminder_message(reminder)])
+                    outcome[ReminderStatus.SENT].append(reminder.pk)
+                except Exception as e:
+                    errors[reminder] = str(e)
+    except Exception as e:  # opening the connection failed; nothing went out
+        errors.update({reminder: str(e) for reminder in live if reminder.pk not in outcome[ReminderStatus.SENT]})
+
+    retry = defaultdict(list)
+    for reminder, error in errors.items():
+        logger.error(f"Reminder {reminder.pk} not sent: {error}")
+        given_up = reminder.attempts >= settings.REMINDER_MAX_ATTEMPTS  # counted by the claim
+        retry[(ReminderStatus.FAILED if given_up else ReminderStatus.PENDING, error)].append(reminder.pk)
+
+    if outcome[ReminderStatus.SENT]:
+        AppointmentReminder.objects.filter(pk__in=outcome[ReminderStatus.SENT]).update(
+            status=ReminderStatus.SENT, sent_at=timezone.now(), updated_at=now,
+        )
+    if outcome[ReminderStatus.SKIPPED]:
+        AppointmentReminder.objects.filter(pk__in=outcome[ReminderStatus.SKIPPED]).update(
+            status=ReminderStatus.SKIPPED, updated_at=now,
+        )
+    for (status, error), failed in retry.items():
+        AppointmentReminder.objects.filter(pk__in=failed).update(status=status, last_error=error, updated_at=now)
+        outcome[status].extend(failed)
+    return {status: len(pks) for status, pks in outcome.items() if pks}
+
+
+def queue_depth():
+    return AppointmentReminder.objects.filter(status=ReminderStatus.PENDING).count()
@@ -0,0 +1,165 @@
+"""
+Earliest free appointment slots across the doctors of a specialization, and
+conflict checks for many prospective slots of one doctor (`find_conflicts`).
+
+Availability, approved time off and booked appointments for every candidate
+doctor are fetched in one query each over the search horizon, so the number of
+queries does not depend on how many doctors the specialization has. The sweep
+then walks the horizon day by day: every slot found on a given day is earlier
+than any slot on the next one, so once `k` doctors have a slot the remaining
+days are skipped.
+"""
+import heapq
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from management.models import Appointment, AppointmentStatus, Availability, TimeOff
+from profiles.models import Doctor
+
+BUSY_STATUSES = (AppointmentStatus.SCHEDULED, AppointmentStatus.IN_PROGRESS)
+
+
+def _aware(day, at):
+    return timezone.make_aware(datetime.combine(day, at))
+
+
+def _first_free_slot(blocks, busy, not_before, slot):
+    """
+    First `slot`-long window inside `blocks` that starts at or after
+    `not_before` and overlaps nothing in `busy`. Slots stay on the grid that
+    starts at each availability block.
+    """
+    for block_start, block_end in blocks:
+        start = block_start
+        if start < not_before:
+            steps = -(-(not_before - block_start) // slot)
+            start = block_start + steps * slot
+        while start + slot <= block_end:
+            end = start + slot
+            clash = next((b_end for b_start, b_end in busy if b_start < end and b_end > start), None)
+            if clash is None:
+                return start, end
+            steps = -(-(clash - block_start) // slot)
+            start = block_start + steps * slot
+    return None
+
+
+def earliest_slots(specialization, k=5, start=None, horizon_days=14):
+    """
+    The `k` doctors in `specialization` with the earliest free slot, as
+    `(start, end, doctor)` tuples ordered by start.
+    """
+    now = timezone.localtime()
+    not_before = max(now, start or now)
+    first_day = timezone.localtime(not_before).date()
+    window_start = _aware(first_day, time.min)
+    window_end = window_start + timedelta(days=horizon_days)
+    slot = timedelta(minutes=settings.APPOINTMENT_SLOT_MINUTES)
+
+    doctors = Doctor.objects.filter(specializations=specialization, is_available=True).values('pk')
+
+    weekly = defaultdict(lambda: defaultdict(list))
+    for doctor_id, weekday, block_start, block_end in (
+        Availability.objects.filter(doctor__in=doctors, is_available=True)
+        .order_by('start_time')
+        .values_list('doctor_id', 'weekday', 'start_time', 'end_time')
+    ):
+        weekly[weekday][doctor_id].append((block_start, block_end))
+
+    busy = defaultdict(list)
+    for doctor_id, scheduled, busy_start, busy_end in (
+        Appointment.objects.filter(
+            doctor__in=doctors, status__in=BUSY_STATUSES,
+            scheduled_date__gte=window_start, scheduled_date__lt=window_end,
+        ).values_list('doctor_id', 'scheduled_date', 'start_time', 'end_time')
+    ):
+        day = timezone.localtime(scheduled).date()
+        busy[doctor_id].append((_aware(day, busy_start), _aware(day, busy_end)))
+    for doctor_id, off_start, off_end in (
+        TimeOff.objects.filter(
+            doctor__in=doctors, is_approved=True,
+            start_datetime__lt=window_end, end_datetime__gt=window_start,
+        ).values_list('doctor_id', 'start_datetime', 'end_datetime')
+    ):
+        busy[doctor_id].append((off_start, off_end))
+
+    found = []
+    remaining = {doctor_id for by_doctor in weekly.values() for doctor_id in by_doctor}
+    for offset in range(horizon_days):
+        if len(found) >= k or not remaining:
+            break
+        day = first_day + timedelta(days=offset)
+        day_start = _aware(day, time.min)
+        day_end = day_start + timedelta(days=1)
+        candidates = []
+        for doctor_id, blocks in weekly[day.weekday()].items():
+            if doctor_id not in remaining:
+                continue
+            free = _first_free_slot(
+                [(_aware(day, s), _aware(day, e)) for s, e in blocks],
+                [(s, e) for s, e in busy[doctor_id] if s < day_end and e > day_start],
+                not_before,
+                slot,
+            )
+            if free is not None:
+                heapq.heappush(candidates, (free[0], free[1], doctor_id))
+        while candidates and len(found) < k:
+            free_start, free_end, doctor_id = heapq.heappop(candidates)
+            found.append((free_start, free_end, doctor_id))
+            remaining.discard(doctor_id)
+
+    details = Doctor.objects.select_related('user').only(
+        'user__id', 'user__username', 'user__first_name', 'user__last_name', 'fees', 'rating',
+    ).in_bulk([doctor_id for *_, doctor_id in found])
+    return [(free_start, free_end, details[doctor_id]) for free_start, free_end, doctor_id in found]
+
+
+def find_conflicts(doctor_id, slots, exclude=None):
+    """
+    Which of `slots` – `(start, end)` aware datetimes – the doctor can't take,
+    as `{index: reason}`. A slot must lie inside an available weekly block
+    and clear approved time off and other booked appointments (minus the
+    `exclude` queryset/pks). Three queries, however many slots there are.
+    """
+    if not slots:
+        return {}
+    window_start = _aware(timezone.localtime(min(start for start, _ in slots)).date(), time.min)
+    window_end = _aware(timezone.localtime(max(end for _, end in slots)).date(), time.min) + timedelta(days=1)
+
+    weekly = defaultdict(list)
+    for weekday, block_start, block_end in Availability.objects.filter(
+        doctor_id=doctor_id, is_available=True,
+    ).values_list('weekday', 'start_time', 'end_time'):
+        weekly[weekday].append((block_start, block_end))
+
+    booked = Appointment.objects.filter(
+        doctor_id=doctor_id, status__in=BUSY_STATUSES,
+        scheduled_date__gte=window_start, scheduled_date__lt=window_end,
+    )
+    if exclude is not None:
+        booked = booked.exclude(pk__in=exclude)
+    busy = defaultdict(list)
+    for scheduled, busy_start, busy_end in booked.values_list('scheduled_date', 'start_time', 'end_time'):
+        day = timezone.localtime(scheduled).date()
+        busy[day].append((_aware(day, busy_start), _aware(day, busy_end)))
+    time_off = list(TimeOff.objects.filter(
+        doctor_id=doctor_id, is_approved=True, start_datetime__lt=window_end, end_datetime__gt=window_start,
+    ).values_list('start_datetime', 'end_datetime'))
+
+    conflicts = {}
+    for index, (start, end) in enumerate(slots):
+        local_start, local_end = timezone.localtime(start), timezone.localtime(end)
+        day = local_start.date()
+        if not any(
+            block_start <= local_start.time() and local_end.time() <= block_end and local_end.date() == day
+            for block_start, block_end in weekly[day.weekday()]
+        ):
+            conflicts[index] = 'outside availability'
+        elif any(off_start < end and off_end > start for off_start, off_end in time_off):
+            conflicts[index] = 'time off'
+        elif any(busy_start < end and busy_end > start for busy_start, busy_end in busy[day]):
+            conflicts[index] = 'already booked'
+    return conflicts
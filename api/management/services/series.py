@@ -0,0 +1,199 @@
+"""
+Recurring appointment series.
+
+An AppointmentSeries is a rule (every `interval` days/weeks/months from
+`first_date`, for `count` occurrences or until `until`). Its occurrences
+become ordinary Appointment rows linked by `series`, up to
+APPOINTMENT_SERIES_HORIZON_DAYS ahead. `manage.py materialize_series` rolls
+the horizon forward, so an open-ended series never books years of slots at
+once.
+
+Every step is set-based:
+
+- `materialize` checks the new occurrences with one `find_conflicts` call
+  (three queries) and inserts them with one bulk_create.
+- Creating a series checks the whole series up front. If the series is
+  open-ended, it checks up to the horizon.
+- "This and following" edits split the series. The old rule ends before
+  the chosen date and a new rule carries the changes. One UPDATE moves the
+  following occurrences over.
+"""
+from calendar import monthrange
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from management.models import Appointment, AppointmentSeries, AppointmentStatus, SeriesFrequency
+from management.services import dashboard
+from management.services.scheduling import find_conflicts
+from management.services.waitlist import fill_cancelled_slots
+
+# Fields a "this and following" change may touch.
+FOLLOWING_FIELDS = ('doctor', 'start_time', 'end_time', 'priority', 'notes', 'chief_complaint')
+
+
+def _aware(day, at):
+    return timezone.make_aware(datetime.combine(day, at))
+
+
+def occurrence_dates(series, after=None, through=None):
+    """
+    Dates of the series' occurrences, in order: those after `after` and
+    up to `through` (both optional). Monthly series skip months without their
+    day (the 31st, say), like RRULE does.
+    """
+    first, produced, step = series.first_date, 0, 0
+    while series.count is None or produced < series.count:
+        if series.frequency == SeriesFrequency.MONTHLY:
+            months = first.month - 1 + step * series.interval
+            year, month = first.year + months // 12, months % 12 + 1
+            step += 1
+            if first.day > monthrange(year, month)[1]:
+                if series.until and date(year, month, 1) > series.until:
+                    return
+                continue
+            day = date(year, month, first.day)
+        else:
+            days = series.interval * (7 if series.frequency == SeriesFrequency.WEEKLY else 1)
+            day = first + timedelta(days=step * days)
+            step += 1
+        if (series.until and day > series.until) or (through and day > through):
+            return
+        produced += 1
+        if after is None or day > after:
+            yield day
+
+
+def horizon():
+    return timezone.localdate() + timedelta(days=settings.APPOINTMENT_SERIES_HORIZON_DAYS)
+
+
+def _conflict_error(days, conflicts):
+    return ValidationError({'conflicts': [
+        {'date': days[index], 'reason': reason} for index, reason in sorted(conflicts.items())
+    ]})
+
+
+def materialize(series, through=None, strict=False):
+    """
+    Book the occurrences between `series.materialized_until` and `through`
+    (default: the horizon). Returns (appointments created, {date: reason}
+    for the occurrences skipped over a conflict).
+
+    With `strict` (new series), the whole series is checked – up to the
+    horizon if it never ends – and any conflict raises ValidationError.
+    """
+    through = through or horizon()
+    now = timezone.now()
+    bounded = series.count is not None or series.until is not None
+    check_through = None if strict and bounded else through
+    days = [
+        day for day in occurrence_dates(series, after=series.materialized_until, through=check_through)
+        if _aware(day, series.start_time) > now
+    ]
+    slots = [(_aware(day, series.start_time), _aware(day, series.end_time)) for day in days]
+    conflicts = find_conflicts(series.doctor_id, slots)
+    if strict and conflicts:
+        raise _conflict_error(days, conflicts)
+
+    occurrences = [
+        Appointment(
+            patient_id=series.patient_id, doctor_id=series.doctor_id, series=series,
+            scheduled_date=start, start_time=series.start_time, end_time=series.end_time,
+            chief_complaint=series.chief_complaint, notes=series.notes, priority=series.priority,
+        )
+        for index, (day, (start, _)) in enumerate(zip(days, slots))
+        if day <= through and index not in conflicts
+    ]
+    Appointment.objects.bulk_create(occurrences)
+    dashboard.count(Appointment, added=[dashboard.snapshot(occurrence) for occurrence in occurrences])
+
+    series.materialized_until = through
+    series.is_active = next(occurrence_dates(series, after=through), None) is not None
+    series.updated_at = now
+    AppointmentSeries.objects.filter(pk=series.pk).update(
+        materialized_until=series.materialized_until, is_active=series.is_active, updated_at=now,
+    )
+    skipped = {days[index]: reason for index, reason in conflicts.items() if days[index] <= through}
+    return occurrences, skipped
+
+
+def _following(series, from_date):
+    return Appointment.objects.filter(
+        series=series, scheduled_date__gte=_aware(from_date, time.min), status=AppointmentStatus.SCHEDULED,
+    )
+
+
+def _end_before(series, from_date, now):
+    """Cut the rule off before `from_date`; returns how many occurrences it kept."""
+    kept = sum(1 for _ in occurrence_dates(series, through=from_date - timedelta(days=1)))
+    series.until = from_date - timedelta(days=1)
+    if series.count is not None:
+        series.count = kept
+    series.is_active = series.is_active and kept > 0 and (
+        series.materialized_until is None or series.materialized_until < series.until
+    )
+    series.updated_at = now
+    AppointmentSeries.objects.filter(pk=series.pk).update(
+        until=series.until, count=series.count, is_active=series.is_active, updated_at=now,
+    )
+    return kept
+
+
+def change_following(series, from_date, changes):
+    """
+    Apply `changes` (a subset of FOLLOWING_FIELDS) to the occurrences on or
+    after `from_date` and to the rule from then on. Returns the new series.
+    """
+    next_day = next(occurrence_dates(series, after=from_date - timedelta(days=1)), None)
+    if next_day is None:
+        raise ValidationError({'from': ['The series has no occurrences on or after this date.']})
+
+    now = timezone.now()
+    successor = AppointmentSeries(
+        patient_id=series.patient_id, doctor=series.doctor, frequency=series.frequency,
+        interval=series.interval, first_date=next_day, start_time=series.start_time,
+        end_time=series.end_time, until=series.until, chief_complaint=series.chief_complaint,
+        notes=series.notes, priority=series.priority, is_active=series.is_active,
+        materialized_until=series.materialized_until,
+    )
+    for name, value in changes.items():
+        setattr(successor, name, value)
+    if successor.end_time <= successor.start_time:
+        raise ValidationError({'end_time': ['End time must be after start time.']})
+
+    following = _following(series, from_date)
+    if {'doctor', 'start_time', 'end_time'} & changes.keys():
+        days = [timezone.localtime(scheduled).date() for scheduled in following.values_list('scheduled_date', flat=True)]
+        slots = [(_aware(day, successor.start_time), _aware(day, successor.end_time)) for day in days]
+        conflicts = find_conflicts(successor.doctor_id, slots, exclude=following.values('pk'))
+        if conflicts:
+            raise _conflict_error(days, conflicts)
+
+    total = series.count
+    kept = _end_before(series, from_date, now)
+    successor.count = None if total is None else total - kept
+    successor.save()
+
+    update = {'series': successor, 'updated_at': now}
+    update.update({name: getattr(successor, name) for name in changes})
+    if successor.start_time != series.start_time:
+        # Same day, new time: the dashboard's per-day counts stay put.
+        shift = datetime.combine(date.min, successor.start_time) - datetime.combine(date.min, series.start_time)
+        update['scheduled_date'] = F('scheduled_date') + shift
+    following.update(**update)
+    return successor
+
+
+def cancel_following(series, from_date):
+    """Cancel the occurrences on or after `from_date` and end the rule; freed slots go to the waitlist."""
+    now = timezone.now()
+    following = _following(series, from_date)
+    freed = list(following.only('id', 'patient', 'doctor', 'scheduled_date', 'start_time', 'end_time'))
+    dashboard.update_status(following, AppointmentStatus.CANCELLED, updated_at=now)
+    _end_before(series, from_date, now)
+    fill_cancelled_slots(freed)
+    return len(freed)
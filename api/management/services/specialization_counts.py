@@ -0,0 +1,97 @@
+"""
+Doctor counts per specialization and department for the specialization picker.
+
+The counts are computed with two aggregate queries and held in the cache under
+a version number. Signals bump the version whenever doctors or their
+specializations change (see management/signals.py), so serving the counts is
+two cache reads and stale payloads simply expire.
+
+The version bump only reaches other processes through a shared cache
+(Redis, with REDIS_URL set). With the process-local LocMemCache each worker
+sees just its own bumps, so payloads there live LOCAL_PAYLOAD_TIMEOUT
+seconds instead of an hour.
+"""
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Count, Q
+
+from management.models import Specialization
+
+VERSION_KEY = 'specialization-counts:version'
+PAYLOAD_TIMEOUT = 60 * 60
+LOCAL_PAYLOAD_TIMEOUT = 30
+
+
+def _payload_key(version):
+    return f'specialization-counts:{version}'
+
+
+def _doctor_counts(prefix='doctors'):
+    return {
+        'doctor_count': Count(prefix, distinct=True),
+        'available_count': Count(prefix, distinct=True, filter=Q(**{f'{prefix}__is_available': True})),
+        'accepting_count': Count(prefix, distinct=True, filter=Q(**{
+            f'{prefix}__is_available': True,
+            f'{prefix}__accepting_new_patients': True,
+        })),
+    }
+
+
+def compute_counts():
+    active = Specialization.objects.filter(is_active=True)
+    specializations = active.order_by('department', 'display_order', 'name').values(
+        'slug', 'name', 'department'
+    ).annotate(**_doctor_counts())
+    # Department totals count each doctor once even with several
+    # specializations in the same department.
+    departments = {
+        row['department']: row
+        for row in active.order_by().values('department').annotate(**_doctor_counts())
+    }
+
+    grouped = {}
+    for row in specializations:
+        department = row['department']
+        if department not in grouped:
+            totals = departments[department]
+            grouped[department] = {
+                'department': department,
+                'doctor_count': totals['doctor_count'],
+                'available_count': totals['available_count'],
+                'accepting_count': totals['accepting_count'],
+                'specializations': [],
+            }
+        grouped[department]['specializations'].append(row)
+    return list(grouped.values())
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Millisecond seed so a flushed version key never reuses an old payload.
+        version = int(time.time() * 1000)
+        cache.add(VERSION_KEY, version, None)
+        version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def payload_timeout():
+    return LOCAL_PAYLOAD_TIMEOUT if isinstance(caches['default'], LocMemCache) else PAYLOAD_TIMEOUT
+
+
+def get_counts():
+    version = current_version()
+    payload = cache.get(_payload_key(version))
+    if payload is None:
+        payload = compute_counts()
+        cache.set(_payload_key(version), payload, payload_timeout())
+    return payload
+
+
+def invalidate():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        current_version()
@@ -0,0 +1,157 @@
+"""
+Urgency triage of appointment chief complaints.
+
+Appointments are booked with the default priority and scored later by
+`manage.py triage_appointments`, so booking never waits on the model. Each
+run picks up scheduled appointments that have a chief complaint but no
+`triaged_at`, and scores the distinct complaints through the AI client
+(`profiles.services.ai_service.get_client`):
+
+- Complaints are normalized (case, whitespace, trailing punctuation) and
+  looked up in the cache first. Identical complaints are common, and a cache
+  hit needs no model call.
+- Misses go to the model TRIAGE_BATCH_SIZE at a time, one chat completion per
+  batch. At most TRIAGE_CONCURRENCY batches are in flight.
+- Scores are written with one UPDATE per priority level. The UPDATE also
+  sets `triaged_at` and `updated_at`.
+
+A batch whose request fails or whose answer can't be parsed is skipped. Its
+appointments get a `triage_retry_at` TRIAGE_RETRY_SECONDS ahead and are left
+out of the queue until then, so a drain doesn't fetch them again and no run
+keeps a list of them.
+
+Only the queue (`UNTRIAGED`) is scored: an appointment whose priority staff
+set themselves has `triaged_at` already and is never overwritten. Priority
+follows the model: 1 is routine and 5 is an emergency.
+"""
+import hashlib
+import logging
+import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from management.models import UNTRIAGED, Appointment
+from profiles.services.ai_service import get_client
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'triage:v1:'
+MIN_PRIORITY, MAX_PRIORITY = 1, 5
+
+SYSTEM_PROMPT = (
+    "You are a clinical triage assistant. For each numbered chief complaint, rate how urgently "
+    "the patient should be seen on a scale of 1 to 5: 1 routine, 2 low, 3 standard, 4 urgent, "
+    "5 emergency. Answer with only a JSON array of integers, one per complaint, in order."
+)
+
+
+def normalize(complaint):
+    return ' '.join(complaint.lower().split()).strip(' .!?,;')
+
+
+def _cache_key(normalized):
+    return CACHE_PREFIX + hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def _parse_scores(text, expected):
+    """The last JSON array of integers in `text`, clamped to 1..5; None unless it has `expected` items."""
+    arrays = re.findall(r'\[\s*\d+(?:\s*,\s*\d+)*\s*\]', text or '')
+    if not arrays:
+        return None
+    scores = [int(score) for score in re.findall(r'\d+', arrays[-1])]
+    if len(scores) != expected:
+        return None
+    return [min(max(score, MIN_PRIORITY), MAX_PRIORITY) for score in scores]
+
+
+def score_batch(complaints):
+    """Priorities for `complaints` (normalized) from one completion, or None if it failed."""
+    numbered = '\n'.join(f'{index}. {complaint}' for index, complaint in enumerate(complaints, 1))
+    try:
+        completion = get_client().chat.completions.create(
+            model=settings.TRIAGE_MODEL,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": numbered},
+            ],
+            temperature=0,
+            max_tokens=16 + 4 * len(complaints),
+        )
+        scores = _parse_scores(completion.choices[0].message.content, len(complaints))
+    except Exception as e:
+        logger.error(f"Triage batch of {len(complaints)} failed: {e}")
+        return None
+    if scores is None:
+        logger.error(f"Triage batch of {len(complaints)} returned an unusable answer")
+    return scores
+
+
+def score_complaints(complaints):
+    """{normalized complaint: priority} for whatever could be scored; cache first, then the model."""
+    keys = {_cache_key(normalized): normalized for normalized in map(normalize, complaints) if normalized}
+    scores = {keys[key]: score for key, score in cache.get_many(list(keys)).items()}
+
+    misses = [normalized for normalized in keys.values() if normalized not in scores]
+    size = settings.TRIAGE_BATCH_SIZE
+    batches = [misses[i:i + size] for i in range(0, len(misses), size)]
+    if batches:
+        get_client()  # built once here rather than raced for by the workers
+        with ThreadPoolExecutor(max_workers=settings.TRIAGE_CONCURRENCY) as executor:
+            for batch, batch_scores in zip(batches, executor.map(score_batch, batches)):
+                if batch_scores is None:
+                    continue
+                fresh = dict(zip(batch, batch_scores))
+                scores.update(fresh)
+                cache.set_many(
+                    {_cache_key(normalized): score for normalized, score in fresh.items()},
+                    settings.TRIAGE_CACHE_SECONDS,
+                )
+    return scores
+
+
+def pending_appointments(now=None):
+    """The triage queue, oldest first, without the appointments waiting out a failed scoring."""
+    now = now or timezone.now()
+    return (
+        Appointment.objects.filter(UNTRIAGED)
+        .filter(Q(triage_retry_at__isnull=True) | Q(triage_retry_at__lte=now))
+        .order_by('created_at')
+    )
+
+
+def triage_pending(limit=None):
+    """
+    Score up to `limit` queued appointments. Returns the number triaged and
+    the pks that could not be scored, which are held back until their retry.
+    """
+    now = timezone.now()
+    queryset = pending_appointments(now).values_list('pk', 'chief_complaint')
+    rows = list(queryset[:limit] if limit else queryset)
+    scores = score_complaints([complaint for _, complaint in rows])
+
+    by_priority, skipped = defaultdict(list), []
+    for pk, complaint in rows:
+        score = scores.get(normalize(complaint))
+        if score is None:
+            skipped.append(pk)
+        else:
+            by_priority[score].append(pk)
+
+    triaged = 0
+    for priority, pks in by_priority.items():
+        # triaged_at__isnull: don't overwrite a run, or staff, that got there in between.
+        triaged += Appointment.objects.filter(pk__in=pks, triaged_at__isnull=True).update(
+            priority=priority, triaged_at=now, triage_retry_at=None, updated_at=now,
+        )
+    if skipped:
+        # Bookkeeping only: updated_at stays, so this isn't a change for the utilization refresh.
+        Appointment.objects.filter(pk__in=skipped).update(
+            triage_retry_at=now + timedelta(seconds=settings.TRIAGE_RETRY_SECONDS),
+        )
+    return triaged, skipped
@@ -0,0 +1,287 @@
+"""
+Doctor utilization: booked versus available clinic time, no-shows and
+cancellations.
+
+DoctorDailyUtilization holds one row per doctor per day. `refresh` (run by
+`manage.py refresh_utilization`) only recomputes days that changed since
+the previous run's watermark:
+
+- New days, between the previous run's `covered_through` and
+  UTILIZATION_AHEAD_DAYS ahead.
+- Days of appointments updated since the watermark, found through
+  `appointment_updated_idx`. Every doctor's row for such a day is redone,
+  which also catches an appointment moved to another doctor.
+- Days covered by time off changed since the watermark.
+- Every day from today on, after an availability change. Past days keep
+  the schedule they were computed with.
+- Days flagged `is_stale` by the delete and move signals
+  (management/signals.py). Inside `batched()` (bulk deletes such as
+  archiving) the flags are collected and written with one UPDATE.
+
+A batch of days is recomputed from two GROUP BY queries (live and archived
+appointments) plus the availability blocks and time off, and its rows are
+replaced in one transaction. `weekly_report` rolls the rows up per doctor
+and week in SQL. Window functions give each doctor's rank within the week
+and their previous week's utilization.
+"""
+import threading
+import time as timer
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import Count, DurationField, ExpressionWrapper, F, FloatField, Min, Q, Sum, Window
+from django.db.models.functions import Cast, Lag, NullIf, Rank, TruncDate, TruncWeek
+from django.utils import timezone
+
+from api.db import immediate_atomic
+from management.models import (
+    Appointment, AppointmentStatus, ArchivedAppointment, Availability, DoctorDailyUtilization, TimeOff,
+    UtilizationRefresh,
+)
+
+# Statuses that took up the doctor's time.
+BOOKED_STATUSES = (
+    AppointmentStatus.SCHEDULED, AppointmentStatus.IN_PROGRESS, AppointmentStatus.COMPLETED, AppointmentStatus.NO_SHOW,
+)
+COUNTS = ('appointments', 'completed', 'no_shows', 'cancellations')
+# Changes committed while a run was reading are picked up by the next one.
+OVERLAP = timedelta(minutes=1)
+# Longest span of days recomputed together.
+BATCH_SPAN = timedelta(days=31)
+
+# The (doctor, day) pairs collected by an open `batched()` block on this thread.
+_batch = threading.local()
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _days(first, last):
+    return {first + timedelta(days=offset) for offset in range((last - first).days + 1)}
+
+
+def _minutes(duration):
+    return int(duration.total_seconds() // 60) if duration else 0
+
+
+def _duration():
+    return ExpressionWrapper(F('end_time') - F('start_time'), output_field=DurationField())
+
+
+def _appointment_stats(model, first, last):
+    return (
+        model.objects.filter(
+            doctor__isnull=False,
+            scheduled_date__gte=_start_of(first), scheduled_date__lt=_start_of(last + timedelta(days=1)),
+        )
+        .annotate(day=TruncDate('scheduled_date'))
+        .values('doctor_id', 'day')
+        .annotate(
+            booked=Sum(_duration(), filter=Q(status__in=BOOKED_STATUSES)),
+            appointments=Count('id'),
+            completed=Count('id', filter=Q(status=AppointmentStatus.COMPLETED)),
+            no_shows=Count('id', filter=Q(status=AppointmentStatus.NO_SHOW)),
+            cancellations=Count('id', filter=Q(status=AppointmentStatus.CANCELLED)),
+        )
+    )
+
+
+def _flag(pairs):
+    # A refresh redoes whole days, so flagging every doctor x day pair costs
+    # no extra work over the exact pairs and keeps this to one UPDATE.
+    DoctorDailyUtilization.objects.filter(
+        doctor_id__in={doctor_id for doctor_id, _ in pairs}, day__in={day for _, day in pairs},
+    ).update(is_stale=True)
+
+
+def flag_stale(doctor_id, scheduled):
+    """Have the next refresh redo the doctor's day of `scheduled` (something left it)."""
+    if doctor_id is None or scheduled is None:
+        return
+    pair = (doctor_id, timezone.localdate(scheduled))
+    pending = getattr(_batch, 'pairs', None)
+    if pending is not None:
+        pending.add(pair)
+    else:
+        _flag({pair})
+
+
+@contextmanager
+def batched():
+    """Collect the days flagged inside the block and flag them with one UPDATE, at its end."""
+    if getattr(_batch, 'pairs', None) is not None:
+        yield
+        return
+    _batch.pairs = set()
+    try:
+        yield
+        pairs = _batch.pairs
+    finally:
+        _batch.pairs = None
+    if pairs:
+        _flag(pairs)
+
+
+def compute_days(days, blocks, now):
+    """Replace the rows of `days` (sorted, at most BATCH_SPAN apart) with fresh ones."""
+    first, last = days[0], days[-1]
+    wanted = set(days)
+    stats = defaultdict(lambda: dict.fromkeys(('booked_minutes',) + COUNTS, 0))
+    for model in (Appointment, ArchivedAppointment):
+        for row in _appointment_stats(model, first, last):
+            if row['day'] not in wanted:
+                continue
+            totals = stats[(row['doctor_id'], row['day'])]
+            totals['booked_minutes'] += _minutes(row['booked'])
+            for name in COUNTS:
+                totals[name] += row[name]
+
+    time_off = defaultdict(list)
+    for doctor_id, off_start, off_end in TimeOff.objects.filter(
+        is_approved=True, start_datetime__lt=_start_of(last + timedelta(days=1)), end_datetime__gt=_start_of(first),
+    ).values_list('doctor_id', 'start_datetime', 'end_datetime'):
+        time_off[doctor_id].append((off_start, off_end))
+
+    rows = []
+    for day in days:
+        doctors = {doctor_id for doctor_id, weekday in blocks if weekday == day.weekday()}
+        doctors.update(doctor_id for doctor_id, stats_day in stats if stats_day == day)
+        for doctor_id in doctors:
+            available = timedelta()
+            for block_start, block_end in blocks.get((doctor_id, day.weekday()), ()):
+                start = timezone.make_aware(datetime.combine(day, block_start))
+                end = timezone.make_aware(datetime.combine(day, block_end))
+                off = sum(
+                    (min(end, off_end) - max(start, off_start) for off_start, off_end in time_off[doctor_id]
+                     if off_start < end and off_end > start),
+                    timedelta(),
+                )
+                available += max(end - start - off, timedelta())
+            rows.append(DoctorDailyUtilization(
+                doctor_id=doctor_id, day=day, available_minutes=_minutes(available), refreshed_at=now,
+                **stats.get((doctor_id, day), {}),
+            ))
+    with immediate_atomic():
+        DoctorDailyUtilization.objects.filter(day__in=days).delete()
+        DoctorDailyUtilization.objects.bulk_create(rows)
+    return len(rows)
+
+
+def _changed_days(since, today, through):
+    days = set(
+        Appointment.objects.filter(updated_at__gt=since)
+        .annotate(day=TruncDate('scheduled_date')).values_list('day', flat=True).distinct()
+    )
+    for off_start, off_end in TimeOff.objects.filter(updated_at__gt=since).values_list('start_datetime', 'end_datetime'):
+        days |= _days(timezone.localdate(off_start), min(timezone.localdate(off_end), through))
+    if Availability.objects.filter(updated_at__gt=since).exists():
+        days |= _days(today, through)
+    days.update(DoctorDailyUtilization.objects.filter(is_stale=True).values_list('day', flat=True).distinct())
+    return days
+
+
+def _first_day():
+    starts = [
+        model.objects.aggregate(first=Min('scheduled_date'))['first'] for model in (Appointment, ArchivedAppointment)
+    ]
+    starts = [timezone.localdate(start) for start in starts if start]
+    return min(starts, default=None)
+
+
+def refresh(since=None):
+    """
+    Bring the summary up to date and record the run. With `since` (a date),
+    every day from then on is recomputed instead; the first run does that
+    from the earliest appointment.
+    """
+    started = timer.perf_counter()
+    now = timezone.now()
+    today = timezone.localdate(now)
+    through = today + timedelta(days=settings.UTILIZATION_AHEAD_DAYS)
+    last = UtilizationRefresh.objects.order_by('-started_at').first()
+
+    if since is None and last is None:
+        since = min(_first_day() or today, today)
+    if since is not None:
+        days = _days(since, through)
+    else:
+        days = _days(last.covered_through + timedelta(days=1), through)
+        days |= _changed_days(last.watermark - OVERLAP, today, through)
+    days = sorted(day for day in days if day <= through)
+
+    blocks = defaultdict(list)
+    for doctor_id, weekday, block_start, block_end in Availability.objects.filter(is_available=True).values_list(
+        'doctor_id', 'weekday', 'start_time', 'end_time',
+    ):
+        blocks[(doctor_id, weekday)].append((block_start, block_end))
+
+    batch = []
+    for day in days:
+        if batch and day - batch[0] > BATCH_SPAN:
+            compute_days(batch, blocks, now)
+            batch = []
+        batch.append(day)
+    if batch:
+        compute_days(batch, blocks, now)
+
+    return UtilizationRefresh.objects.create(
+        started_at=now, watermark=now, covered_through=max(through, last.covered_through if last else through),
+        days_refreshed=len(days), duration_ms=int((timer.perf_counter() - started) * 1000),
+    )
+
+
+def weekly_report(first, last):
+    """
+    Per doctor and week (Monday start) between `first` and `last`: hours,
+    rates, the doctor's utilization rank that week and their utilization the
+    week before. Rates are None where there is nothing to divide by.
+    """
+    def ratio(part, whole):
+        return Cast(F(part), FloatField()) / NullIf(F(whole), 0)
+
+    rows = (
+        DoctorDailyUtilization.objects.filter(day__gte=first, day__lte=last)
+        .annotate(week=TruncWeek('day'))
+        .values('week', 'doctor_id', 'doctor__user__first_name', 'doctor__user__last_name')
+        .annotate(
+            available=Sum('available_minutes'),
+            booked=Sum('booked_minutes'),
+            total=Sum('appointments'),
+            attended=Sum('completed'),
+            missed=Sum('no_shows'),
+            cancelled=Sum('cancellations'),
+        )
+        .annotate(
+            utilization=ratio('booked', 'available'),
+            no_show_rate=Cast(F('missed'), FloatField()) / NullIf(F('attended') + F('missed'), 0),
+            cancellation_rate=ratio('cancelled', 'total'),
+        )
+        .annotate(
+            rank=Window(Rank(), partition_by=[F('week')], order_by=F('utilization').desc(nulls_last=True)),
+            previous_utilization=Window(Lag('utilization'), partition_by=[F('doctor_id')], order_by=F('week').asc()),
+        )
+        .order_by('week', 'rank')
+    )
+
+    def rounded(value, digits=3):
+        return None if value is None else round(value, digits)
+
+    return [
+        {
+            'week': row['week'],
+            'doctor': row['doctor_id'],
+            'doctor_name': f"{row['doctor__user__first_name']} {row['doctor__user__last_name']}".strip(),
+            'available_hours': round(row['available'] / 60, 2),
+            'booked_hours': round(row['booked'] / 60, 2),
+            'appointments': row['total'],
+            'utilization': rounded(row['utilization']),
+            'previous_utilization': rounded(row['previous_utilization']),
+            'rank': row['rank'],
+            'no_show_rate': rounded(row['no_show_rate']),
+            'cancellation_rate': rounded(row['cancellation_rate']),
+        }
+        for row in rows
+    ]
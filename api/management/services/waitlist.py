@@ -0,0 +1,115 @@
+"""
+Refilling cancelled slots from the waitlist.
+
+Every doctor has a queue of entries waiting for them specifically, and
+every specialization has a queue of entries that take any of its doctors.
+A queue is read in (-priority, created_at) order straight off a partial
+index over waiting entries. Taking its head is one index range scan, so
+the cost does not grow with the length of the waitlist.
+
+`fill_cancelled_slots(appointments)` handles any number of cancellations
+in one pass:
+
+1. One query per queue touched. A queue feeding m freed slots loads just
+   its first m (+ slack) entries.
+2. Slots are matched in time order. Each slot takes the best head among
+   its doctor's queue and the queues of the doctor's specializations.
+3. One bulk_create books the new appointments and one bulk_update marks
+   the entries promoted.
+
+Call it inside the transaction that cancels the appointments. Candidate
+entries are locked with SELECT ... FOR UPDATE SKIP LOCKED where the database
+supports it. On SQLite, `immediate_atomic` serializes writers instead.
+"""
+from collections import Counter, defaultdict
+
+from django.db import connection
+from django.utils import timezone
+
+from management.models import Appointment, AppointmentStatus, WaitlistEntry, WaitlistStatus
+from management.services import dashboard
+from profiles.models import Doctor
+
+# Extra entries loaded per queue, for ones skipped because the patient
+# already got a slot in this pass or is the one who cancelled.
+SLACK = 5
+
+
+def _queue(key, count):
+    kind, pk = key
+    queryset = WaitlistEntry.objects.filter(status=WaitlistStatus.WAITING)
+    if kind == 'doctor':
+        queryset = queryset.filter(doctor_id=pk)
+    else:
+        queryset = queryset.filter(specialization_id=pk, doctor__isnull=True)
+    if connection.features.has_select_for_update_skip_locked:
+        queryset = queryset.select_for_update(skip_locked=True)
+    return list(queryset.order_by('-priority', 'created_at')[:count + SLACK])
+
+
+def fill_cancelled_slots(appointments):
+    """
+    Promote the best waiting patient into each of `appointments` (just
+    cancelled, with a doctor and a future date). Returns the new appointments.
+    """
+    now = timezone.now()
+    slots = sorted(
+        (a for a in appointments if a.doctor_id is not None and a.scheduled_date > now),
+        key=lambda a: (a.scheduled_date, a.start_time),
+    )
+    if not slots:
+        return []
+
+    specializations = defaultdict(list)
+    for doctor_id, specialization_id in Doctor.specializations.through.objects.filter(
+        doctor_id__in={slot.doctor_id for slot in slots},
+    ).values_list('doctor_id', 'specialization_id'):
+        specializations[doctor_id].append(specialization_id)
+
+    def queues_for(slot):
+        return [('doctor', slot.doctor_id)] + [('specialization', pk) for pk in specializations[slot.doctor_id]]
+
+    demand = Counter(key for slot in slots for key in queues_for(slot))
+    queues = {key: _queue(key, count) for key, count in demand.items()}
+    positions = dict.fromkeys(queues, 0)
+
+    booked, promoted, taken_patients = [], [], set()
+    for slot in slots:
+        heads = []
+        for key in queues_for(slot):
+            entries = queues[key]
+
+            def unavailable(index):
+                entry = entries[index]
+                return entry.status != WaitlistStatus.WAITING or entry.patient_id in taken_patients
+
+            index = positions[key]
+            while index < len(entries) and unavailable(index):
+                index += 1
+            positions[key] = index
+            # Not back into the slot they just gave up, but they stay queued.
+            while index < len(entries) and (unavailable(index) or entries[index].patient_id == slot.patient_id):
+                index += 1
+            if index < len(entries):
+                heads.append(entries[index])
+        if not heads:
+            continue
+
+        entry = min(heads, key=lambda head: (-head.priority, head.created_at))
+        appointment = Appointment(
+            patient_id=entry.patient_id, doctor_id=slot.doctor_id,
+            scheduled_date=slot.scheduled_date, start_time=slot.start_time, end_time=slot.end_time,
+            chief_complaint=entry.chief_complaint, priority=entry.priority,
+            status=AppointmentStatus.SCHEDULED,
+        )
+        entry.status = WaitlistStatus.PROMOTED
+        entry.appointment = appointment
+        entry.promoted_at = entry.updated_at = now
+        booked.append(appointment)
+        promoted.append(entry)
+        taken_patients.add(entry.patient_id)
+
+    Appointment.objects.bulk_create(booked)
+    dashboard.count(Appointment, added=[dashboard.snapshot(appointment) for appointment in booked])
+    WaitlistEntry.objects.bulk_update(promoted, ['status', 'appointment', 'promoted_at', 'updated_at'])
+    return booked
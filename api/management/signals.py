@@ -0,0 +1,116 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.utils import timezone
+from django.dispatch import receiver
+
+from api.db import apply_sqlite_pragmas
+from management.models import Appointment, Availability, DoctorDailyUtilization, Prescription, Specialization, TimeOff
+from management.services import dashboard, specialization_counts, utilization
+from profiles.models import Doctor, HealthcareUser
+
+
+# Signals ----------------------------------------------------------------------
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    """
+    Applies the WAL / busy_timeout / mmap profile to each new SQLite connection.
+    """
+    apply_sqlite_pragmas(sender, connection, **kwargs)
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_save, sender=Specialization)
+@receiver(post_delete, sender=Specialization)
+def refresh_specialization_counts(sender, **kwargs):
+    """
+    Bumps the cached specialization counts version once the change commits.
+    """
+    transaction.on_commit(specialization_counts.invalidate)
+
+
+@receiver(m2m_changed, sender=Doctor.specializations.through)
+def refresh_specialization_counts_on_m2m(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(specialization_counts.invalidate)
+
+
+@receiver(post_init, sender=Appointment)
+def remember_appointment_day(sender, instance, **kwargs):
+    # Read from __dict__ so deferred fields are not loaded.
+    instance._utilization_day = (instance.__dict__.get('doctor_id'), instance.__dict__.get('scheduled_date'))
+
+
+@receiver(post_save, sender=Appointment)
+def flag_left_utilization_day(sender, instance, created, **kwargs):
+    """
+    An appointment moved to another doctor or day leaves its old row out of
+    date; the refresh only sees the new one through `updated_at`.
+    """
+    old_doctor, old_date = getattr(instance, '_utilization_day', (None, None))
+    if not created and old_date is not None and (
+        old_doctor != instance.doctor_id or timezone.localdate(old_date) != timezone.localdate(instance.scheduled_date)
+    ):
+        utilization.flag_stale(old_doctor, old_date)
+    instance._utilization_day = (instance.doctor_id, instance.scheduled_date)
+
+
+@receiver(post_delete, sender=Appointment)
+def flag_deleted_appointment_day(sender, instance, **kwargs):
+    utilization.flag_stale(instance.doctor_id, instance.scheduled_date)
+
+
+@receiver(post_delete, sender=Availability)
+def flag_days_after_availability_delete(sender, instance, **kwargs):
+    DoctorDailyUtilization.objects.filter(
+        doctor_id=instance.doctor_id, day__gte=timezone.localdate(),
+    ).update(is_stale=True)
+
+
+@receiver(post_delete, sender=TimeOff)
+def flag_days_after_time_off_delete(sender, instance, **kwargs):
+    DoctorDailyUtilization.objects.filter(
+        doctor_id=instance.doctor_id,
+        day__gte=timezone.localdate(instance.start_datetime), day__lte=timezone.localdate(instance.end_datetime),
+    ).update(is_stale=True)
+
+
+@receiver(post_init, sender=Appointment)
+@receiver(post_init, sender=HealthcareUser)
+@receiver(post_init, sender=Prescription)
+def remember_dashboard_state(sender, instance, **kwargs):
+    # from_db marks the instance as saved only after post_init, so _state.adding
+    # says nothing here; a created instance's state is ignored on its first save.
+    instance._dashboard_state = dashboard.snapshot(instance)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_save, sender=HealthcareUser)
+@receiver(post_save, sender=Prescription)
+def count_saved_for_dashboard(sender, instance, created, update_fields, **kwargs):
+    """
+    Moves the dashboard counters with the save. Saves that touch none of the
+    counted fields (a login's `last_login`, say) cost nothing.
+    """
+    tracked = dashboard.TRACKED[sender][0]
+    if update_fields is not None and not set(update_fields) & set(tracked):
+        return
+    new = dashboard.snapshot(instance)
+    old = None if created else instance._dashboard_state
+    if not created and old is None:
+        # Loaded with the counted fields deferred; reconcile will catch any change.
+        return
+    if old != new:
+        dashboard.record_change(sender, old, new)
+    instance._dashboard_state = new
+
+
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=HealthcareUser)
+@receiver(post_delete, sender=Prescription)
+def count_deleted_for_dashboard(sender, instance, **kwargs):
+    state = getattr(instance, '_dashboard_state', None) or dashboard.snapshot(instance)
+    if state is not None:
+        dashboard.record_change(sender, state, None)
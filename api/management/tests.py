@@ -1,3 +1,1464 @@
-from django.test import TestCase
+import gzip
+import importlib.util
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from time import sleep
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.http import HttpResponse
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core import mail
+from django.core.cache import cache
+from django.contrib.admin import site as admin_site
+from django.contrib.auth.models import AnonymousUser
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from prometheus_client import REGISTRY, CollectorRegistry, multiprocess
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+
+from api import db_routers, openapi, slow_queries
+from api.instrumentation import ServerTimingMiddleware
+from api.compression import CompressionMiddleware, negotiate
+from api.parsers import ORJSONParser
+from api.renderers import ORJSONRenderer
+from api.compiled_serializers import compile_serializer
+from api.db_routers import PrimaryReplicaRouter, RoutingState, PIN_COOKIE, pin_key
+from management.models import (
+    Appointment, AppointmentReminder, AppointmentSeries, AppointmentStatus, ArchivedAppointment, Availability,
+    ClinicalAttachment, DoctorDailyUtilization, ReminderKind, ReminderStatus, SeriesFrequency, Specialization,
+    TimeOff, WaitlistEntry, WaitlistStatus,
+)
+from management.admin import AppointmentAdmin
+from management.management.commands.bench_startup import BOOT, parse_importtime
+from management.serializers import AppointmentSerializer, AppointmentSeriesSerializer, PatientSerializer
+from management.services import archive, dashboard, lifecycle, reminders, specialization_counts, utilization
+from management.services import series as appointment_series
+from management.services import triage
+from management.services.scheduling import earliest_slots
+from management.services.waitlist import fill_cancelled_slots
+from profiles.services.ai_service import get_client
+from profiles.models import Doctor, HealthcareUser, Patient
+
+
+# TransactionTestCase: reads inside a transaction always go to the primary,
+# so the regular TestCase wrapper would hide the replica decision.
+class PrimaryReplicaRouterTest(TransactionTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = PrimaryReplicaRouter()
+        self.user = HealthcareUser.objects.create_user(username='pat', email='pat@example.com', password='x')
+        cache.clear()
+
+    def read_alias(self, request):
+        token = db_routers._routing.set(RoutingState(request))
+        try:
+            return self.router.db_for_read(Appointment)
+        finally:
+            db_routers._routing.reset(token)
+
+    def test_outside_request_reads_primary(self):
+        self.assertEqual(self.router.db_for_read(Appointment), 'default')
+
+    def test_safe_request_reads_replica(self):
+        request = self.factory.get('/api/v1.0/management/appointments/')
+        request.user = AnonymousUser()
+        self.assertEqual(self.read_alias(request), 'replica')
+
+    def test_writes_go_to_primary(self):
+        request = self.factory.post('/api/v1.0/management/appointments/')
+        self.assertEqual(self.read_alias(request), 'default')
+        self.assertEqual(self.router.db_for_write(Appointment), 'default')
+
+    def test_pin_cookie_pins_reads_to_primary(self):
+        request = self.factory.get('/api/v1.0/management/appointments/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        self.assertEqual(self.read_alias(request), 'default')
+
+    def test_user_pin_pins_reads_to_primary(self):
+        request = self.factory.get('/api/v1.0/management/appointments/')
+        request.user = self.user
+        self.assertEqual(self.read_alias(request), 'replica')
+        cache.set(pin_key(self.user.pk), 1, 15)
+        self.assertEqual(self.read_alias(request), 'default')
+
+    def test_migrations_only_on_primary(self):
+        self.assertTrue(self.router.allow_migrate('default', 'management'))
+        self.assertFalse(self.router.allow_migrate('replica', 'management'))
+
+
+class CompiledAppointmentSerializerTest(TestCase):
+    """The compiled read path must render byte-identical JSON to AppointmentSerializer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cardiology = Specialization.objects.create(
+            name='Cardiology', department='Medicine', average_consultation_fee=Decimal('3500.50'),
+        )
+        Specialization.objects.create(name='Neurology')
+        doctor_user = HealthcareUser.objects.create_user(
+            username='dr.wanjiru', email='wanjiru@example.com', password='x', role='clinician',
+        )
+        doctor = Doctor.objects.create(
+            user=doctor_user, license_number='KMPDC-1', medical_license='ML-1',
+            license_jurisdiction='KE', rating=Decimal('4.5'), certifications={'board': ['FACC']},
+        )
+        doctor.specializations.add(cardiology)
+        patient_user = HealthcareUser.objects.create_user(username='amina', email='amina@example.com', password='x')
+        patient = Patient.objects.create(
+            user=patient_user, known_allergies=['penicillin'], primary_insurance='NHIF 0042',
+        )
+        start = timezone.now().replace(microsecond=123456) + timedelta(days=1)
+        Appointment.objects.create(
+            patient=patient, doctor=doctor, scheduled_date=start,
+            start_time=time(9, 0), end_time=time(9, 30), chief_complaint='Chest pain', priority=5,
+        )
+        Appointment.objects.create(
+            patient=patient, doctor=None, scheduled_date=start + timedelta(hours=2),
+            start_time=time(11, 15, 30), end_time=time(12), status=AppointmentStatus.CANCELLED,
+        )
+
+    def render_both(self, path):
+        request = Request(RequestFactory().get(path))
+        appointments = Appointment.objects.select_related(
+            'doctor__user', 'patient__user',
+        ).prefetch_related('doctor__specializations').order_by('scheduled_date')
+        serializer = AppointmentSerializer(appointments, many=True, context={'request': request})
+        expected = JSONRenderer().render(serializer.data)
+        row = compile_serializer(AppointmentSerializer(context={'request': request}))
+        return expected, JSONRenderer().render([row(appointment) for appointment in appointments])
+
+    def test_matches_serializer(self):
+        expected, compiled = self.render_both('/api/v1.0/management/appointments/')
+        self.assertEqual(compiled, expected)
+
+    def test_matches_serializer_with_sparse_fields(self):
+        expected, compiled = self.render_both('/api/v1.0/management/appointments/?fields=id,status,doctor_detail')
+        self.assertEqual(compiled, expected)
+        self.assertNotIn(b'patient_detail', compiled)
+
+    def test_repeated_doctor_rendered_once(self):
+        first = Appointment.objects.get(doctor__isnull=False)
+        Appointment.objects.create(
+            patient=first.patient, doctor=first.doctor, scheduled_date=first.scheduled_date + timedelta(hours=1),
+            start_time=time(10), end_time=time(10, 30),
+        )
+        expected, compiled = self.render_both('/api/v1.0/management/appointments/')
+        self.assertEqual(compiled, expected)
+
+        row = compile_serializer(AppointmentSerializer(context={'request': None}))
+        rows = [row(appointment) for appointment in Appointment.objects.filter(doctor=first.doctor)]
+        self.assertIs(rows[0]['doctor_detail'], rows[1]['doctor_detail'])
+
+    def test_serializers_overriding_to_representation_are_not_compiled(self):
+        class Masked(PatientSerializer):
+            def to_representation(self, instance):
+                return {'user': str(instance.user_id), 'masked': True}
+
+        class MaskedAppointment(AppointmentSerializer):
+            patient_detail = Masked(source='patient', read_only=True)
+
+        class TaggedAppointment(MaskedAppointment):
+            def to_representation(self, instance):
+                return {**super().to_representation(instance), 'tagged': True}
+
+        appointment = Appointment.objects.filter(doctor__isnull=False).get()
+        for serializer_class in (MaskedAppointment, TaggedAppointment):
+            serializer = serializer_class(context={'request': None})
+            row = compile_serializer(serializer)(appointment)
+            self.assertEqual(row, serializer.to_representation(appointment))
+            self.assertEqual(row['patient_detail'], {'user': str(appointment.patient.user_id), 'masked': True})
+
+
+class StubCompletions(BaseHTTPRequestHandler):
+    """OpenAI-compatible /chat/completions: 5 for anything mentioning chest pain, else 2."""
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        complaints = [line.split('. ', 1)[1] for line in body['messages'][-1]['content'].splitlines()]
+        self.requests.append(complaints)
+        scores = [5 if 'chest pain' in complaint else 2 for complaint in complaints]
+        payload = json.dumps({
+            'id': 'stub', 'object': 'chat.completion', 'created': 0, 'model': body['model'],
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': json.dumps(scores)}}],
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class CompressionMiddlewareTest(TestCase):
+    body = b'{"status": "scheduled"}' * 100
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def respond(self, path='/api/v1.0/management/appointments/', accept='gzip', **headers):
+        def view(request):
+            response = HttpResponse(self.body, content_type='application/json')
+            for name, value in headers.items():
+                response[name] = value
+            return response
+        return CompressionMiddleware(view)(self.factory.get(path, HTTP_ACCEPT_ENCODING=accept))
+
+    def test_negotiates_the_most_accepted_coding(self):
+        codings = ('zstd', 'br', 'gzip')
+        self.assertEqual(negotiate('gzip;q=0.5, br;q=0', codings), 'gzip')
+        self.assertEqual(negotiate('br;q=0.2, gzip;q=0.8', codings), 'gzip')
+        self.assertEqual(negotiate('*', codings), 'zstd')
+        self.assertIsNone(negotiate('identity', codings))
+        self.assertIsNone(negotiate('gzip;q=0', codings))
+
+    def test_gzip_with_vary_and_weak_etag(self):
+        response = self.respond(ETag='"abc"')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+        plain = self.respond(accept='')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+    def test_gzip_header_is_padded_to_a_random_length(self):
+        lengths = {len(self.respond().content) for _ in range(20)}
+        self.assertGreater(len(lengths), 1)
+
+    def test_responses_carrying_secrets_are_not_compressed(self):
+        self.assertEqual(self.respond(path='/api/v1.0/profiles/auth/login/').content, self.body)
+
+        def login(request):
+            response = HttpResponse(self.body, content_type='application/json')
+            response.set_cookie('access', 'secret')
+            return response
+        request = self.factory.get('/api/v1.0/management/appointments/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(CompressionMiddleware(login)(request).has_header('Content-Encoding'))
+
+
+class EarliestSlotsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cardiology = Specialization.objects.create(name='Cardiology')
+        cls.day = timezone.localdate() + timedelta(days=3)
+
+        def doctor(name, **fields):
+            doctor = Doctor.objects.create(
+                user=HealthcareUser.objects.create_user(username=name, email=f'{name}@example.com', password='x'),
+                license_number=f'KMPDC-{name}', medical_license=f'ML-{name}', license_jurisdiction='KE', **fields,
+            )
+            doctor.specializations.add(cls.cardiology)
+            Availability.objects.create(doctor=doctor, weekday=cls.day.weekday(), start_time=time(9), end_time=time(12))
+            return doctor
+        cls.free, cls.booked, cls.away = doctor('dr.free'), doctor('dr.booked'), doctor('dr.away')
+        doctor('dr.off.duty', is_available=False)
+        patient = Patient.objects.create(user=HealthcareUser.objects.create_user(
+            username='slot.patient', email='slot.patient@example.com', password='x',
+        ))
+        Appointment.objects.create(
+            patient=patient, doctor=cls.booked, start_time=time(9), end_time=time(9, 30),
+            scheduled_date=cls.at(time(9)),
+        )
+        TimeOff.objects.create(
+            doctor=cls.away, start_datetime=cls.at(time(8)), end_datetime=cls.at(time(10)), is_approved=True,
+        )
+
+    @classmethod
+    def at(cls, when):
+        return timezone.make_aware(datetime.combine(cls.day, when))
+
+    def test_earliest_slot_per_doctor_around_bookings_and_time_off(self):
+        start = self.at(time.min)
+        with self.assertNumQueries(4):  # availability, bookings, time off, doctor details
+            slots = earliest_slots(self.cardiology, k=5, start=start)
+        self.assertEqual(
+            [(doctor.pk, slot_start) for slot_start, _, doctor in slots],
+            [(self.free.pk, self.at(time(9))), (self.booked.pk, self.at(time(9, 30))),
+             (self.away.pk, self.at(time(10)))],
+        )
+        self.assertEqual(len(earliest_slots(self.cardiology, k=2, start=start)), 2)
+
+    def test_later_start_moves_onto_the_grid(self):
+        [(slot_start, slot_end, _)] = earliest_slots(self.cardiology, k=1, start=self.at(time(11, 10)))
+        self.assertEqual((slot_start, slot_end), (self.at(time(11, 30)), self.at(time(12))))
+
+
+class SparseFieldsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = HealthcareUser.objects.create_user(
+            username='sparse.admin', email='sparse.admin@example.com', password='x', role='system_admin',
+        )
+        doctor = Doctor.objects.create(
+            user=HealthcareUser.objects.create_user(username='dr.sparse', email='dr.sparse@example.com', password='x'),
+            license_number='KMPDC-11', medical_license='ML-11', license_jurisdiction='KE',
+        )
+        doctor.specializations.add(Specialization.objects.create(name='Cardiology'))
+        for index in range(3):
+            patient = Patient.objects.create(user=HealthcareUser.objects.create_user(
+                username=f'sparse{index}', email=f'sparse{index}@example.com', password='x',
+            ))
+            Appointment.objects.create(
+                patient=patient, doctor=doctor, start_time=time(9 + index), end_time=time(9 + index, 30),
+                scheduled_date=timezone.now() + timedelta(days=index + 1),
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def rows(self, **params):
+        data = self.client.get('/api/v1.0/management/appointments/', params).json()
+        return data['results'] if isinstance(data, dict) else data
+
+    def test_fields_limit_the_response_and_the_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            rows = self.rows(fields='id,status')
+        self.assertEqual([set(row) for row in rows], [{'id', 'status'}] * 3)
+        self.assertEqual(len(queries), 1)  # rows; no conditional GET aggregate without its headers
+        self.assertNotIn('chief_complaint', queries[-1]['sql'])
+
+    def test_expand_embeds_only_the_named_relations(self):
+        with self.assertNumQueries(1):  # rows
+            rows = self.rows(expand='')
+        self.assertFalse({'doctor_detail', 'patient_detail'} & set(rows[0]))
+        self.assertIn('doctor', rows[0])
+
+        with self.assertNumQueries(2):  # rows with doctor__user, specializations
+            rows = self.rows(expand='doctor_detail')
+        self.assertEqual(rows[0]['doctor_detail']['user']['username'], 'dr.sparse')
+        self.assertNotIn('patient_detail', rows[0])
+
+    def test_without_params_every_field_is_returned(self):
+        self.assertEqual(set(self.rows()[0]), set(AppointmentSerializer.Meta.fields))
+
+
+class SpecializationCountsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_doctor_changes_invalidate_the_cached_counts(self):
+        cardiology = Specialization.objects.create(name='Cardiology', department='Medicine')
+        self.assertEqual(specialization_counts.get_counts()[0]['doctor_count'], 0)
+        with self.assertNumQueries(0):
+            specialization_counts.get_counts()
+
+        doctor = Doctor.objects.create(
+            user=HealthcareUser.objects.create_user(username='dr.kamau', email='kamau@example.com', password='x'),
+            license_number='KMPDC-8', medical_license='ML-8', license_jurisdiction='KE',
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            doctor.specializations.add(cardiology)
+        [medicine] = specialization_counts.get_counts()
+        self.assertEqual((medicine['doctor_count'], medicine['specializations'][0]['doctor_count']), (1, 1))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_keeps_payloads_short(self):
+        self.assertEqual(specialization_counts.payload_timeout(), specialization_counts.LOCAL_PAYLOAD_TIMEOUT)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = HealthcareUser.objects.create_user(
+            username='etag.admin', email='etag.admin@example.com', password='x', role='system_admin',
+        )
+        cls.doctor = Doctor.objects.create(
+            user=HealthcareUser.objects.create_user(username='dr.wanjiru', email='wanjiru@example.com', password='x'),
+            license_number='KMPDC-9', medical_license='ML-9', license_jurisdiction='KE',
+        )
+        cls.patient = Patient.objects.create(user=HealthcareUser.objects.create_user(
+            username='etag.patient', email='etag.patient@example.com', password='x',
+        ))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.appointment = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, scheduled_date=timezone.now() + timedelta(days=1),
+            start_time=time(9), end_time=time(9, 30),
+        )
+        self.url = f'/api/v1.0/management/appointments/{self.appointment.pk}/'
+
+    def revalidate(self, etag):
+        return self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_appointment_is_not_modified(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        response = self.revalidate(first['ETag'])
+        self.assertEqual((response.status_code, response.content), (304, b''))
+
+    def test_renaming_the_embedded_doctor_changes_the_tag(self):
+        etag = self.client.get(self.url)['ETag']
+        user = self.doctor.user
+        user.first_name = 'Grace'
+        user.save()
+        response = self.revalidate(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_admin_completion_changes_the_tag(self):
+        etag = self.client.get(self.url)['ETag']
+        model_admin = AppointmentAdmin(Appointment, admin_site)
+        with mock.patch.object(model_admin, 'message_user'):
+            model_admin.mark_completed(None, Appointment.objects.filter(pk=self.appointment.pk))
+        response = self.revalidate(etag)
+        self.assertEqual((response.status_code, response.json()['status']), (200, AppointmentStatus.COMPLETED))
+
+    @override_settings(COMPRESSION_MIN_SIZE=0)
+    def test_compressed_response_revalidates_with_its_weak_etag(self):
+        first = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertTrue(first['ETag'].startswith('W/'))
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_malformed_pk_is_not_found(self):
+        self.assertEqual(self.client.get('/api/v1.0/management/appointments/not-a-uuid/').status_code, 404)
+
+    def test_unconditional_list_skips_the_aggregate(self):
+        list_url = '/api/v1.0/management/appointments/'
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get(list_url)
+        self.assertEqual(first.status_code, 200)
+        self.assertFalse([q for q in queries if 'MAX(' in q['sql'].upper()])
+        self.assertNotIn('Last-Modified', first)
+
+        # The body tag is swapped for the aggregate's on the first revalidation.
+        second = self.client.get(list_url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        with CaptureQueriesContext(connection) as queries:
+            third = self.client.get(list_url, HTTP_IF_NONE_MATCH=second['ETag'])
+        self.assertEqual((third.status_code, third.content), (304, b''))
+        self.assertEqual(len([q for q in queries if 'MAX(' in q['sql'].upper()]), 1)
+
+    def test_tag_depends_on_the_user(self):
+        other = HealthcareUser.objects.create_user(
+            username='etag.admin2', email='etag.admin2@example.com', password='x', role='system_admin',
+        )
+        etag = self.client.get(self.url)['ETag']
+        self.client.force_authenticate(other)
+        response = self.revalidate(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+@skipUnless(importlib.util.find_spec('openai'), 'openai is not installed')
+@override_settings(TRIAGE_BATCH_SIZE=2, TRIAGE_CONCURRENCY=2)
+class TriagePipelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubCompletions)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.env = mock.patch.dict(os.environ, {
+            'AIML_BASE_URL': f'http://127.0.0.1:{cls.server.server_port}/v1',
+            'AIML_API_KEY': 'test', 'AIML_MAX_RETRIES': '0',
+        })
+        cls.env.start()
+        get_client.cache_clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.env.stop()
+        get_client.cache_clear()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        StubCompletions.requests = []
+        user = HealthcareUser.objects.create_user(username='amina', email='amina@example.com', password='x')
+        self.patient = Patient.objects.create(user=user)
+
+    def book(self, complaint, **kwargs):
+        return Appointment.objects.create(
+            patient=self.patient, scheduled_date=timezone.now() + timedelta(days=1),
+            start_time=time(9), end_time=time(9, 30), chief_complaint=complaint, **kwargs,
+        )
+
+    def test_scores_distinct_complaints_in_batches(self):
+        crushing = self.book('Crushing chest pain')
+        same = self.book('  crushing CHEST pain. ')
+        rash = self.book('Mild rash')
+        cough = self.book('Dry cough')
+        untouched = self.book('')
+        cancelled = self.book('Chest pain', status=AppointmentStatus.CANCELLED)
+
+        self.assertEqual(triage.triage_pending(), (4, []))
+
+        # Three distinct complaints, two per request.
+        self.assertEqual(sorted(len(batch) for batch in StubCompletions.requests), [1, 2])
+        for appointment, priority in ((crushing, 5), (same, 5), (rash, 2), (cough, 2), (untouched, 3), (cancelled, 3)):
+            appointment.refresh_from_db()
+            self.assertEqual(appointment.priority, priority)
+        self.assertIsNotNone(crushing.triaged_at)
+        self.assertIsNone(untouched.triaged_at)
+
+    def test_cached_complaints_skip_the_model(self):
+        self.book('Chest pain')
+        triage.triage_pending()
+        StubCompletions.requests = []
+
+        repeat = self.book('chest pain!')
+        self.assertEqual(triage.triage_pending(), (1, []))
+        self.assertEqual(StubCompletions.requests, [])
+        repeat.refresh_from_db()
+        self.assertEqual(repeat.priority, 5)
+
+    @override_settings(TRIAGE_RETRY_SECONDS=60)
+    def test_failed_batches_wait_for_their_retry(self):
+        appointment = self.book('Headache')
+        with mock.patch.object(triage, 'score_batch', return_value=None):
+            self.assertEqual(triage.triage_pending(), (0, [appointment.pk]))
+        appointment.refresh_from_db()
+        self.assertIsNone(appointment.triaged_at)
+        self.assertIsNotNone(appointment.triage_retry_at)
+
+        # Held back until the retry time, then scored and cleared.
+        self.assertFalse(triage.pending_appointments().exists())
+        self.assertEqual(triage.triage_pending(), (0, []))
+        later = timezone.now() + timedelta(seconds=61)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertEqual(triage.triage_pending(), (1, []))
+        appointment.refresh_from_db()
+        self.assertIsNotNone(appointment.triaged_at)
+        self.assertIsNone(appointment.triage_retry_at)
+
+    def test_drain_ends_when_only_failures_are_left(self):
+        for complaint in ('Headache', 'Back pain', 'Fever'):
+            self.book(complaint)
+        out = StringIO()
+        with mock.patch.object(triage, 'score_batch', return_value=None) as score_batch:
+            call_command('triage_appointments', chunk=1, stdout=out)
+        # One pass per appointment, none fetched twice.
+        self.assertEqual(score_batch.call_count, 3)
+        self.assertIn('Triaged 0 appointments, 3 left for a later run', out.getvalue())
+
+    def test_queue_is_scheduled_appointments_with_a_complaint(self):
+        queued = self.book('Headache')
+        self.book('')
+        self.book(None)
+        self.book('Fever', status=AppointmentStatus.CANCELLED)
+        self.assertEqual(list(triage.pending_appointments()), [queued])
+
+    def test_staff_priority_is_not_overwritten(self):
+        via_api = self.book('Crushing chest pain')
+        serializer = AppointmentSerializer(via_api, data={'priority': 1}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+
+        via_admin = self.book('Crushing chest pain')
+        via_admin.priority = 2
+        form = mock.Mock(changed_data=['priority'])
+        AppointmentAdmin(Appointment, admin_site).save_model(None, via_admin, form, change=True)
+
+        unchanged = self.book('Mild rash')
+        serializer = AppointmentSerializer(unchanged, data={'priority': 3}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+
+        self.assertEqual(triage.triage_pending(), (1, []))
+        for appointment, priority in ((via_api, 1), (via_admin, 2), (unchanged, 2)):
+            appointment.refresh_from_db()
+            self.assertEqual(appointment.priority, priority)
+
+
+class WaitlistPromotionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cardiology = Specialization.objects.create(name='Cardiology')
+        cls.doctor = Doctor.objects.create(
+            user=HealthcareUser.objects.create_user(username='dr.otieno', email='otieno@example.com', password='x'),
+            license_number='KMPDC-2', medical_license='ML-2', license_jurisdiction='KE',
+        )
+        cls.doctor.specializations.add(cls.cardiology)
+        cls.patients = [
+            Patient.objects.create(user=HealthcareUser.objects.create_user(
+                username=f'patient{i}', email=f'patient{i}@example.com', password='x',
+            ))
+            for i in range(4)
+        ]
+
+    def book(self, patient, hours):
+        return Appointment.objects.create(
+            patient=patient, doctor=self.doctor, scheduled_date=timezone.now() + timedelta(hours=hours),
+            start_time=time(9), end_time=time(9, 30),
+        )
+
+    def wait(self, patient, priority, **queue):
+        return WaitlistEntry.objects.create(patient=patient, priority=priority, **queue)
+
+    def cancel(self, *appointments):
+        Appointment.objects.filter(pk__in=[a.pk for a in appointments]).update(status=AppointmentStatus.CANCELLED)
+        return fill_cancelled_slots(appointments)
+
+    def test_best_entry_across_doctor_and_specialization_queues(self):
+        slot = self.book(self.patients[0], 24)
+        self.wait(self.patients[1], 3, doctor=self.doctor)
+        urgent = self.wait(self.patients[2], 5, specialization=self.cardiology)
+
+        [booked] = self.cancel(slot)
+
+        self.assertEqual((booked.patient_id, booked.doctor_id), (self.patients[2].pk, self.doctor.pk))
+        self.assertEqual(booked.scheduled_date, slot.scheduled_date)
+        urgent.refresh_from_db()
+        self.assertEqual((urgent.status, urgent.appointment_id), (WaitlistStatus.PROMOTED, booked.pk))
+
+    def test_ties_go_to_the_earliest_request(self):
+        slot = self.book(self.patients[0], 24)
+        first = self.wait(self.patients[1], 4, doctor=self.doctor)
+        self.wait(self.patients[2], 4, doctor=self.doctor)
+        [booked] = self.cancel(slot)
+        self.assertEqual(booked.patient_id, first.patient_id)
+
+    def test_bulk_cancellation_fills_each_slot_once(self):
+        slots = [self.book(self.patients[0], 24), self.book(self.patients[0], 48), self.book(self.patients[0], 72)]
+        own = self.wait(self.patients[0], 5, doctor=self.doctor)
+        self.wait(self.patients[1], 2, doctor=self.doctor)
+        self.wait(self.patients[2], 4, specialization=self.cardiology)
+
+        with self.assertNumQueries(8):  # specializations, 2 queues, bulk insert, 2 counter writes, bulk update + cancel
+            booked = self.cancel(*slots)
+
+        self.assertEqual([a.patient_id for a in booked], [self.patients[2].pk, self.patients[1].pk])
+        own.refresh_from_db()
+        self.assertEqual(own.status, WaitlistStatus.WAITING)
+        self.assertEqual(WaitlistEntry.objects.filter(status=WaitlistStatus.PROMOTED).count(), 2)
+
+    def test_past_slots_are_not_refilled(self):
+        slot = self.book(self.patients[0], -1)
+        self.wait(self.patients[1], 5, doctor=self.doctor)
+        self.assertEqual(self.cancel(slot), [])
+
+
+class AppointmentSeriesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = Doctor.objects.create(
+            user=HealthcareUser.objects.create_user(username='dr.wanjiru', email='wanjiru@example.com', password='x'),
+            license_number='KMPDC-3', medical_license='ML-3', license_jurisdiction='KE',
+        )
+        cls.patient = Patient.objects.create(user=HealthcareUser.objects.create_user(
+            username='series.patient', email='series.patient@example.com', password='x',
+        ))
+        cls.first_date = timezone.localdate() + timedelta(days=7)
+        Availability.objects.create(
+            doctor=cls.doctor, weekday=cls.first_date.weekday(), start_time=time(8), end_time=time(17),
+        )
+
+    def weekly(self, count):
+        return AppointmentSeries.objects.create(
+            patient=self.patient, doctor=self.doctor, frequency=SeriesFrequency.WEEKLY,
+            first_date=self.first_date, start_time=time(9), end_time=time(9, 30), count=count,
+        )
+
+    def test_year_of_weekly_occurrences_in_constant_queries(self):
+        series = self.weekly(52)
+        with self.assertNumQueries(7):  # availability, bookings, time off, bulk insert, 2 counter writes, series update
+            occurrences, skipped = appointment_series.materialize(
+                series, through=self.first_date + timedelta(days=366), strict=True,
+            )
+        self.assertEqual((len(occurrences), skipped), (52, {}))
+        self.assertFalse(series.is_active)
+        self.assertEqual(series.occurrences.count(), 52)
+
+    def test_conflicting_occurrence_rejects_the_series(self):
+        taken = self.first_date + timedelta(weeks=2)
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, start_time=time(9, 15), end_time=time(9, 45),
+            scheduled_date=timezone.make_aware(datetime.combine(taken, time(9, 15))),
+        )
+        series = self.weekly(4)
+        with self.assertRaises(ValidationError) as raised:
+            appointment_series.materialize(series, strict=True)
+        self.assertEqual(raised.exception.detail['conflicts'][0]['date'], str(taken))
+        self.assertFalse(series.occurrences.exists())
+
+    def test_change_this_and_following(self):
+        series = self.weekly(6)
+        appointment_series.materialize(series, strict=True)
+        from_date = self.first_date + timedelta(weeks=2)
+
+        successor = appointment_series.change_following(series, from_date, {'start_time': time(10), 'end_time': time(10, 30)})
+
+        series.refresh_from_db()
+        self.assertEqual((series.count, series.occurrences.count()), (2, 2))
+        self.assertEqual((successor.first_date, successor.count), (from_date, 4))
+        moved = list(successor.occurrences.order_by('scheduled_date'))
+        self.assertEqual(len(moved), 4)
+        self.assertEqual(timezone.localtime(moved[0].scheduled_date), timezone.make_aware(datetime.combine(from_date, time(10))))
+        self.assertTrue(all(a.start_time == time(10) for a in moved))
+
+    def test_until_is_capped_like_count(self):
+        def errors(until):
+            serializer = AppointmentSeriesSerializer(data={
+                'patient': self.patient.pk, 'doctor': self.doctor.pk, 'frequency': SeriesFrequency.DAILY,
+                'first_date': self.first_date, 'start_time': '09:00', 'end_time': '09:30', 'until': until,
+            })
+            serializer.is_valid()
+            return serializer.errors
+        self.assertEqual(errors(self.first_date + timedelta(days=499)), {})
+        self.assertIn('until', errors(self.first_date + timedelta(days=500)))
+
+    def test_materialize_command_carries_on_past_a_failing_series(self):
+        broken, healthy = self.weekly(2), self.weekly(2)
+        healthy.start_time, healthy.end_time = time(11), time(11, 30)
+        healthy.save()
+
+        def materialize(series, through):
+            if series.pk == broken.pk:
+                raise IntegrityError('boom')
+            return appointment_series.materialize(series, through)
+        err = StringIO()
+        with mock.patch('management.management.commands.materialize_series.materialize', side_effect=materialize):
+            call_command('materialize_series', stdout=StringIO(), stderr=err)
+        self.assertIn(str(broken.pk), err.getvalue())
+        self.assertEqual((broken.occurrences.count(), healthy.occurrences.count()), (0, 2))
+
+
+class AppointmentReminderTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = Doctor.objects.create(
+            user=HealthcareUser.objects.create_user(username='dr.kamau', email='kamau@example.com', password='x'),
+            license_number='KMPDC-4', medical_license='ML-4', license_jurisdiction='KE',
+        )
+        cls.patient = Patient.objects.create(user=HealthcareUser.objects.create_user(
+            username='reminded', email='reminded@example.com', password='x',
+        ))
+
+    def setUp(self):
+        cache.delete(reminders.WATERMARK_KEY)
+
+    def book(self, hours):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, scheduled_date=timezone.now() + timedelta(hours=hours),
+            start_time=time(9), end_time=time(9, 30),
+        )
+
+    def test_each_reminder_is_sent_once(self):
+        soon, tomorrow = self.book(1), self.book(20)
+        self.book(30)  # not due yet
+
+        self.assertEqual(reminders.enqueue(), 2)
+        self.assertEqual(reminders.enqueue(), 0)
+        self.assertEqual(reminders.queue_depth(), 2)
+        self.assertEqual(reminders.send_due(), {ReminderStatus.SENT: 2})
+        self.assertEqual(reminders.send_due(), {})
+
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['reminded@example.com'] * 2)
+        self.assertEqual(
+            dict(AppointmentReminder.objects.values_list('appointment_id', 'kind')),
+            {soon.pk: ReminderKind.HOUR_BEFORE, tomorrow.pk: ReminderKind.DAY_BEFORE},
+        )
+        self.assertEqual(reminders.queue_depth(), 0)
+
+    def test_counts_only_the_reminders_it_inserted(self):
+        first, second = self.book(20), self.book(21)
+        bulk_create = AppointmentReminder.objects.bulk_create
+
+        def racing(objs, **kwargs):
+            # Another scheduler enqueues one of them between the scan and the insert.
+            AppointmentReminder.objects.create(appointment=second, kind=ReminderKind.DAY_BEFORE)
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(AppointmentReminder.objects, 'bulk_create', side_effect=racing):
+            self.assertEqual(reminders.enqueue(), 1)
+        self.assertEqual(AppointmentReminder.objects.filter(appointment__in=[first, second]).count(), 2)
+
+    def test_day_before_scan_starts_at_the_watermark(self):
+        self.book(20)
+        self.assertEqual(reminders.enqueue(), 1)
+        # Inside the bucket already scanned and unchanged since: not looked at again.
+        scanned = self.book(21)
+        Appointment.objects.filter(pk=scanned.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        rebooked = self.book(22)
+        self.assertEqual(reminders.enqueue(), 1)
+        self.assertTrue(rebooked.reminders.exists())
+        self.assertFalse(scanned.reminders.exists())
+
+        # Without a watermark the whole bucket is scanned.
+        cache.delete(reminders.WATERMARK_KEY)
+        self.assertEqual(reminders.enqueue(), 1)
+        self.assertTrue(scanned.reminders.exists())
+
+    def test_cancelled_after_enqueue_is_skipped(self):
+        appointment = self.book(20)
+        reminders.enqueue()
+        Appointment.objects.filter(pk=appointment.pk).update(status=AppointmentStatus.CANCELLED)
+        self.assertEqual(reminders.send_due(), {ReminderStatus.SKIPPED: 1})
+        self.assertEqual(mail.outbox, [])
+
+    def test_failed_delivery_is_retried_then_given_up(self):
+        self.book(20)
+        reminders.enqueue()
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            self.assertEqual(reminders.send_due(), {ReminderStatus.PENDING: 1})
+            reminders.send_due()
+            self.assertEqual(reminders.send_due(), {ReminderStatus.FAILED: 1})
+        self.assertEqual(AppointmentReminder.objects.get().last_error, 'down')
+
+    def test_stale_claims_are_not_resent(self):
+        self.book(20)
+        reminders.enqueue()
+        AppointmentReminder.objects.update(status=ReminderStatus.SENDING, claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(reminders.release_stale_claims(), 1)
+        self.assertEqual(reminders.send_due(), {})
+
+
+class CloseStaleAppointmentsTest(TestCase):
+    def test_closes_past_appointments_in_key_order_chunks(self):
+        doctor = Doctor.objects.create(
+            user=HealthcareUser.objects.create_user(username='dr.achieng', email='achieng@example.com', password='x'),
+            license_number='KMPDC-5', medical_license='ML-5', license_jurisdiction='KE',
+        )
+        patient = Patient.objects.create(user=HealthcareUser.objects.create_user(
+            username='past.patient', email='past.patient@example.com', password='x',
+        ))
+        booked = []
+
+        def book(days, status):
+            return Appointment.objects.create(
+                patient=patient, doctor=doctor, status=status, start_time=time(9), end_time=time(9, 30),
+                scheduled_date=timezone.now() + timedelta(days=days, minutes=len(booked)),
+            )
+        for days, status in [(-3, AppointmentStatus.SCHEDULED), (-2, AppointmentStatus.SCHEDULED),
+                             (-2, AppointmentStatus.IN_PROGRESS), (-1, AppointmentStatus.CANCELLED),
+                             (1, AppointmentStatus.SCHEDULED)]:
+            booked.append(book(days, status))
+
+        cutoff, last, chunks = lifecycle.stale_before(), None, 0
+        while True:
+            last, _ = lifecycle.close_stale_chunk(cutoff, after=last, size=2)
+            if last is None:
+                break
+            chunks += 1
+
+        self.assertEqual(chunks, 2)
+        self.assertEqual(
+            [Appointment.objects.get(pk=a.pk).status for a in booked],
+            [AppointmentStatus.NO_SHOW, AppointmentStatus.NO_SHOW, AppointmentStatus.COMPLETED,
+             AppointmentStatus.CANCELLED, AppointmentStatus.SCHEDULED],
+        )
+
+
+class AppointmentArchiveTest(TestCase):
+    def test_archive_and_restore_keep_attachments(self):
+        doctor = Doctor.objects.create(
+            user=HealthcareUser.objects.create_user(username='dr.mwangi', email='mwangi@example.com', password='x'),
+            license_number='KMPDC-6', medical_license='ML-6', license_jurisdiction='KE',
+        )
+        patient = Patient.objects.create(user=HealthcareUser.objects.create_user(
+            username='old.patient', email='old.patient@example.com', password='x',
+        ))
+        old = Appointment.objects.create(
+            patient=patient, doctor=doctor, status=AppointmentStatus.COMPLETED, start_time=time(9), end_time=time(9, 30),
+            scheduled_date=timezone.now() - timedelta(days=1000),
+        )
+        recent = Appointment.objects.create(
+            patient=patient, doctor=doctor, status=AppointmentStatus.COMPLETED, start_time=time(9), end_time=time(9, 30),
+            scheduled_date=timezone.now() - timedelta(days=10),
+        )
+        attachment = ClinicalAttachment.objects.create(
+            content_object=old, appointment=old, file='clinical_attachments/x.pdf', document_type='lab_report',
+        )
+        created_at = old.created_at
+
+        self.assertEqual(archive.archive_batch(archive.retention_cutoff()), 1)
+        self.assertEqual(list(Appointment.objects.values_list('pk', flat=True)), [recent.pk])
+        attachment.refresh_from_db()
+        self.assertEqual((attachment.appointment_id, attachment.archived_appointment_id), (None, old.pk))
+        self.assertIsInstance(attachment.content_object, ArchivedAppointment)
+
+        self.assertEqual(archive.restore([old.pk]), 1)
+        restored = Appointment.objects.get(pk=old.pk)
+        self.assertEqual((restored.status, restored.created_at), (AppointmentStatus.COMPLETED, created_at))
+        attachment.refresh_from_db()
+        self.assertEqual((attachment.appointment_id, attachment.content_object), (old.pk, restored))
+        self.assertFalse(ArchivedAppointment.objects.exists())
+
+    def test_archive_batch_flags_utilization_days_once(self):
+        doctor = Doctor.objects.create(
+            user=HealthcareUser.objects.create_user(username='dr.kamau', email='kamau@example.com', password='x'),
+            license_number='KMPDC-8', medical_license='ML-8', license_jurisdiction='KE',
+        )
+        patient = Patient.objects.create(user=HealthcareUser.objects.create_user(
+            username='bulk.patient', email='bulk.patient@example.com', password='x',
+        ))
+        old = timezone.now() - timedelta(days=1000)
+        Appointment.objects.bulk_create([
+            Appointment(
+                patient=patient, doctor=doctor, status=AppointmentStatus.COMPLETED, start_time=time(9),
+                end_time=time(9, 30), scheduled_date=old - timedelta(days=offset),
+            )
+            for offset in range(20)
+        ])
+        DoctorDailyUtilization.objects.create(doctor=doctor, day=timezone.localdate(old), refreshed_at=timezone.now())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(archive.archive_batch(archive.retention_cutoff()), 20)
+        flags = [query for query in queries if 'UPDATE "management_doctordailyutilization"' in query['sql']]
+        self.assertEqual(len(flags), 1)
+        self.assertTrue(DoctorDailyUtilization.objects.get(doctor=doctor).is_stale)
+
+    def test_include_archived_lists_and_retrieves_both_tables(self):
+        patient = Patient.objects.create(user=HealthcareUser.objects.create_user(
+            username='api.patient', email='api.patient@example.com', password='x',
+        ))
+        old, recent = [
+            Appointment.objects.create(
+                patient=patient, status=AppointmentStatus.COMPLETED, start_time=time(9), end_time=time(9, 30),
+                scheduled_date=timezone.now() - timedelta(days=days),
+            )
+            for days in (1000, 10)
+        ]
+        archive.archive_batch(archive.retention_cutoff())
+        client = APIClient()
+        client.force_authenticate(HealthcareUser.objects.create_user(
+            username='archive.admin', email='archive.admin@example.com', password='x', role='system_admin',
+        ))
+        url = '/api/v1.0/management/appointments/'
+
+        listed = client.get(url, {'include_archived': 'true'}).json()
+        rows = listed['results'] if isinstance(listed, dict) else listed
+        self.assertEqual([row['id'] for row in rows], [str(recent.pk), str(old.pk)])
+        self.assertEqual(client.get(f'{url}{old.pk}/').status_code, 404)
+        response = client.get(f'{url}{old.pk}/', {'include_archived': 'true'})
+        self.assertEqual((response.status_code, response.json()['id']), (200, str(old.pk)))
+        self.assertEqual(client.get(f'{url}{recent.pk}/', {'include_archived': 'true'}).status_code, 200)
+        self.assertEqual(client.get(f'{url}not-a-uuid/', {'include_archived': 'true'}).status_code, 404)
+
+
+class DoctorUtilizationTest(TestCase):
+    def test_incremental_refresh_and_weekly_report(self):
+        doctor = Doctor.objects.create(
+            user=HealthcareUser.objects.create_user(username='dr.njeri', email='njeri@example.com', password='x'),
+            license_number='KMPDC-7', medical_license='ML-7', license_jurisdiction='KE',
+        )
+        patient = Patient.objects.create(user=HealthcareUser.objects.create_user(
+            username='util.patient', email='util.patient@example.com', password='x',
+        ))
+        monday = timezone.localdate() - timedelta(days=timezone.localdate().weekday() + 7)
+        Availability.objects.create(doctor=doctor, weekday=0, start_time=time(9), end_time=time(12))
+
+        def book(hour, status):
+            return Appointment.objects.create(
+                patient=patient, doctor=doctor, status=status, start_time=time(hour), end_time=time(hour, 30),
+                scheduled_date=timezone.make_aware(datetime.combine(monday, time(hour))),
+            )
+        book(9, AppointmentStatus.COMPLETED)
+        missed = book(10, AppointmentStatus.NO_SHOW)
+        book(11, AppointmentStatus.CANCELLED)
+
+        first = utilization.refresh()
+        row = DoctorDailyUtilization.objects.get(doctor=doctor, day=monday)
+        self.assertEqual((row.available_minutes, row.booked_minutes, row.no_shows, row.cancellations), (180, 60, 1, 1))
+
+        missed.delete()
+        run = utilization.refresh()
+        self.assertLess(run.days_refreshed, first.days_refreshed)  # not the days in between
+        row = DoctorDailyUtilization.objects.get(doctor=doctor, day=monday)
+        self.assertEqual((row.booked_minutes, row.appointments, row.is_stale), (30, 2, False))
+
+        [week] = utilization.weekly_report(monday, monday + timedelta(days=6))
+        self.assertEqual((week['week'], week['available_hours'], week['booked_hours']), (monday, 3.0, 0.5))
+        self.assertEqual((week['utilization'], week['no_show_rate'], week['cancellation_rate'], week['rank']),
+                         (0.167, 0.0, 0.5, 1))
+
+
+class DashboardCounterTest(TestCase):
+    def setUp(self):
+        cache.delete(dashboard.CACHE_KEY)
+
+    def test_signals_keep_counts_and_reconcile_fixes_bulk_updates(self):
+        patient = Patient.objects.create(user=HealthcareUser.objects.create_user(
+            username='dash.patient', email='dash.patient@example.com', password='x',
+        ))
+        today = timezone.localdate()
+
+        def book(hour):
+            return Appointment.objects.create(
+                patient=patient, start_time=time(hour), end_time=time(hour, 30),
+                scheduled_date=timezone.make_aware(datetime.combine(today, time(hour))),
+            )
+        first, second, third = book(9), book(10), book(11)
+        first.status = AppointmentStatus.COMPLETED
+        first.save()
+        third.delete()
+        with self.assertNumQueries(1):  # a login touches no counter
+            patient.user.save(update_fields=['last_login'])
+
+        figures = dashboard.compute()
+        self.assertEqual(figures['appointments']['by_status'], {'scheduled': 1, 'completed': 1})
+        self.assertEqual(figures['appointments']['by_day'][today.isoformat()], {'scheduled': 1, 'completed': 1})
+        self.assertEqual(figures['new_users']['by_role']['patient'], {'pending': 1})
+        self.assertEqual(dashboard.reconcile(), 0)
+
+        Appointment.objects.filter(pk=second.pk).update(status=AppointmentStatus.CANCELLED)  # bypasses signals
+        self.assertEqual(dashboard.reconcile(), 2)
+        self.assertEqual(dashboard.compute()['appointments']['by_status'], {'cancelled': 1, 'completed': 1})
+
+        cached = dashboard.dashboard()
+        book(12)
+        self.assertEqual(dashboard.dashboard(), cached)  # served from the cache until it expires
+
+    def test_edits_of_loaded_rows_and_bulk_writes_move_counters(self):
+        patient = Patient.objects.create(user=HealthcareUser.objects.create_user(
+            username='dash.bulk', email='dash.bulk@example.com', password='x',
+        ))
+        past = timezone.now() - timedelta(days=400)
+        booked = [
+            Appointment.objects.create(
+                patient=patient, start_time=time(hour), end_time=time(hour, 30),
+                scheduled_date=past.replace(hour=hour, minute=0),
+            )
+            for hour in (9, 10, 11)
+        ]
+
+        loaded = Appointment.objects.get(pk=booked[0].pk)
+        loaded.status = AppointmentStatus.IN_PROGRESS
+        loaded.save()
+        user = HealthcareUser.objects.get(pk=patient.user.pk)
+        user.role = 'doctor'
+        user.save()
+        by_status = dashboard.compute()['appointments']['by_status']
+        self.assertEqual(by_status, {'scheduled': 2, 'in_progress': 1})
+        self.assertEqual(dashboard.reconcile(), 0)
+
+        lifecycle.close_stale_chunk(lifecycle.stale_before())
+        self.assertEqual(dashboard.compute()['appointments']['by_status'], {'no_show': 2, 'completed': 1})
+        self.assertEqual(dashboard.reconcile(), 0)
+
+        # The archived rows' counters drop in one UPDATE per distinct delta, not one per row.
+        with CaptureQueriesContext(connection) as queries:
+            archive.archive_batch(timezone.now())
+        counter_writes = [query for query in queries if 'UPDATE "management_dashboardcounter"' in query['sql']]
+        self.assertEqual(len(counter_writes), 2)  # -2 (no_show) and -1 (completed)
+        self.assertEqual(dashboard.compute()['appointments']['by_status'], {})
+        archive.restore([appointment.pk for appointment in booked])
+        self.assertEqual(dashboard.compute()['appointments']['by_status'], {'no_show': 2, 'completed': 1})
+        self.assertEqual(dashboard.reconcile(), 0)
+
+
+class GunicornConfigTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        with open(os.path.join(self.directory, 'counter_1.db'), 'wb'):
+            pass
+
+    def load_config(self):
+        spec = importlib.util.spec_from_file_location('gunicorn_conf', settings.BASE_DIR / 'gunicorn.conf.py')
+        with mock.patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': self.directory}):
+            spec.loader.exec_module(importlib.util.module_from_spec(spec))
+
+    def test_first_load_clears_the_prometheus_directory(self):
+        with mock.patch.dict(sys.modules):
+            del sys.modules['api.metrics']
+            self.load_config()
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_reload_after_the_app_is_imported_keeps_its_files(self):
+        self.load_config()  # api.metrics is loaded, as in a preloaded master on HUP
+        self.assertEqual(os.listdir(self.directory), ['counter_1.db'])
+
+
+class StartupTest(TestCase):
+    def test_parse_importtime(self):
+        stderr = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |   _io\n'
+            'import time:      2500 |       4000 | django\n'
+            'unrelated warning\n'
+        )
+        self.assertEqual(parse_importtime(stderr), [('_io', 1, 120, 120), ('django', 0, 2500, 4000)])
+
+    def test_boot_defers_what_docs_startup_says_it_does(self):
+        # docs/startup.md: no print from settings, no openai until first use, no
+        # schema building machinery until the schema is built.
+        script = BOOT + 'import sys\nprint(sorted({"openai", "rest_framework.test"} & set(sys.modules)))\n'
+        result = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            env=dict(os.environ, DJANGO_SETTINGS_MODULE='api.settings'),
+        )
+        self.assertEqual(result.stdout, '[]\n')
+
+
+class MetricsEndpointTest(TestCase):
+    def scrape(self, token=None):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        return self.client.get('/metrics', **headers)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_off_without_a_token(self):
+        self.assertEqual(self.scrape('anything').status_code, 404)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_token_required(self):
+        self.assertEqual(self.scrape().status_code, 403)
+        self.assertEqual(self.scrape('wrong').status_code, 403)
+        response = self.scrape('s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'http_requests_total', response.content)
+
+    def test_requests_recorded_by_route_name(self):
+        def sample(name, **labels):
+            return REGISTRY.get_sample_value(name, labels) or 0
+
+        requests = sample('http_requests_total', route='health', method='GET', status='200')
+        timed = sample('http_request_duration_seconds_count', route='health', method='GET')
+        self.assertEqual(self.client.get('/health/').status_code, 200)
+        self.assertEqual(sample('http_requests_total', route='health', method='GET', status='200'), requests + 1)
+        self.assertEqual(sample('http_request_duration_seconds_count', route='health', method='GET'), timed + 1)
+
+    def test_worker_exits_counted_by_a_preloaded_master(self):
+        # What a preloaded gunicorn master does: load the config, import the
+        # app's metrics, then count a worker exit in child_exit.
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        master = (
+            'import importlib.util\n'
+            'spec = importlib.util.spec_from_file_location("gunicorn_conf", "gunicorn.conf.py")\n'
+            'conf = importlib.util.module_from_spec(spec)\n'
+            'spec.loader.exec_module(conf)\n'
+            'import api.metrics\n'
+            'spec.loader.exec_module(conf)\n'  # a config reload on HUP
+            'class Worker:\n'
+            '    pid = 1\n'
+            'conf.child_exit(None, Worker())\n'
+        )
+        subprocess.run(
+            [sys.executable, '-c', master], cwd=settings.BASE_DIR, check=True,
+            env=dict(os.environ, PROMETHEUS_MULTIPROC_DIR=directory),
+        )
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=directory)
+        self.assertEqual(registry.get_sample_value('gunicorn_worker_exits_total'), 1)
+
+
+class SlowQueryLogTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_override = override_settings(
+            SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG_FILE=os.path.join(directory, 'slow.log'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(self.drop_handler)
+
+    def drop_handler(self):
+        for handler in list(slow_queries.logger.handlers):
+            slow_queries.logger.removeHandler(handler)
+            handler.close()
+
+    def test_values_redacted_and_only_selects_explained(self):
+        with connection.execute_wrapper(slow_queries.record):
+            list(HealthcareUser.objects.filter(email='secret@example.com', is_active=True))
+            HealthcareUser.objects.filter(email='secret@example.com').update(first_name='Secret')
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 'secret@example.com', 'it''s secret'")
+
+        raw, update, select = slow_queries.recent_entries()
+        for entry in (raw, update, select):
+            # The stack quotes source lines, which are code, not data.
+            self.assertNotIn('secret', json.dumps([entry['sql'], entry['params'], entry['explain']]).lower())
+        self.assertEqual(select['params'], ['<str>'])
+        self.assertTrue(select['explain'])
+        self.assertEqual(update['params'], ['<str>', '<str>'])
+        self.assertIsNone(update['explain'])
+        self.assertEqual(raw['sql'], "SELECT '<str>', '<str>'")
+
+    def test_origin_is_the_view_not_django(self):
+        client = APIClient()
+        client.force_authenticate(HealthcareUser.objects.create_user(
+            username='slow.admin', email='slow.admin@example.com', password='x', role='system_admin',
+        ))
+        with connection.execute_wrapper(slow_queries.record):
+            self.assertEqual(client.get('/api/v1.0/management/availabilities/').status_code, 200)
+
+        entries = slow_queries.recent_entries()
+        self.assertTrue(entries)
+        for entry in entries:
+            self.assertEqual(entry['origin']['file'], 'management/views.py')
+            self.assertEqual(entry['origin']['function'], 'list')
+            for frame in entry['stack']:
+                self.assertFalse(frame['file'].startswith('..') or 'site-packages' in frame['file'], frame)
+
+    def test_listing_is_admin_only(self):
+        url = '/api/v1.0/diagnostics/slow-queries/'
+        client = APIClient()
+        self.assertEqual(client.get(url).status_code, 401)
+        client.force_authenticate(HealthcareUser.objects.create_user(
+            username='slow.patient', email='slow.patient@example.com', password='x',
+        ))
+        self.assertEqual(client.get(url).status_code, 403)
+        client.force_authenticate(HealthcareUser.objects.create_user(
+            username='slow.viewer', email='slow.viewer@example.com', password='x', role='system_admin',
+        ))
+        response = client.get(url, {'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['entries'], [])
+
+
+class SlowUpstream(BaseHTTPRequestHandler):
+    def do_GET(self):
+        sleep(0.05)
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class ServerTimingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), SlowUpstream)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def phases(self, header):
+        """{name: {'dur': ms, 'count': n, ...}} from a Server-Timing header."""
+        phases = {}
+        for part in header.split(', '):
+            name, *params = part.split(';')
+            self.assertNotIn(name, phases, header)
+            values = dict(param.split('=', 1) for param in params)
+            phase = {'dur': float(values['dur'])}
+            for pair in values.get('desc', '').strip('"').split():
+                key, value = pair.split('=')
+                phase[key] = int(value)
+            phases[name] = phase
+        return phases
+
+    def view(self, request):
+        import requests
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        user = HealthcareUser.objects.create_user(username='timed', email='timed@example.com', password='x')
+        AccessToken(str(AccessToken.for_user(user)))  # decoded by TokenBackend.decode
+        cache.set('timed:hit', 1)
+        cache.get('timed:hit')
+        cache.get('timed:miss')
+        Specialization.objects.create(name='Cardiology')
+        PatientSerializer(Patient.objects.all(), many=True).data  # one query inside the serializer
+        requests.get(f'http://127.0.0.1:{self.server.server_port}/')
+        return HttpResponse()
+
+    @override_settings(PERF_SAMPLE_RATE=1.0)
+    def test_sampled_request_attributes_each_phase(self):
+        response = ServerTimingMiddleware(self.view)(RequestFactory().get('/timed/'))
+        phases = self.phases(response['Server-Timing'])
+        counts = {name: phase.get('count') for name, phase in phases.items()}
+        self.assertGreaterEqual(counts.pop('db'), 3)  # the two inserts and the serializer's select, plus signals
+        self.assertEqual(counts, {'jwt': 1, 'cache': 2, 'serializer': 1, 'http': 1, 'total': None})
+        self.assertEqual((phases['cache']['hits'], phases['cache']['misses']), (1, 1))
+        self.assertGreaterEqual(phases['http']['dur'], 50)
+        self.assertLess(phases['serializer']['dur'], 50)
+        self.assertGreaterEqual(phases['total']['dur'], phases['http']['dur'])
+
+    @override_settings(PERF_SAMPLE_RATE=0.0)
+    def test_unsampled_request_has_no_header(self):
+        response = ServerTimingMiddleware(self.view)(RequestFactory().get('/timed/'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_header_through_the_middleware_stack(self):
+        with override_settings(PERF_SAMPLE_RATE=1.0):
+            self.assertIn('total;dur=', self.client.get('/health/')['Server-Timing'])
+        with override_settings(PERF_SAMPLE_RATE=0.0):
+            self.assertFalse(self.client_class().get('/health/').has_header('Server-Timing'))
+
+
+class DoctorCalendarTest(TestCase):
+    url = '/api/v1.0/management/appointments/calendar/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = Doctor.objects.create(
+            user=HealthcareUser.objects.create_user(username='dr.otieno', email='otieno@example.com', password='x'),
+            license_number='KMPDC-9', medical_license='ML-9', license_jurisdiction='KE',
+        )
+        cls.monday = timezone.localdate() - timedelta(days=timezone.localdate().weekday())
+        patients = [
+            Patient.objects.create(user=HealthcareUser.objects.create_user(
+                username=f'cal.patient{i}', email=f'cal.patient{i}@example.com', password='x',
+            ))
+            for i in range(2)
+        ]
+        for offset, hour, patient in ((0, 9, patients[0]), (0, 10, patients[1]), (2, 9, patients[0])):
+            day = cls.monday + timedelta(days=offset)
+            Appointment.objects.create(
+                patient=patient, doctor=cls.doctor, start_time=time(hour), end_time=time(hour, 30),
+                scheduled_date=timezone.make_aware(datetime.combine(day, time(hour))),
+            )
+        for weekday in range(5):
+            Availability.objects.create(doctor=cls.doctor, weekday=weekday, start_time=time(9), end_time=time(17))
+        TimeOff.objects.create(
+            doctor=cls.doctor, reason='Conference', is_approved=True,
+            start_datetime=timezone.make_aware(datetime.combine(cls.monday + timedelta(days=3), time.min)),
+            end_datetime=timezone.make_aware(datetime.combine(cls.monday + timedelta(days=4), time.min)),
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor.user)
+
+    def calendar(self, **params):
+        return self.client.get(self.url, {'doctor': str(self.doctor.pk), **params})
+
+    def test_fixed_queries_and_patients_listed_once(self):
+        with self.assertNumQueries(4):
+            day = self.calendar(date=self.monday.isoformat()).json()
+        with self.assertNumQueries(4):
+            week = self.calendar(date=(self.monday + timedelta(days=2)).isoformat(), span='week').json()
+
+        self.assertEqual((len(day['appointments']), len(day['patients']), len(day['availability'])), (2, 2, 1))
+        self.assertEqual((len(week['appointments']), len(week['patients']), len(week['availability'])), (3, 2, 5))
+        self.assertEqual(week['start'], self.monday.isoformat())
+        self.assertEqual(len(week['time_off']), 1)
+        self.assertEqual(
+            {appointment['patient'] for appointment in week['appointments']}, set(week['patients']),
+        )
+
+    def test_bad_ranges_rejected(self):
+        for params in (
+            {'date': 'tomorrow'}, {'date': '2025-02-30'}, {'span': 'month'}, {'span': 'year'},
+            {'date': '9999-12-31', 'span': 'week'},
+        ):
+            response = self.calendar(**params)
+            self.assertEqual(response.status_code, 400, params)
+        self.assertEqual(self.client.get(self.url, {'doctor': 'nobody'}).status_code, 400)
+
+
+class ORJSONTest(TestCase):
+    def test_renders_like_json_renderer(self):
+        eat = timezone.get_fixed_timezone(180)
+        values = [
+            Decimal('3500.50'), Decimal('0'), Decimal('-1.10'), Decimal('1E+30'),
+            datetime(2025, 3, 1, 9, 30, 0, 123456, tzinfo=timezone.get_fixed_timezone(0)), datetime(2025, 3, 1, 9, 30, tzinfo=eat),
+            datetime(2025, 3, 1, 9, 30), datetime(2025, 3, 1).date(), time(9, 30), time(9, 30, 0, 500),
+            Appointment._meta.get_field('id').default(), timezone.now,  # a UUID, and an unserializable
+            gettext_lazy('Cancelled'), 'Nairobi — ñ 日本 \u2028 \U0001F600', {1: 'a', 'b': None},
+            Decimal('0.00001'), Decimal('NaN'), 2 ** 70, 0.0001, 12345678.9, -0.0, timedelta(hours=1), (True, False), [],
+        ]
+        for value in values:
+            data = {'value': value, 'list': [value]}
+            try:
+                expected = JSONRenderer().render(data)
+            except (TypeError, ValueError) as exc:
+                with self.assertRaises(type(exc)):
+                    ORJSONRenderer().render(data)
+                continue
+            self.assertEqual(ORJSONRenderer().render(data), expected, repr(value))
+
+    def test_parses_like_json_parser(self):
+        bodies = [
+            b'{"a": 1, "b": [1.5, -2, true, null], "c": {"d": "e"}}', '{"jina": "Wanjirũ 日本"}'.encode(),
+            b'{"big": 123456789012345678901234567890, "neg": -9223372036854775809}', b'[1e400]', b'"\\ud800"',
+            b'{"a": 1, "a": 2}',
+        ]
+        for body in bodies:
+            self.assertEqual(
+                ORJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)), body,
+            )
+        for body in (b'[1, 2', b'{"a": NaN}', b'', b"{'a': 1}"):
+            with self.assertRaises(ParseError):
+                ORJSONParser().parse(io.BytesIO(body))
+
+    def test_round_trip(self):
+        data = {
+            'id': str(Appointment._meta.get_field('id').default()), 'fee': Decimal('3500.50'),
+            'at': datetime(2025, 3, 1, 9, 30, tzinfo=timezone.get_fixed_timezone(0)), 'notes': 'Kikohozi — ñ', 'tags': ['a', 'b'],
+        }
+        parsed = ORJSONParser().parse(io.BytesIO(ORJSONRenderer().render(data)))
+        self.assertEqual(parsed, JSONParser().parse(io.BytesIO(JSONRenderer().render(data))))
+        self.assertEqual(parsed['fee'], 3500.5)
+        self.assertEqual(parsed['at'], '2025-03-01T09:30:00Z')
+
+
+class OpenAPISchemaTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'swagger.json')
+        settings_override = override_settings(OPENAPI_SCHEMA_FILE=self.path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        document = mock.patch.object(openapi, '_document', None)
+        document.start()
+        self.addCleanup(document.stop)
+
+    def test_built_once_when_there_is_no_file(self):
+        with mock.patch.object(openapi, 'build_schema', return_value=b'{"swagger": "2.0"}') as build:
+            threads = [threading.Thread(target=openapi.schema_document) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            content, etag = openapi.schema_document()
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(content, b'{"swagger": "2.0"}')
+
+    def test_prebuilt_file_served_with_etag(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'{"swagger": "2.0", "paths": {}}')
+        with mock.patch.object(openapi, 'build_schema') as build:
+            response = self.client.get('/swagger.json/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, b'{"swagger": "2.0", "paths": {}}')
+            self.assertIn('max-age=300', response['Cache-Control'])
+            again = self.client.get('/swagger.json/', HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual((again.status_code, again.content), (304, b''))
+            self.assertEqual(again['ETag'], response['ETag'])
+            self.assertEqual(self.client.get('/swagger.json/', HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+        build.assert_not_called()
+        self.assertEqual(self.client.post('/swagger.json/').status_code, 405)
+
+    def test_command_writes_the_schema(self):
+        out = StringIO()
+        call_command('build_openapi_schema', stdout=out)
+        with open(self.path, 'rb') as f:
+            content = f.read()
+        schema = json.loads(content)
+        self.assertIn('/management/appointments/', schema['paths'])
+        self.assertEqual(schema['basePath'], '/api/v1.0')
+        self.assertEqual(schema['info']['title'], openapi.API_INFO.title)
+        self.assertNotIn('host', schema)
+        self.assertIn(f'Wrote {self.path}', out.getvalue())
+        self.assertFalse(os.path.exists(f'{self.path}.tmp'))
+        self.assertEqual(openapi.schema_document()[0], content)
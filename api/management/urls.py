@@ -10,6 +10,8 @@ router.register(r'appointments', AppointmentViewSet, basename='appointment')
 router.register(r'clinical-attachments', ClinicalAttachmentViewSet, basename='clinical-attachment')
 router.register(r'prescriptions', PrescriptionViewSet, basename='prescription')
 router.register(r'time-off', TimeOffViewSet, basename='time-off')
+router.register(r'appointment-series', AppointmentSeriesViewSet, basename='appointment-series')
+router.register(r'waitlist', WaitlistEntryViewSet, basename='waitlist')
 # router.register(r'trips', TripViewSet)
 # router.register(r'logs', LogSheetViewSet)
 
@@ -17,6 +19,8 @@ urlpatterns = [
     
     path('', include(router.urls)),
     path('home/', FunnyAPIView.as_view(), name='default_view'),
+    path('reports/utilization/', UtilizationReportView.as_view(), name='utilization-report'),
+    path('reports/dashboard/', DashboardView.as_view(), name='dashboard'),
     # router.urls,
     
 ]
@@ -2,10 +2,18 @@ from django.db import transaction
 
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from .models import Specialization,Availability,Appointment,ClinicalAttachment,Prescription,TimeOff
+from .models import AppointmentSeries, AppointmentStatus, ArchivedAppointment, WaitlistEntry
 from .serializers import SpecializationSerializer,AvailabilitySerializer, AppointmentSerializer,ClinicalAttachmentSerializer,PrescriptionSerializer,TimeOffSerializer
+from .serializers import AppointmentSeriesSerializer, ArchivedAppointmentSerializer, SeriesFollowingSerializer, WaitlistEntrySerializer
+from .serializers import CalendarAppointmentSerializer, CalendarAvailabilitySerializer, CalendarPatientSerializer, CalendarTimeOffSerializer
+from profiles.models import Patient
+from uuid import UUID
 from django.shortcuts import get_object_or_404
+from django.http import Http404
 
 from rest_framework.permissions import IsAuthenticated
 
@@ -13,9 +21,22 @@ from rest_framework.permissions import IsAuthenticated
 # from profiles.permissions import IsAdminUserCustom
 
 from datetime import datetime, date, timedelta
+from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
-
-class SpecializationViewSet(viewsets.ModelViewSet):
+from api.db import immediate_atomic
+from api.compiled_serializers import compile_serializer
+from api.mixins import CompiledListMixin, ConditionalGetMixin, SparseQuerysetMixin
+from management.services import specialization_counts
+from management.services.dashboard import dashboard
+from management.services.scheduling import earliest_slots
+from management.services import series as appointment_series
+from management.services.utilization import weekly_report
+from management.services.waitlist import fill_cancelled_slots
+from profiles.permissions import IsAdmin
+from django.db.models import Value
+from django.utils import timezone
+
+class SpecializationViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing medical specializations.
     """
@@ -118,6 +139,59 @@ class SpecializationViewSet(viewsets.ModelViewSet):
             .distinct()
         return Response([d for d in departments if d])
 
+    @swagger_auto_schema(
+        operation_description="Doctor counts per specialization, grouped by department (served from cache)",
+        tags=['Specializations']
+    )
+    @action(detail=False, methods=['get'])
+    def counts(self, request):
+        """
+        Get doctor counts (all, available, accepting new patients) per specialization and department
+        """
+        return Response(specialization_counts.get_counts())
+
+    @swagger_auto_schema(
+        operation_description="Doctors in this specialization with the earliest free slots. "
+                              "Query params: k (1-50, default 5), from (YYYY-MM-DD), horizon_days (1-90, default 14)",
+        tags=['Specializations']
+    )
+    @action(detail=True, methods=['get'])
+    def earliest(self, request, slug=None):
+        """
+        Get the k doctors with the soonest free appointment slot
+        """
+        specialization = self.get_object()
+        params = request.query_params
+        try:
+            k = int(params.get('k', 5))
+            horizon_days = int(params.get('horizon_days', 14))
+            start = params.get('from')
+            if start:
+                start = timezone.make_aware(datetime.combine(date.fromisoformat(start), datetime.min.time()))
+        except ValueError:
+            raise ValidationError({'detail': 'k and horizon_days must be integers and from a YYYY-MM-DD date.'})
+        if not 1 <= k <= 50:
+            raise ValidationError({'k': ['Must be between 1 and 50.']})
+        if not 1 <= horizon_days <= 90:
+            raise ValidationError({'horizon_days': ['Must be between 1 and 90.']})
+
+        slots = earliest_slots(specialization, k=k, start=start, horizon_days=horizon_days)
+        return Response([
+            {
+                'doctor': {
+                    'id': doctor.pk,
+                    'username': doctor.user.username,
+                    'first_name': doctor.user.first_name,
+                    'last_name': doctor.user.last_name,
+                    'fees': doctor.fees,
+                    'rating': doctor.rating,
+                },
+                'start': slot_start,
+                'end': slot_end,
+            }
+            for slot_start, slot_end, doctor in slots
+        ])
+
     @swagger_auto_schema(            
         operation_description="Get only surgical specializations",
         tags=['Specializations']
@@ -172,9 +246,11 @@ class SpecializationViewSet(viewsets.ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class AvailabilityViewSet(viewsets.ModelViewSet):
+class AvailabilityViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = Availability.objects.all()
     serializer_class = AvailabilitySerializer
+    etag_related_fields = ('doctor__updated_at', 'doctor__user__updated_at', 'doctor__specializations__updated_at')
+    expand_relations = {'doctor_detail': (('doctor__user',), ('doctor__specializations',))}
     @swagger_auto_schema(
         operation_description="Create a new availability slot for a doctor",
         request_body=AvailabilitySerializer,
@@ -302,27 +378,85 @@ class AvailabilityViewSet(viewsets.ModelViewSet):
 
 
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AppointmentViewSet(ConditionalGetMixin, SparseQuerysetMixin, CompiledListMixin, viewsets.ModelViewSet):
     """
     ViewSet for handling appointment operations including booking, retrieval, and cancellation.
     """
     queryset = Appointment.objects.all()
     serializer_class = AppointmentSerializer
+    etag_related_fields = (
+        'doctor__updated_at', 'doctor__user__updated_at', 'doctor__specializations__updated_at',
+        'patient__updated_at', 'patient__user__updated_at',
+    )
+    expand_relations = {
+        'doctor_detail': (('doctor__user',), ('doctor__specializations',)),
+        'patient_detail': (('patient__user',), ()),
+    }
+
+    include_archived_param = openapi.Parameter(
+        'include_archived', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+        description="Also look in the archive (appointments past the retention window).",
+    )
+
+    def include_archived(self):
+        return self.request.query_params.get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+    def archived_queryset(self):
+        return ArchivedAppointment.objects.select_related('doctor__user', 'patient__user').prefetch_related(
+            'doctor__specializations',
+        )
 
     @swagger_auto_schema(
         operation_summary="List all appointments",
-        operation_description="Retrieve a list of all booked appointments. Supports pagination and filtering (if configured).",
+        operation_description="Retrieve a list of all booked appointments. Supports pagination and filtering (if configured). "
+                              "With include_archived=true archived appointments are listed too, newest first.",
+        manual_parameters=[include_archived_param],
         tags=["Appointments"]
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        if not self.include_archived():
+            return super().list(request, *args, **kwargs)
+
+        # One ordered key list over both tables, so paging works across them,
+        # then each table's rows for the page.
+        hot = self.filter_queryset(self.get_queryset())
+        keys = hot.annotate(archived=Value(False)).values_list('scheduled_date', 'id', 'archived').union(
+            ArchivedAppointment.objects.annotate(archived=Value(True)).values_list('scheduled_date', 'id', 'archived'),
+            all=True,
+        ).order_by('-scheduled_date', '-id')
+        page = self.paginate_queryset(keys)
+        keys = list(keys if page is None else page)
+
+        context = self.get_serializer_context()
+        rows = {}
+        for queryset, serializer, archived in (
+            (hot, self.get_serializer(), False),
+            (self.archived_queryset(), ArchivedAppointmentSerializer(context=context), True),
+        ):
+            pks = [pk for _, pk, is_archived in keys if is_archived == archived]
+            if pks:
+                row = compile_serializer(serializer)
+                rows.update((obj.pk, row(obj)) for obj in queryset.filter(pk__in=pks))
+        data = [rows[pk] for _, pk, _ in keys if pk in rows]
+        return self.get_paginated_response(data) if page is not None else Response(data)
 
     @swagger_auto_schema(
         operation_summary="Retrieve an appointment",
-        operation_description="Fetch detailed information about a specific appointment using its ID.",
+        operation_description="Fetch detailed information about a specific appointment using its ID. "
+                              "With include_archived=true an archived appointment is found too.",
+        manual_parameters=[include_archived_param],
         tags=["Appointments"]
     )
     def retrieve(self, request, *args, **kwargs):
+        if self.include_archived():
+            try:
+                pk = UUID(str(kwargs['pk']))
+            except ValueError:
+                raise Http404
+            if Appointment.objects.filter(pk=pk).exists():
+                return super().retrieve(request, *args, **kwargs)
+            archived = get_object_or_404(self.archived_queryset(), pk=pk)
+            return Response(ArchivedAppointmentSerializer(archived, context=self.get_serializer_context()).data)
         return super().retrieve(request, *args, **kwargs)
 
     @swagger_auto_schema(
@@ -334,7 +468,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     )
     def create(self, request, *args, **kwargs):
         try:
-            with transaction.atomic():
+            with immediate_atomic():
                 serializer = self.get_serializer(data=request.data)
                 serializer.is_valid(raise_exception=True)
 
@@ -376,6 +510,71 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     def partial_update(self, request, *args, **kwargs):
         return super().partial_update(request, *args, **kwargs)
 
+    def perform_update(self, serializer):
+        # A cancellation hands the slot to the waitlist in the same transaction.
+        with immediate_atomic():
+            was_scheduled = serializer.instance.status == AppointmentStatus.SCHEDULED
+            appointment = serializer.save()
+            if was_scheduled and appointment.status == AppointmentStatus.CANCELLED:
+                fill_cancelled_slots([appointment])
+
+    @swagger_auto_schema(
+        operation_summary="Doctor calendar",
+        operation_description="A doctor's day or week: appointments, availability windows and time off. "
+                              "Patients are listed once under `patients` and appointments refer to them by id. "
+                              "Query params: doctor (required), date (YYYY-MM-DD, default today), span (day|week).",
+        tags=["Appointments"]
+    )
+    @action(detail=False, methods=['get'])
+    def calendar(self, request):
+        params = request.query_params
+        try:
+            doctor = UUID(params.get('doctor', ''))
+        except ValueError:
+            raise ValidationError({'doctor': ['A valid doctor id is required.']})
+        try:
+            day = date.fromisoformat(params['date']) if params.get('date') else timezone.localdate()
+        except ValueError:
+            raise ValidationError({'date': ['Use YYYY-MM-DD.']})
+        span = params.get('span', 'day')
+        if span not in ['day', 'week']:
+            raise ValidationError({'span': ["Choose 'day' or 'week'."]})
+
+        first = day - timedelta(days=day.weekday()) if span == 'week' else day
+        days = 7 if span == 'week' else 1
+        try:
+            start = timezone.make_aware(datetime.combine(first, datetime.min.time()))
+            end = start + timedelta(days=days)
+        except OverflowError:
+            raise ValidationError({'date': ['Out of range.']})
+
+        appointments = list(
+            Appointment.objects.filter(doctor_id=doctor, scheduled_date__gte=start, scheduled_date__lt=end)
+            .only('id', 'patient_id', 'scheduled_date', 'start_time', 'end_time', 'status', 'priority', 'chief_complaint')
+            .order_by('scheduled_date', 'start_time')
+        )
+        patients = Patient.objects.filter(pk__in={a.patient_id for a in appointments}).select_related('user').only(
+            'user__id', 'user__username', 'user__first_name', 'user__last_name', 'known_allergies',
+        ) if appointments else []
+        weekdays = sorted({(first + timedelta(days=offset)).weekday() for offset in range(days)})
+        availability = Availability.objects.filter(doctor_id=doctor, weekday__in=weekdays).only(
+            'id', 'weekday', 'start_time', 'end_time', 'is_available',
+        )
+        time_off = TimeOff.objects.filter(doctor_id=doctor, start_datetime__lt=end, end_datetime__gt=start).only(
+            'id', 'start_datetime', 'end_datetime', 'reason', 'is_approved',
+        ).order_by('start_datetime')
+
+        return Response({
+            'doctor': doctor,
+            'span': span,
+            'start': first,
+            'end': first + timedelta(days=days - 1),
+            'patients': {str(row['id']): row for row in CalendarPatientSerializer(patients, many=True).data},
+            'appointments': CalendarAppointmentSerializer(appointments, many=True).data,
+            'availability': CalendarAvailabilitySerializer(availability, many=True).data,
+            'time_off': CalendarTimeOffSerializer(time_off, many=True).data,
+        })
+
     @swagger_auto_schema(
         operation_summary="Cancel/Delete an appointment",
         operation_description="Remove an appointment from the system. This action is irreversible.",
@@ -383,8 +582,14 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     )
     def destroy(self, request, *args, **kwargs):
         return super().destroy(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        with immediate_atomic():
+            instance.delete()
+            if instance.status == AppointmentStatus.SCHEDULED:
+                fill_cancelled_slots([instance])
     
-class ClinicalAttachmentViewSet(viewsets.ModelViewSet):
+class ClinicalAttachmentViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = ClinicalAttachment.objects.all()
     serializer_class = ClinicalAttachmentSerializer
     permission_classes = [IsAuthenticated]  # Adjust this as needed (e.g., IsAdminUser, etc.)
@@ -438,9 +643,17 @@ class ClinicalAttachmentViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         return super().destroy(request, *args, **kwargs)
     
-class PrescriptionViewSet(viewsets.ModelViewSet):
+class PrescriptionViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = Prescription.objects.all()
     serializer_class = PrescriptionSerializer
+    etag_related_fields = (
+        'issued_by__updated_at', 'issued_by__user__updated_at', 'issued_by__specializations__updated_at',
+        'medical_record__updated_at',
+    )
+    expand_relations = {
+        'issued_by': (('issued_by__user',), ('issued_by__specializations',)),
+        'medical_record': (('medical_record',), ()),
+    }
     permission_classes = [IsAuthenticated]  # Adjust this as needed (e.g., IsAdminUser, etc.)
 
     @swagger_auto_schema(
@@ -491,9 +704,11 @@ class PrescriptionViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         return super().destroy(request, *args, **kwargs)
 
-class TimeOffViewSet(viewsets.ModelViewSet):
+class TimeOffViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = TimeOff.objects.all()
     serializer_class = TimeOffSerializer
+    etag_related_fields = ('doctor__updated_at', 'doctor__user__updated_at', 'doctor__specializations__updated_at')
+    expand_relations = {'doctor_detail': (('doctor__user',), ('doctor__specializations',))}
     permission_classes = [IsAuthenticated]  # Adjust this as needed (e.g., IsAdminUser, etc.)
 
     @swagger_auto_schema(
@@ -543,3 +758,208 @@ class TimeOffViewSet(viewsets.ModelViewSet):
     )
     def destroy(self, request, *args, **kwargs):
         return super().destroy(request, *args, **kwargs)
+
+
+class AppointmentSeriesViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
+    """
+    Recurring appointments. Creating a series books its occurrences over the
+    scheduling horizon; later ones are booked by `manage.py materialize_series`.
+    A series is changed or cancelled from a date onwards, never rewritten.
+    """
+    queryset = AppointmentSeries.objects.all().order_by('-created_at')
+    serializer_class = AppointmentSeriesSerializer
+    permission_classes = [IsAuthenticated]
+    http_method_names = ['get', 'post', 'head', 'options']
+
+    @swagger_auto_schema(
+        operation_summary="List appointment series",
+        tags=["Appointment Series"]
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_summary="Retrieve an appointment series",
+        tags=["Appointment Series"]
+    )
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_summary="Create a recurring series",
+        operation_description="Every occurrence is checked against the doctor's availability, time off and bookings "
+                              "(up to the horizon for open-ended series); any conflict rejects the series with the "
+                              "conflicting dates. Occurrences within the horizon are booked straight away.",
+        request_body=AppointmentSeriesSerializer,
+        responses={201: AppointmentSeriesSerializer, 400: 'Invalid input or conflicting occurrences.'},
+        tags=["Appointment Series"]
+    )
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with immediate_atomic():
+            series = serializer.save()
+            occurrences, _ = appointment_series.materialize(series, strict=True)
+        return Response(
+            {**self.get_serializer(series).data, 'occurrences_created': len(occurrences)},
+            status=status.HTTP_201_CREATED,
+        )
+
+    @swagger_auto_schema(
+        operation_summary="Change this and following occurrences",
+        operation_description="Applies the given fields to every scheduled occurrence on or after `from` and to the "
+                              "rule from then on (the series is split; the new one is returned).",
+        request_body=SeriesFollowingSerializer,
+        responses={201: AppointmentSeriesSerializer},
+        tags=["Appointment Series"]
+    )
+    @action(detail=True, methods=['post'])
+    def following(self, request, pk=None):
+        series = self.get_object()
+        serializer = SeriesFollowingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changes = {name: value for name, value in serializer.validated_data.items() if name != 'from'}
+        if not changes:
+            raise ValidationError({'detail': 'Nothing to change.'})
+        with immediate_atomic():
+            successor = appointment_series.change_following(series, serializer.validated_data['from'], changes)
+        return Response(self.get_serializer(successor).data, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(
+        operation_summary="Cancel this and following occurrences",
+        operation_description="Cancels every scheduled occurrence on or after `from` (YYYY-MM-DD) and ends the series.",
+        tags=["Appointment Series"]
+    )
+    @action(detail=True, methods=['post'], url_path='cancel-following')
+    def cancel_following(self, request, pk=None):
+        series = self.get_object()
+        try:
+            from_date = date.fromisoformat(request.data.get('from', ''))
+        except (TypeError, ValueError):
+            raise ValidationError({'from': ['Use YYYY-MM-DD.']})
+        with immediate_atomic():
+            cancelled = appointment_series.cancel_following(series, from_date)
+        return Response({'cancelled': cancelled})
+
+
+class WaitlistEntryViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
+    """
+    Patients waiting for a doctor or a specialization. Entries are promoted
+    into cancelled appointments automatically; clients can only withdraw them.
+    """
+    queryset = WaitlistEntry.objects.all()
+    serializer_class = WaitlistEntrySerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        for name in ['status', 'doctor', 'specialization', 'patient']:
+            value = self.request.query_params.get(name)
+            if value:
+                queryset = queryset.filter(**{name: value})
+        return queryset
+
+    @swagger_auto_schema(
+        operation_description="List waitlist entries, most urgent first. Filter with status, doctor, specialization, patient.",
+        responses={200: WaitlistEntrySerializer(many=True)},
+        tags=['Waitlist']
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_description="Put a patient on the waitlist for a doctor or a specialization",
+        responses={201: WaitlistEntrySerializer},
+        tags=['Waitlist']
+    )
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_description="Retrieve a waitlist entry by ID",
+        responses={200: WaitlistEntrySerializer},
+        tags=['Waitlist']
+    )
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_description="Update a waitlist entry (set status to withdrawn to leave the queue)",
+        responses={200: WaitlistEntrySerializer},
+        tags=['Waitlist']
+    )
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_description="Partial update of a waitlist entry",
+        responses={200: WaitlistEntrySerializer},
+        tags=['Waitlist']
+    )
+    def partial_update(self, request, *args, **kwargs):
+        return super().partial_update(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_description="Delete a waitlist entry by ID",
+        responses={204: 'No Content'},
+        tags=['Waitlist']
+    )
+    def destroy(self, request, *args, **kwargs):
+        return super().destroy(request, *args, **kwargs)
+
+
+class UtilizationReportView(APIView):
+    """
+    Weekly doctor utilization, read from the daily summary that
+    `manage.py refresh_utilization` keeps current.
+    """
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    @swagger_auto_schema(
+        operation_summary="Doctor utilization report",
+        operation_description="Booked versus available hours per doctor per week, with no-show and cancellation "
+                              "rates, each doctor's utilization rank within the week and the week before.",
+        manual_parameters=[
+            openapi.Parameter('start', openapi.IN_QUERY, description="First day (YYYY-MM-DD, default 8 weeks ago)",
+                              type=openapi.TYPE_STRING),
+            openapi.Parameter('end', openapi.IN_QUERY, description="Last day (YYYY-MM-DD, default today)",
+                              type=openapi.TYPE_STRING),
+            openapi.Parameter('doctor', openapi.IN_QUERY, description="Only this doctor", type=openapi.TYPE_STRING),
+        ],
+        tags=["Reports"]
+    )
+    def get(self, request):
+        params = request.query_params
+        try:
+            end = date.fromisoformat(params['end']) if params.get('end') else timezone.localdate()
+            start = date.fromisoformat(params['start']) if params.get('start') else end - timedelta(weeks=8)
+        except ValueError:
+            raise ValidationError({'detail': 'Use YYYY-MM-DD for start and end.'})
+        if start > end:
+            raise ValidationError({'start': ['Must not be after end.']})
+        try:
+            doctor = UUID(params['doctor']) if params.get('doctor') else None
+        except ValueError:
+            raise ValidationError({'doctor': ['Must be a doctor id.']})
+
+        # Ranks are among all doctors, so the doctor filter comes after.
+        rows = [row for row in weekly_report(start, end) if doctor is None or row['doctor'] == doctor]
+        return Response({'start': start, 'end': end, 'weeks': rows})
+
+
+class DashboardView(APIView):
+    """
+    Admin dashboard figures, summed from the counters the signals keep and
+    served from the cache for DASHBOARD_CACHE_SECONDS.
+    """
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    @swagger_auto_schema(
+        operation_summary="Admin dashboard",
+        operation_description="Appointments by status and by day around today, new users by role and status over "
+                              "the last 30 days and active prescriptions. Figures may be up to "
+                              "DASHBOARD_CACHE_SECONDS old; `generated_at` says when they were computed.",
+        tags=["Reports"]
+    )
+    def get(self, request):
+        return Response(dashboard())
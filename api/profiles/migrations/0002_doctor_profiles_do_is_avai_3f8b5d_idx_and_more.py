@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0005_prescription_created_at_prescription_issued_by_and_more'),
+        ('profiles', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['is_available', 'accepting_new_patients', 'fees'], name='profiles_do_is_avai_3f8b5d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['is_available', 'rating'], name='profiles_do_is_avai_03eecb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['fees'], name='profiles_do_fees_46ce4e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['rating'], name='profiles_do_rating_2db45e_idx'),
+        ),
+    ]
@@ -94,6 +94,8 @@ class HealthcareUser(AbstractUser):
 
     mfa_enabled = models.BooleanField(default=False)
     token = models.CharField(max_length=255, null=True, blank=True, db_index=True)
+    # Embedded in doctor and patient responses; their ETags include it.
+    updated_at = models.DateTimeField(auto_now=True)
 
     groups = models.ManyToManyField(Group, related_name="users", blank=True)
     user_permissions = models.ManyToManyField(Permission, related_name="user_permissions", blank=True)
@@ -150,6 +152,13 @@ class Doctor(TimeStampedModel):
         constraints = [
             models.UniqueConstraint(fields=['medical_license', 'license_jurisdiction'], name='unique_medical_license')
         ]
+        # Directory filters and sorts (see DoctorViewSet)
+        indexes = [
+            models.Index(fields=['is_available', 'accepting_new_patients', 'fees']),
+            models.Index(fields=['is_available', 'rating']),
+            models.Index(fields=['fees']),
+            models.Index(fields=['rating']),
+        ]
 
     def __str__(self):
         return f"Dr. {self.user.username} - {self.specializations.first()}"
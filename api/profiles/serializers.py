@@ -2,7 +2,10 @@ from rest_framework import serializers
 from django.contrib.auth.hashers import make_password
 from django.core.validators import RegexValidator
 from .models import HealthcareUser, Doctor, Patient, Gender,UserRole,UserStatus,ProfileImage
+from management.models import Specialization
 from management.serializers import SpecializationSerializer
+from api.compiled_serializers import compile_serializer
+from api.mixins import SparseFieldsSerializerMixin
 
 from django.db import transaction
 
@@ -43,6 +46,29 @@ class DoctorProfileSerializer(serializers.ModelSerializer):
             })
         return data
 
+class DirectorySpecializationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Specialization
+        fields = ['slug', 'name', 'department']
+
+
+class DoctorDirectorySerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    """Compact doctor card for the directory; no licence or contact details."""
+    id = serializers.UUIDField(source='user.id', read_only=True)
+    username = serializers.CharField(source='user.username', read_only=True)
+    first_name = serializers.CharField(source='user.first_name', read_only=True)
+    last_name = serializers.CharField(source='user.last_name', read_only=True)
+    specializations = DirectorySpecializationSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Doctor
+        fields = [
+            'id', 'username', 'first_name', 'last_name', 'specializations',
+            'accepting_new_patients', 'emergency_availability', 'experience',
+            'rating', 'is_available', 'fees'
+        ]
+
+
 class PatientProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = Patient
@@ -81,7 +107,7 @@ class PatientSerializer(serializers.ModelSerializer):
 
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(
         write_only=True, 
         min_length=8,
@@ -99,6 +125,7 @@ class UserSerializer(serializers.ModelSerializer):
     # doctor = DoctorSerializer(read_only=True)
     profile_image = ProfileImageSerializer(required=False)
     profile = serializers.SerializerMethodField()
+    expandable_fields = ('profile',)
 
     class Meta:
         model = HealthcareUser
@@ -118,11 +145,19 @@ class UserSerializer(serializers.ModelSerializer):
         Returns the appropriate profile based on user role
         """
         if obj.role == UserRole.CLINICIAN and hasattr(obj, 'clinician_profile'):
-            return DoctorProfileSerializer(obj.clinician_profile).data
+            return self._profile_row(DoctorProfileSerializer)(obj.clinician_profile)
         elif obj.role == UserRole.PATIENT and hasattr(obj, 'patient_profile'):
-            return PatientProfileSerializer(obj.patient_profile).data
+            return self._profile_row(PatientProfileSerializer)(obj.patient_profile)
         return None
 
+    def _profile_row(self, serializer_class):
+        # Compiled once per serializer instance, so a list of users doesn't
+        # build a profile serializer for every row.
+        rows = self.__dict__.setdefault('_profile_rows', {})
+        if serializer_class not in rows:
+            rows[serializer_class] = compile_serializer(serializer_class())
+        return rows[serializer_class]
+
     def validate_phone_number(self, value):
         phone_validator = RegexValidator(
             regex=r'^\+?1?\d{9,15}$',
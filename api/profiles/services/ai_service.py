@@ -1,15 +1,25 @@
 import logging
-from openai import OpenAI 
+from functools import lru_cache
+
 from decouple import config
 
 logger = logging.getLogger(__name__)
 
-client = OpenAI(
-    # base_url="https://integrate.api.nvidia.com/v1",
-    base_url="https://api.aimlapi.com/v1",
-    api_key=config("AIML_API_KEY") 
-)
-# print(config("AIML_API_KEY"))
+
+@lru_cache(maxsize=None)
+def get_client():
+    """The OpenAI client, built on first use: importing `openai` is slow and needs AIML_API_KEY."""
+    from openai import OpenAI
+
+    return OpenAI(
+        # base_url="https://integrate.api.nvidia.com/v1",
+        base_url=config("AIML_BASE_URL", default="https://api.aimlapi.com/v1"),
+        api_key=config("AIML_API_KEY"),
+        timeout=config("AIML_TIMEOUT", default=30, cast=float),
+        max_retries=config("AIML_MAX_RETRIES", default=2, cast=int),
+    )
+
+
 def generate_ai_question(used_questions):
     """
     Generates a new speed dating question using AI, ensuring it doesn't repeat used questions.
@@ -29,7 +39,7 @@ def generate_ai_question(used_questions):
             }
         ]
 
-        completion = client.chat.completions.create(
+        completion = get_client().chat.completions.create(
             model="deepseek/deepseek-r1",
             messages=messages,
             temperature=0.7,
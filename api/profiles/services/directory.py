@@ -0,0 +1,155 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, Exists, OuterRef, Prefetch, Q
+from django.db.models.functions import Lower
+from rest_framework.exceptions import ValidationError
+
+from management.models import Specialization
+from profiles.models import Doctor
+
+BOOLEAN_FILTERS = ('accepting_new_patients', 'is_available', 'emergency_availability')
+ORDERINGS = {
+    'rating': ('rating', 'pk'),
+    '-rating': ('-rating', 'pk'),
+    'fees': ('fees', 'pk'),
+    '-fees': ('-fees', 'pk'),
+}
+DEFAULT_ORDERING = '-rating'
+
+FEE_BUCKETS = ((0, 50), (50, 100), (100, 200), (200, None))
+RATING_THRESHOLDS = (Decimal('3'), Decimal('4'), Decimal('4.5'))
+
+
+def specializations_prefetch():
+    return Prefetch(
+        'specializations',
+        queryset=Specialization.objects.only('id', 'name', 'slug', 'department'),
+    )
+
+
+def directory_queryset(specializations=True):
+    """Doctors with just what the directory card shows, in two queries."""
+    queryset = Doctor.objects.select_related('user').only(
+        'user__id', 'user__username', 'user__first_name', 'user__last_name',
+        'license_number', 'accepting_new_patients', 'emergency_availability',
+        'experience', 'rating', 'is_available', 'fees',
+    )
+    return queryset.prefetch_related(specializations_prefetch()) if specializations else queryset
+
+
+def _number(params, name, cast):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return cast(value)
+    except (ValueError, InvalidOperation):
+        raise ValidationError({name: [f"'{value}' is not a valid number."]})
+
+
+def filter_doctors(queryset, params):
+    """
+    Apply the directory filters from query params.
+
+    Specialization and department go through EXISTS subqueries rather than
+    joins, so a doctor with several matching specializations appears once and
+    no DISTINCT is needed.
+    """
+    through = Doctor.specializations.through
+
+    specialization = params.get('specialization')
+    if specialization:
+        queryset = queryset.filter(Exists(through.objects.filter(
+            doctor_id=OuterRef('pk'), specialization__slug=specialization,
+        )))
+
+    department = params.get('department')
+    if department:
+        queryset = queryset.filter(Exists(through.objects.filter(
+            doctor_id=OuterRef('pk'), specialization__department__iexact=department,
+        )))
+
+    for name in BOOLEAN_FILTERS:
+        value = params.get(name)
+        if value in ['true', 'false']:
+            queryset = queryset.filter(**{name: value == 'true'})
+
+    fee_min = _number(params, 'fee_min', int)
+    if fee_min is not None:
+        queryset = queryset.filter(fees__gte=fee_min)
+    fee_max = _number(params, 'fee_max', int)
+    if fee_max is not None:
+        queryset = queryset.filter(fees__lte=fee_max)
+    rating_min = _number(params, 'rating_min', Decimal)
+    if rating_min is not None:
+        queryset = queryset.filter(rating__gte=rating_min)
+
+    return queryset
+
+
+def order_doctors(queryset, params):
+    ordering = params.get('ordering', DEFAULT_ORDERING)
+    if ordering not in ORDERINGS:
+        raise ValidationError({'ordering': [f"Choose from: {', '.join(ORDERINGS)}"]})
+    return queryset.order_by(*ORDERINGS[ordering])
+
+
+def doctor_facets(queryset):
+    """
+    Counts per filter value for the doctors in `queryset`, in one query per
+    facet: an aggregate over the doctor columns (total, flags, fee buckets,
+    ratings), then one GROUP BY for specializations and one for departments.
+    """
+    specializations = list(
+        Specialization.objects.filter(is_active=True)
+        .order_by('display_order', 'name')
+        .values_list('id', 'slug', 'name', 'department')
+    )
+    # One facet per department whatever its case, matching the iexact filter.
+    departments = {}
+    for *_, department in specializations:
+        if department:
+            departments.setdefault(department.lower(), department)
+    departments = sorted(departments.values(), key=str.casefold)
+
+    queryset = queryset.order_by()
+    aggregates = {'total': Count('pk')}
+    for name in BOOLEAN_FILTERS:
+        aggregates[name] = Count('pk', filter=Q(**{name: True}))
+    for index, (low, high) in enumerate(FEE_BUCKETS):
+        condition = Q(fees__gte=low) if high is None else Q(fees__gte=low, fees__lt=high)
+        aggregates[f'fee_{index}'] = Count('pk', filter=condition)
+    for index, threshold in enumerate(RATING_THRESHOLDS):
+        aggregates[f'rating_{index}'] = Count('pk', filter=Q(rating__gte=threshold))
+    row = queryset.aggregate(**aggregates)
+
+    # Grouped over the specialization join, so a doctor counts once per group.
+    by_specialization = dict(
+        queryset.filter(specializations__isnull=False).values_list('specializations')
+        .annotate(count=Count('pk', distinct=True))
+    )
+    by_department = dict(
+        queryset.filter(specializations__department__isnull=False)
+        .values_list(Lower('specializations__department')).annotate(count=Count('pk', distinct=True))
+    )
+
+    return {
+        'total': row['total'],
+        **{name: row[name] for name in BOOLEAN_FILTERS},
+        'fees': [
+            {'fee_min': low, 'fee_max': high, 'count': row[f'fee_{index}']}
+            for index, (low, high) in enumerate(FEE_BUCKETS)
+        ],
+        'rating': [
+            {'rating_min': str(threshold), 'count': row[f'rating_{index}']}
+            for index, threshold in enumerate(RATING_THRESHOLDS)
+        ],
+        'specializations': [
+            {'slug': slug, 'name': name, 'department': department, 'count': by_specialization.get(pk, 0)}
+            for pk, slug, name, department in specializations
+        ],
+        'departments': [
+            {'department': department, 'count': by_department.get(department.lower(), 0)}
+            for department in departments
+        ],
+    }
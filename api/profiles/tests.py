@@ -1,3 +1,110 @@
-from django.test import TestCase
+from datetime import date
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase, RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.compiled_serializers import compile_serializer
+from management.models import Specialization
+from .models import HealthcareUser, Doctor, Patient, ProfileImage
+from .serializers import UserSerializer
+
+
+class CompiledUserSerializerTest(TestCase):
+    """The compiled read path must render byte-identical JSON to UserSerializer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        doctor_user = HealthcareUser.objects.create_user(
+            username='dr.otieno', email='otieno@example.com', password='x', role='clinician',
+            first_name='Otieno', date_of_birth=date(1980, 5, 17), address={'city': 'Kisumu'},
+        )
+        doctor = Doctor.objects.create(
+            user=doctor_user, license_number='KMPDC-7', medical_license='ML-7', license_jurisdiction='KE',
+        )
+        doctor.specializations.add(Specialization.objects.create(name='Paediatrics'))
+        patient_user = HealthcareUser.objects.create_user(
+            username='baraka', email='baraka@example.com', password='x', phone_number='+254700000000',
+        )
+        Patient.objects.create(user=patient_user, known_allergies=['latex'])
+        patient_user.profile_image = ProfileImage.objects.create(
+            content_type=ContentType.objects.get_for_model(HealthcareUser),
+            object_id=patient_user.pk, image='profile_images/2025/01/baraka.png',
+        )
+        patient_user.save()
+        HealthcareUser.objects.create_user(username='admin', email='admin@example.com', password='x', role='system_admin')
+
+    def test_matches_serializer(self):
+        request = Request(RequestFactory().get('/api/v1.0/profiles/users/', HTTP_HOST='localhost'))
+        users = HealthcareUser.objects.select_related(
+            'patient_profile', 'clinician_profile', 'profile_image',
+        ).prefetch_related('clinician_profile__specializations').order_by('username')
+        expected = JSONRenderer().render(UserSerializer(users, many=True, context={'request': request}).data)
+        row = compile_serializer(UserSerializer(context={'request': request}))
+        self.assertEqual(JSONRenderer().render([row(user) for user in users]), expected)
+
+
+class DoctorDirectoryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cardiology = Specialization.objects.create(name='Cardiology', department='Medicine')
+        paediatrics = Specialization.objects.create(name='Paediatrics', department='medicine')
+        surgery = Specialization.objects.create(name='Surgery', department='Surgery')
+
+        def doctor(username, fees, rating, specializations, **flags):
+            doctor = Doctor.objects.create(
+                user=HealthcareUser.objects.create_user(username=username, email=f'{username}@example.com', password='x'),
+                license_number=f'KMPDC-{username}', medical_license=f'ML-{username}', license_jurisdiction='KE',
+                fees=fees, rating=rating, **flags,
+            )
+            doctor.specializations.add(*specializations)
+            return doctor
+        cls.heart = doctor('heart', 80, Decimal('4.8'), [cardiology, paediatrics])
+        cls.child = doctor('child', 40, Decimal('3.5'), [paediatrics], accepting_new_patients=False)
+        cls.cut = doctor('cut', 250, Decimal('4.2'), [surgery])
+
+    def get(self, path, **params):
+        return self.client.get(f'/api/v1.0/profiles/doctors/{path}', params)
+
+    def usernames(self, **params):
+        return [row['username'] for row in self.get('', **params).json()['results']]
+
+    def test_filters_and_ordering(self):
+        self.assertEqual(self.usernames(), ['heart', 'cut', 'child'])
+        self.assertEqual(self.usernames(ordering='fees'), ['child', 'heart', 'cut'])
+        self.assertEqual(self.usernames(specialization='paediatrics'), ['heart', 'child'])
+        self.assertEqual(self.usernames(department='MEDICINE'), ['heart', 'child'])
+        self.assertEqual(self.usernames(fee_max=100, rating_min='4'), ['heart'])
+        self.assertEqual(self.usernames(accepting_new_patients='false'), ['child'])
+        self.assertEqual(self.get('', ordering='name').status_code, 400)
+        self.assertEqual(self.get('', fee_min='cheap').status_code, 400)
+
+    def test_retrieve_ignores_ordering(self):
+        response = self.get(f'{self.heart.pk}/', ordering='name')
+        self.assertEqual((response.status_code, response.json()['username']), (200, 'heart'))
+
+    def test_facets_agree_with_the_filters(self):
+        facets = self.get('facets/').json()
+        self.assertEqual(facets['departments'], [
+            {'department': 'Medicine', 'count': 2}, {'department': 'Surgery', 'count': 1},
+        ])
+        self.assertEqual(facets['departments'][0]['count'], len(self.usernames(department='medicine')))
+        self.assertEqual(facets['fees'][0], {'fee_min': 0, 'fee_max': 50, 'count': 1})
+        self.assertEqual([row['count'] for row in facets['rating']], [3, 2, 1])
+        self.assertEqual(self.get('facets/', department='surgery').json()['total'], 1)
+
+    def test_facets_take_one_query_per_facet(self):
+        # Active specializations, the doctor columns, then one GROUP BY each
+        # for specializations and departments.
+        with self.assertNumQueries(4):
+            facets = self.get('facets/', fee_max=100).json()
+        self.assertEqual(facets['total'], 2)
+        self.assertEqual(
+            {row['slug']: row['count'] for row in facets['specializations']},
+            {'cardiology': 1, 'paediatrics': 2, 'surgery': 0},
+        )
+        self.assertEqual(facets['departments'], [
+            {'department': 'Medicine', 'count': 2}, {'department': 'Surgery', 'count': 0},
+        ])
@@ -8,7 +8,7 @@ from django.contrib.auth.hashers import check_password
 
 from django.db.models import Q
 
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import filters,status, viewsets
@@ -18,7 +18,7 @@ from rest_framework.pagination import PageNumberPagination
 from rest_framework_simplejwt.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.tokens import RefreshToken,AccessToken
-from rest_framework.permissions import IsAuthenticated, IsAdminUser, IsAuthenticatedOrReadOnly
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser, IsAuthenticatedOrReadOnly
 from .permissions import IsAdmin, IsDoctor, IsPatient
 
 import requests
@@ -27,12 +27,15 @@ from decouple import config
 
 
 from profiles.services.emails import send_login_email,send_custom_email,send_welcome_email
+from profiles.services.directory import directory_queryset, specializations_prefetch, filter_doctors, order_doctors, doctor_facets
 from .models import HealthcareUser, Patient, Doctor
 from .serializers import *
 
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
+from api.mixins import CompiledListMixin, ConditionalGetMixin, SparseQuerysetMixin
+
 ENVIRONMENT = config('ENVIRONMENT', default="development")
 
 is_production = ENVIRONMENT == 'production'
@@ -406,7 +409,7 @@ class AllUserView(APIView,AuthenticationMixin):
             return response
         
 # ----------------------- DRF’s Generic Views for all users
-class UserList(viewsets.ModelViewSet):
+class UserList(SparseQuerysetMixin, CompiledListMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows users to be viewed or edited.
 
@@ -419,6 +422,10 @@ class UserList(viewsets.ModelViewSet):
     serializer_class = UserSerializer
     docserializer = DoctorProfileSerializer
     permission_classes = [IsAuthenticated,IsAdmin]
+    expand_relations = {
+        'profile_image': (('profile_image',), ()),
+        'profile': (('patient_profile', 'clinician_profile'), ('clinician_profile__specializations',)),
+    }
 
     # -------------------------
     # 🟩 LIST
@@ -650,11 +657,10 @@ class UserList(viewsets.ModelViewSet):
     
 
     def get_queryset(self):
-        queryset = HealthcareUser.objects.all().select_related(
-            'patient_profile', 'clinician_profile', 'profile_image'
-        ).prefetch_related(
-            'clinician_profile__specializations'
-        )
+        if getattr(self, 'swagger_fake_view', False):
+            # Schema generation; don't run the exists() check below.
+            return HealthcareUser.objects.none()
+        queryset = self.sparse_queryset(HealthcareUser.objects.all())
 
         filters = ['role', 'status', 'gender', 'blood_group']
         for f in filters:
@@ -692,4 +698,76 @@ class UserList(viewsets.ModelViewSet):
         return super().list(request, *args, **kwargs)
     
     
-        
\ No newline at end of file
+        
+
+
+# ----------------------- Doctor directory
+class DoctorDirectoryPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+DOCTOR_FILTER_PARAMETERS = [
+    openapi.Parameter('specialization', openapi.IN_QUERY, description="Specialization slug", type=openapi.TYPE_STRING),
+    openapi.Parameter('department', openapi.IN_QUERY, description="Specialization department", type=openapi.TYPE_STRING),
+    openapi.Parameter('fee_min', openapi.IN_QUERY, description="Minimum consultation fee", type=openapi.TYPE_INTEGER),
+    openapi.Parameter('fee_max', openapi.IN_QUERY, description="Maximum consultation fee", type=openapi.TYPE_INTEGER),
+    openapi.Parameter('rating_min', openapi.IN_QUERY, description="Minimum rating", type=openapi.TYPE_NUMBER),
+    openapi.Parameter('accepting_new_patients', openapi.IN_QUERY, description="true/false", type=openapi.TYPE_STRING),
+    openapi.Parameter('is_available', openapi.IN_QUERY, description="true/false", type=openapi.TYPE_STRING),
+    openapi.Parameter('emergency_availability', openapi.IN_QUERY, description="true/false", type=openapi.TYPE_STRING),
+]
+
+
+class DoctorViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Doctor directory for the patient app.
+
+    * `list`: Paginated doctors filtered by specialization, department, fee range,
+      rating and availability flags, sorted with `ordering` (rating, -rating, fees, -fees).
+    * `retrieve`: A single doctor card.
+    * `facets`: Counts per filter value for the current filters.
+    """
+    serializer_class = DoctorDirectorySerializer
+    # The directory is public: patients browse it before signing up.
+    permission_classes = [AllowAny]
+    pagination_class = DoctorDirectoryPagination
+    etag_related_fields = ('user__updated_at', 'specializations__updated_at')
+    expand_relations = {'specializations': ((), (specializations_prefetch(),))}
+
+    def get_queryset(self):
+        queryset = self.sparse_queryset(directory_queryset(specializations=False))
+        queryset = filter_doctors(queryset, self.request.query_params)
+        if self.action != 'list':  # `ordering` means nothing to a single doctor
+            return queryset
+        return order_doctors(queryset, self.request.query_params)
+
+    @swagger_auto_schema(
+        operation_summary="Doctor directory",
+        operation_description="Paginated doctor directory with faceted filters.",
+        manual_parameters=DOCTOR_FILTER_PARAMETERS + [
+            openapi.Parameter('ordering', openapi.IN_QUERY, description="rating, -rating, fees or -fees", type=openapi.TYPE_STRING),
+        ],
+        tags=["Doctors"]
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_summary="Retrieve a doctor",
+        tags=["Doctors"]
+    )
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_summary="Directory facet counts",
+        operation_description="Doctor counts per specialization, department, fee range, rating and flag for the given filters.",
+        manual_parameters=DOCTOR_FILTER_PARAMETERS,
+        tags=["Doctors"]
+    )
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        queryset = filter_doctors(Doctor.objects.all(), request.query_params)
+        return Response(doctor_facets(queryset))